@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "rentals.middleware.PerformanceMiddleware",
+    "rentals.middleware.LoadSheddingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -53,6 +57,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    "rentals.middleware.ReplicaPinningMiddleware",
 ]
 
 
@@ -85,13 +90,256 @@ WSGI_APPLICATION = "KGH.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    "default": {
+# Configured from the environment. DB_ENGINE=sqlite (the default) keeps
+# the local db.sqlite3; DB_ENGINE=postgres reads DB_NAME, DB_USER,
+# DB_PASSWORD, DB_HOST and DB_PORT. Each host in DB_REPLICA_HOSTS (or,
+# for SQLite, each file in DB_REPLICA_NAMES) becomes a read replica alias
+# "replica", "replica_2", ... used by rentals.routers.
+
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+
+# Seconds a connection is reused across requests (ignored when pooling)
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", "60"))
+
+# psycopg 3 connection pool sizes; DB_POOL_MAX_SIZE=0 disables pooling
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+
+
+def postgres_database(host):
+    database = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("DB_NAME", "rental_connect"),
+        "USER": os.environ.get("DB_USER", "postgres"),
+        "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+        "HOST": host,
+        "PORT": os.environ.get("DB_PORT", "5432"),
+        "CONN_HEALTH_CHECKS": True,
+    }
+    if DB_POOL_MAX_SIZE:
+        # Django's native pool requires persistent connections to be off
+        database["CONN_MAX_AGE"] = 0
+        database["OPTIONS"] = {
+            "pool": {"min_size": DB_POOL_MIN_SIZE, "max_size": DB_POOL_MAX_SIZE},
+        }
+    else:
+        database["CONN_MAX_AGE"] = DB_CONN_MAX_AGE
+    return database
+
+
+def sqlite_database(name):
+    return {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": name,
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "OPTIONS": {
+            # WAL lets readers run alongside the single writer; IMMEDIATE
+            # takes the write lock up front instead of failing halfway
+            # through a transaction with "database is locked"
+            "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;",
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
     }
+
+
+def env_list(name):
+    return [value.strip() for value in os.environ.get(name, "").split(",") if value.strip()]
+
+
+if DB_ENGINE == "postgres":
+    DATABASES = {"default": postgres_database(os.environ.get("DB_HOST", "localhost"))}
+    replicas = [postgres_database(host) for host in env_list("DB_REPLICA_HOSTS")]
+else:
+    DATABASES = {"default": sqlite_database(os.environ.get("DB_NAME", BASE_DIR / "db.sqlite3"))}
+    replicas = [sqlite_database(name) for name in env_list("DB_REPLICA_NAMES")]
+
+for index, replica in enumerate(replicas, start=1):
+    # Tests run against the primary only
+    replica["TEST"] = {"MIRROR": "default"}
+    DATABASES["replica" if index == 1 else f"replica_{index}"] = replica
+
+DATABASE_ROUTERS = ["rentals.routers.PrimaryReplicaRouter"]
+
+# Seconds a client keeps reading from the primary after a write, so it
+# sees its own booking or payment despite replication lag
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", "10"))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory needs no external service, but each worker process then
+# has its own cache: a property write only invalidates the cached
+# listings (rentals.cache) of the worker that made it, and the others
+# serve the old ones for up to PROPERTY_CACHE_TIMEOUT. With several
+# workers, set CACHE_BACKEND to a shared backend, e.g.
+# "django.core.cache.backends.redis.RedisCache" with CACHE_LOCATION
+# "redis://cache:6379", or FileBasedCache with a directory.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "rentals"),
+    },
+    # Rate limit buckets (rentals.throttling); kept per process on purpose
+    "throttle": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "rentals-throttle",
+    },
+}
+
+# Seconds a cached property listing is kept; writes invalidate it earlier
+PROPERTY_CACHE_TIMEOUT = 300
+
+
+# Token-bucket rate limits per client IP and user (rentals.throttling):
+# `capacity` requests in a burst, refilled at `rate`. Scopes left out are
+# not limited.
+RATE_LIMITS = {
+    "register": {"capacity": 5, "rate": "10/hour"},
+    "token": {"capacity": 10, "rate": "30/min"},
+    # Login attempts per username from any address
+    "login": {"capacity": 30, "rate": "30/hour"},
+    # Callbacks arrive through the Node server, i.e. from few addresses
+    "callback": {"capacity": 500, "rate": "100/s"},
 }
 
+# Load shedding: with more than this many requests in flight in a worker,
+# LOAD_SHED_ROUTES answer 503 (Retry-After: LOAD_SHED_RETRY_AFTER seconds).
+# Counted per process; see rentals.middleware.LoadSheddingMiddleware.
+LOAD_SHED_MAX_IN_FLIGHT = int(os.environ.get("LOAD_SHED_MAX_IN_FLIGHT", "64"))
+LOAD_SHED_RETRY_AFTER = 5
+LOAD_SHED_ROUTES = [
+    "user-register",
+    "token_obtain_pair",
+    "api_login",
+    "jwt-create",
+    "payment-callback",
+    "async-payment-callback",
+]
+
+
+# M-Pesa callbacks: "sync" applies each callback inside the request;
+# "queued" only stores it and acknowledges, leaving the work to
+# `manage.py process_payment_callbacks`.
+PAYMENT_CALLBACK_MODE = "sync"
+
+
+# Background jobs (rentals.jobs), run by `manage.py run_jobs`. Failed jobs
+# are retried after JOB_RETRY_BASE_SECONDS, doubling up to
+# JOB_RETRY_MAX_SECONDS; a running job whose worker has not finished it
+# within JOB_LEASE_SECONDS is handed to another worker. Workers delete
+# finished jobs after JOB_KEEP_DAYS.
+
+JOB_MAX_ATTEMPTS = 5
+
+JOB_RETRY_BASE_SECONDS = 30
+
+JOB_RETRY_MAX_SECONDS = 3600
+
+JOB_LEASE_SECONDS = 300
+
+JOB_KEEP_DAYS = 7
+
+# M-Pesa statement reconciliation (rentals.reconciliation): lines handled
+# per batch, how far apart the statement and callback times of a payment
+# may be, and how long a worker may take before the job is run again
+
+RECONCILIATION_BATCH_SIZE = 2000
+
+RECONCILIATION_TIME_TOLERANCE_SECONDS = 300
+
+RECONCILIATION_LEASE_SECONDS = 3600
+
+# Archival (rentals.archive, `manage.py archive`): bookings dated more than
+# ARCHIVE_AFTER_DAYS ago move with their payments to compressed archive
+# tables, ARCHIVE_BATCH_SIZE per transaction; processed queued callbacks
+# are deleted after ARCHIVE_CALLBACKS_AFTER_DAYS
+
+ARCHIVE_AFTER_DAYS = 365
+
+ARCHIVE_CALLBACKS_AFTER_DAYS = 30
+
+ARCHIVE_BATCH_SIZE = 1000
+
+# Outgoing email (rentals.notifications), with the same account as the
+# Node server; printed to the console unless EMAIL_BACKEND says otherwise
+EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+EMAIL_HOST = os.environ.get("EMAIL_HOST", "smtp.gmail.com")
+EMAIL_PORT = int(os.environ.get("EMAIL_PORT", "587"))
+EMAIL_USE_TLS = True
+EMAIL_HOST_USER = os.environ.get("EMAIL_USER", "")
+EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_PASS", "")
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER or "no-reply@rentalconnect.local"
+
+
+# Request instrumentation (rentals.metrics): Server-Timing headers, JSON
+# lines on the "rentals.performance" logger (INFO for every request,
+# WARNING for slow ones) and Prometheus histograms at /api/metrics/,
+# which only METRICS_ALLOWED_IPS may scrape (None allows everyone).
+
+PERFORMANCE_SERVER_TIMING = True
+
+PERFORMANCE_SLOW_REQUEST_MS = 1000
+
+METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+
+# Query profiler (rentals.profiler), for development and tests: flags
+# query shapes repeated within a request (N+1), slow queries, and
+# requests over their QUERY_BUDGETS entry ({url name: n} or
+# {url name: {method: n}}; None uses the benchmark scenario budgets).
+# Strict mode raises instead of logging when a budget is exceeded.
+
+QUERY_PROFILER = os.environ.get("QUERY_PROFILER") == "1"
+
+QUERY_PROFILER_STRICT = False
+
+QUERY_PROFILER_REPEAT_THRESHOLD = 3
+
+QUERY_PROFILER_SLOW_MS = 100
+
+QUERY_BUDGETS = None
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "rentals.performance": {
+            "handlers": ["console"],
+            "level": os.environ.get("PERFORMANCE_LOG_LEVEL", "WARNING"),
+            "propagate": False,
+        },
+        "rentals.profiler": {
+            "handlers": ["console"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+        "rentals.jobs": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
+
+# Password hashing: PBKDF2 with PASSWORD_HASH_ITERATIONS rounds (unset
+# keeps Django's default). Lower it only where passwords don't matter,
+# e.g. PASSWORD_HASH_ITERATIONS=1000 for local development and CI.
+
+PASSWORD_HASH_ITERATIONS = int(os.environ.get("PASSWORD_HASH_ITERATIONS", "0")) or None
+
+PASSWORD_HASHERS = [
+    "rentals.hashers.ConfigurablePBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -112,6 +360,19 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# JSON Web Tokens
+# https://django-rest-framework-simplejwt.readthedocs.io/en/latest/settings.html
+# Dashboard views trust the access token's claims without loading the
+# user (rentals.authentication), so deactivating a user or changing their
+# role takes effect when their access token expires. Refreshing checks
+# the user in the database and fails for inactive users.
+
+SIMPLE_JWT = {
+    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=int(os.environ.get("JWT_ACCESS_MINUTES", "5"))),
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -129,6 +390,30 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Uploaded property photos (rentals.images). Files are stored under names
+# derived from their content, so they never change once written and are
+# served with a year-long immutable Cache-Control. Point MEDIA_URL at a
+# CDN in production; SERVE_MEDIA lets Django serve MEDIA_ROOT itself
+# (development, or when no web server sits in front).
+
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", BASE_DIR / "media")
+
+MEDIA_URL = os.environ.get("MEDIA_URL", "/media/")
+
+SERVE_MEDIA = os.environ.get("SERVE_MEDIA", "1" if DEBUG else "0") == "1"
+
+# Widths of the resized WebP and JPEG variants made of each photo; none is
+# wider than the original
+PROPERTY_IMAGE_WIDTHS = [320, 640, 1280]
+
+PROPERTY_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+PROPERTY_IMAGE_MAX_PIXELS = 40_000_000
+
+# "sync" makes the variants inside the upload request; "queued" only
+# stores the original, leaving the work to `manage.py process_property_images`
+PROPERTY_IMAGE_PROCESSING = os.environ.get("PROPERTY_IMAGE_PROCESSING", "sync")
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
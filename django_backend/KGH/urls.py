@@ -14,13 +14,27 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+from urllib.parse import urlsplit
+
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from rentals.views import JWTCreateView, serve_media
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path('api/', include('rentals.urls')),
 
+    # Ahead of djoser's own route, which has no rate limit
+    path('auth/jwt/create/', JWTCreateView.as_view(), name='jwt-create'),
     path('auth/', include('djoser.urls')),
-     path('auth/', include('djoser.urls.jwt')),
+    path('auth/', include('djoser.urls.jwt')),
 ]
+
+# Property photos, unless MEDIA_URL points at a CDN or another host
+if settings.SERVE_MEDIA and not urlsplit(settings.MEDIA_URL).netloc:
+    urlpatterns.append(
+        re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.*)$", serve_media)
+    )
@@ -0,0 +1,76 @@
+"""
+Creating users together with their profile and tenant record.
+
+`create_user()` writes the User, UserProfile and (for tenants) Tenant with
+its phone number in one transaction. It bypasses the post_save signal in
+signals.py, which would otherwise insert the profile and tenant one by one
+and leave the phone number for a second save. Registration
+(UserRegistrationSerializer) and the import_users command both use it;
+the signal still covers users created any other way (createsuperuser,
+the admin, djoser).
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import Tenant, UserProfile
+
+# Set on a User instance to keep signals.create_user_related from creating
+# the profile and tenant itself
+SKIP_RELATED_SETUP = "_skip_related_setup"
+
+
+class DuplicateUser(Exception):
+    """The username or email is taken; `errors` maps field to message."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(errors)
+
+
+def find_duplicates(username, email):
+    """Field errors for a taken username and/or email, in a single query."""
+    taken = User.objects.filter(Q(username=username) | Q(email=email)).values_list("username", "email")
+    errors = {}
+    for taken_username, taken_email in taken:
+        if taken_username == username:
+            errors["username"] = "A user with that username already exists."
+        if taken_email == email:
+            errors["email"] = "A user with that email already exists."
+    return errors
+
+
+@transaction.atomic
+def create_user(username, email, role="tenant", phone_number=None, password=None,
+                password_hash=None, check_duplicates=True, **extra_fields):
+    """
+    Create a user with its profile and, for tenants, its Tenant row. Takes
+    either a raw `password` (hashed here), an already hashed
+    `password_hash`, or neither (unusable password).
+
+    Raises DuplicateUser when the username or email is taken; pass
+    check_duplicates=False when the caller has already checked.
+    """
+    if check_duplicates:
+        errors = find_duplicates(username, email)
+        if errors:
+            raise DuplicateUser(errors)
+
+    user = User(username=username, email=email, **extra_fields)
+    if password_hash:
+        user.password = password_hash
+    elif password:
+        user.set_password(password)
+    else:
+        user.set_unusable_password()
+    setattr(user, SKIP_RELATED_SETUP, True)
+    try:
+        user.save()
+    except IntegrityError:
+        # Lost a race on the unique username; the whole unit rolls back
+        raise DuplicateUser({"username": "A user with that username already exists."})
+
+    UserProfile.objects.create(user=user, role=role)
+    if role == "tenant":
+        Tenant.objects.create(user=user, phone_number=phone_number or "")
+    return user
@@ -1,6 +1,12 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import Property
+from .models import ArchivedBooking, ArchivedPayment, Job, Property, PropertyImage, Reconciliation, ReconciliationIssue
 
-admin.site.register(Property)
\ No newline at end of file
+admin.site.register(Property)
+admin.site.register(PropertyImage)
+admin.site.register(Job)
+admin.site.register(Reconciliation)
+admin.site.register(ReconciliationIssue)
+admin.site.register(ArchivedBooking)
+admin.site.register(ArchivedPayment)
@@ -0,0 +1,229 @@
+"""
+Incrementally maintained landlord analytics.
+
+The booking and payment write paths call `record_bookings()` and
+`record_payments()` to bump the matching PropertyDailyStats rows with
+F() expressions; `rebuild()` recomputes the whole table from bookings and
+payments, archived ones included, when it drifts (e.g. after raw SQL
+imports).
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import ArchivedBooking, ArchivedPayment, Booking, Payment, Property, PropertyDailyStats
+
+CANCELLED = Booking.Status.CANCELLED
+PAID = Payment.Status.PAID
+FAILED = Payment.Status.FAILED
+
+STAT_FIELDS = ["bookings", "paid_amount", "paid_payments", "failed_payments"]
+
+GROUPS = ("day", "month")
+
+
+def _increment(property_id, day, deltas):
+    updates = {name: F(name) + value for name, value in deltas.items()}
+    stats = PropertyDailyStats.objects.filter(property_id=property_id, day=day)
+    if stats.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            PropertyDailyStats.objects.create(property_id=property_id, day=day, **deltas)
+    except IntegrityError:
+        # Another writer created the row first
+        stats.update(**updates)
+
+
+def _apply(deltas):
+    """
+    Apply {(property_id, day): {field: delta}}. Several rows are updated
+    with one locking read, one bulk_update and one bulk_create instead of
+    a round trip per row.
+    """
+    if len(deltas) <= 1:
+        for (property_id, day), row_deltas in deltas.items():
+            _increment(property_id, day, row_deltas)
+        return
+
+    with transaction.atomic():
+        existing = {
+            (stats.property_id, stats.day): stats
+            for stats in PropertyDailyStats.objects.select_for_update().filter(
+                property_id__in={property_id for property_id, _ in deltas},
+                day__in={day for _, day in deltas},
+            )
+            if (stats.property_id, stats.day) in deltas
+        }
+        for key, stats in existing.items():
+            for name, value in deltas[key].items():
+                setattr(stats, name, getattr(stats, name) + value)
+        if existing:
+            PropertyDailyStats.objects.bulk_update(existing.values(), STAT_FIELDS)
+
+        missing = [
+            PropertyDailyStats(property_id=property_id, day=day, **row_deltas)
+            for (property_id, day), row_deltas in deltas.items()
+            if (property_id, day) not in existing
+        ]
+        if missing:
+            try:
+                with transaction.atomic():
+                    PropertyDailyStats.objects.bulk_create(missing)
+            except IntegrityError:
+                # A concurrent writer created some of the rows
+                for stats in missing:
+                    _increment(stats.property_id, stats.day, {
+                        name: getattr(stats, name) for name in STAT_FIELDS
+                    })
+
+
+def record_bookings(bookings, sign=1):
+    """Count (or with sign=-1, uncount) live bookings on their dates."""
+    counts = Counter(
+        (booking.property_id, booking.booking_date)
+        for booking in bookings
+        if booking.status != CANCELLED
+    )
+    _apply({key: {"bookings": sign * count} for key, count in counts.items()})
+
+
+def record_payments(payments):
+    """Add payments to the stats of their booking's property."""
+    totals = defaultdict(lambda: {"paid_amount": Decimal(0), "paid_payments": 0, "failed_payments": 0})
+    for payment in payments:
+        if payment.booking is None:
+            continue
+        key = (payment.booking.property_id, timezone.localdate(payment.payment_date))
+        if payment.payment_status == PAID:
+            totals[key]["paid_amount"] += Decimal(payment.amount)
+            totals[key]["paid_payments"] += 1
+        elif payment.payment_status == FAILED:
+            totals[key]["failed_payments"] += 1
+    changes = {
+        key: {name: value for name, value in deltas.items() if value}
+        for key, deltas in totals.items()
+    }
+    _apply({key: row_deltas for key, row_deltas in changes.items() if row_deltas})
+
+
+def landlord_summary(landlord_id, start, end, group="day"):
+    """
+    Occupancy, revenue and payment success per property of a landlord
+    between `start` and `end`, per day or month, read from the summary
+    table only.
+    """
+    period = TruncMonth("day") if group == "month" else F("day")
+    rows = (
+        PropertyDailyStats.objects.filter(property__landlord_id=landlord_id, day__range=(start, end))
+        .annotate(period=period)
+        .values("property_id", "period")
+        .annotate(**{name: Sum(name) for name in STAT_FIELDS})
+        .order_by("property_id", "period")
+    )
+    periods = defaultdict(list)
+    for row in rows:
+        periods[row["property_id"]].append(row)
+
+    properties = []
+    for property_id, name in (
+        Property.objects.filter(landlord_id=landlord_id).order_by("id").values_list("id", "name")
+    ):
+        rows = periods[property_id]
+        # From the raw sums: the summaries hold paid_amount as a string
+        totals = {field: sum((row[field] for row in rows), 0) for field in STAT_FIELDS}
+        properties.append({
+            "property": property_id,
+            "name": name,
+            "periods": [_summarize(row, row["period"], start, end, group) for row in rows],
+            "totals": _summarize(totals, start, start, end, "range"),
+        })
+    return {"start": start, "end": end, "group": group, "properties": properties}
+
+
+def _summarize(stats, period_start, start, end, group):
+    if group == "day":
+        days = 1
+    elif group == "month":
+        next_month = (period_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        days = (min(next_month - timedelta(days=1), end) - max(period_start, start)).days + 1
+    else:
+        days = (end - start).days + 1
+
+    attempts = stats["paid_payments"] + stats["failed_payments"]
+    summary = {field: stats[field] for field in STAT_FIELDS}
+    summary["paid_amount"] = str(Decimal(summary["paid_amount"]).quantize(Decimal("0.01")))
+    if group != "range":
+        summary = {"period": period_start, **summary}
+    summary["occupancy"] = round(stats["bookings"] / days, 4)
+    summary["payment_success_rate"] = round(stats["paid_payments"] / attempts, 4) if attempts else None
+    return summary
+
+
+def rebuild(batch_size=1000):
+    """
+    Recompute every PropertyDailyStats row, aggregating bookings and
+    payments with one GROUP BY query each per batch of properties.
+    Returns the number of rows written.
+    """
+    written = 0
+    with transaction.atomic():
+        PropertyDailyStats.objects.all().delete()
+        property_ids = Property.objects.order_by("id").values_list("id", flat=True).iterator()
+        batch = []
+        for property_id in property_ids:
+            batch.append(property_id)
+            if len(batch) >= batch_size:
+                written += _rebuild_batch(batch)
+                batch = []
+        if batch:
+            written += _rebuild_batch(batch)
+    return written
+
+
+def _rebuild_batch(property_ids):
+    rows = defaultdict(Counter)
+
+    for model in (Booking, ArchivedBooking):
+        bookings = (
+            model.objects.filter(property_id__in=property_ids)
+            .exclude(status=CANCELLED)
+            .values("property_id", "booking_date")
+            .annotate(count=Count("id"))
+        )
+        for row in bookings:
+            rows[row["property_id"], row["booking_date"]]["bookings"] += row["count"]
+
+    payment_stats = {
+        "paid_amount": Sum("amount", filter=Q(payment_status=PAID)),
+        "paid_payments": Count("id", filter=Q(payment_status=PAID)),
+        "failed_payments": Count("id", filter=Q(payment_status=FAILED)),
+    }
+    payments = (
+        Payment.objects.filter(booking__property_id__in=property_ids)
+        .annotate(day=TruncDate("payment_date"), property=F("booking__property_id"))
+        .values("property", "day")
+        .annotate(**payment_stats)
+    )
+    archived_payments = (
+        ArchivedPayment.objects.filter(property_id__in=property_ids)
+        .annotate(day=TruncDate("payment_date"), property=F("property_id"))
+        .values("property", "day")
+        .annotate(**payment_stats)
+    )
+    for row in [*payments, *archived_payments]:
+        stats = rows[row["property"], row["day"]]
+        stats["paid_amount"] += row["paid_amount"] or 0
+        stats["paid_payments"] += row["paid_payments"]
+        stats["failed_payments"] += row["failed_payments"]
+
+    PropertyDailyStats.objects.bulk_create(
+        (PropertyDailyStats(property_id=property_id, day=day, **stats) for (property_id, day), stats in rows.items()),
+        batch_size=1000,
+    )
+    return len(rows)
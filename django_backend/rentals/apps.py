@@ -5,6 +5,8 @@ class RentalsConfig(AppConfig):
     name = "rentals"
 
     def ready(self):
-        # Import signals so they are registered
+        # Import signals and job handlers so they are registered
         import rentals.signals
+        import rentals.notifications
+        import rentals.reconciliation
     
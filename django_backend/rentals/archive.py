@@ -0,0 +1,176 @@
+"""
+Moving old bookings, payments and callbacks out of the hot tables.
+
+- `archive_bookings()` moves bookings dated more than ARCHIVE_AFTER_DAYS
+  ago, with their payments, into ArchivedBooking and ArchivedPayment,
+  ARCHIVE_BATCH_SIZE bookings per transaction. An archived row keeps the
+  columns it is looked up by; the whole row, raw callback included, is
+  zlib-compressed JSON. Calendar rows of archived bookings are deleted;
+  analytics.rebuild() still counts them from the archive tables.
+- Raw M-Pesa callbacks are stored compressed in PaymentRawCallback when a
+  payment is recorded, not in Payment.raw_callback. `compact_callbacks()`
+  moves callbacks recorded before that out of the payments table.
+- `purge_callbacks()` deletes queued callbacks (PaymentCallback) processed
+  more than ARCHIVE_CALLBACKS_AFTER_DAYS ago; the payments they created
+  keep the callback.
+
+`manage.py archive` runs all three. The admin API reads archived rows back
+on demand.
+"""
+import json
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    ArchivedBooking, ArchivedPayment, Booking, Payment, PaymentCallback, PaymentRawCallback,
+    PropertyOccupancy, ReconciliationIssue,
+)
+
+
+def compress(value):
+    return zlib.compress(json.dumps(value, cls=DjangoJSONEncoder, separators=(",", ":")).encode())
+
+
+def decompress(data):
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+def store_raw_callback(payment, raw_callback):
+    if raw_callback is not None:
+        PaymentRawCallback.objects.create(payment=payment, data=compress(raw_callback))
+
+
+def raw_callback(payment):
+    """The raw callback of `payment`, wherever it is stored."""
+    if payment.raw_callback is not None:
+        return payment.raw_callback
+    stored = PaymentRawCallback.objects.filter(payment=payment).values_list("data", flat=True).first()
+    return decompress(stored) if stored is not None else None
+
+
+def _archived_payment(payment, property_id, stored_callback, now):
+    if payment["raw_callback"] is None and stored_callback is not None:
+        payment["raw_callback"] = decompress(stored_callback)
+    return ArchivedPayment(
+        id=payment["id"],
+        booking_id=payment["booking_id"],
+        property_id=property_id,
+        amount=payment["amount"],
+        payment_date=payment["payment_date"],
+        payment_status=payment["payment_status"],
+        mpesa_receipt=payment["mpesa_receipt"],
+        transaction_time=payment["transaction_time"],
+        archived_at=now,
+        data=compress(payment),
+    )
+
+
+def _archive_payments(payments, property_ids, now):
+    """Copy payment rows (dicts) to the archive, then delete them."""
+    payment_ids = [payment["id"] for payment in payments]
+    stored = dict(
+        PaymentRawCallback.objects.filter(payment_id__in=payment_ids).values_list("payment_id", "data")
+    )
+    ArchivedPayment.objects.bulk_create(
+        _archived_payment(payment, property_ids.get(payment["booking_id"]), stored.get(payment["id"]), now)
+        for payment in payments
+    )
+    # Emptied first so deleting the payments has nothing left to cascade to
+    PaymentRawCallback.objects.filter(payment_id__in=payment_ids).delete()
+    ReconciliationIssue.objects.filter(payment_id__in=payment_ids).update(payment=None)
+    Payment.objects.filter(id__in=payment_ids).delete()
+
+
+def _archive_batch(booking_ids):
+    now = timezone.now()
+    bookings = list(Booking.objects.filter(id__in=booking_ids).values())
+    property_ids = {booking["id"]: booking["property_id"] for booking in bookings}
+    ArchivedBooking.objects.bulk_create(
+        ArchivedBooking(
+            id=booking["id"],
+            tenant_id=booking["tenant_id"],
+            property_id=booking["property_id"],
+            booking_date=booking["booking_date"],
+            status=booking["status"],
+            archived_at=now,
+            data=compress(booking),
+        )
+        for booking in bookings
+    )
+    payments = list(Payment.objects.filter(booking_id__in=booking_ids).values())
+    _archive_payments(payments, property_ids, now)
+
+    PropertyOccupancy.objects.filter(booking_id__in=booking_ids).delete()
+    ReconciliationIssue.objects.filter(booking_id__in=booking_ids).update(booking=None)
+    Booking.objects.filter(id__in=booking_ids).delete()
+    return len(payments)
+
+
+def archive_bookings(before=None, batch_size=None):
+    """
+    Archive bookings dated before `before` (default: ARCHIVE_AFTER_DAYS
+    ago) with their payments, then payments without a booking made before
+    then. Returns the number of (bookings, payments) archived.
+    """
+    before = before or timezone.localdate() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    bookings = payments = 0
+
+    # Naming every status lets the (status, booking_date) index serve the range
+    due = Booking.objects.filter(status__in=Booking.Status.values, booking_date__lt=before)
+    while True:
+        with transaction.atomic():
+            booking_ids = list(due.values_list("id", flat=True)[:batch_size])
+            if not booking_ids:
+                break
+            payments += _archive_batch(booking_ids)
+        bookings += len(booking_ids)
+
+    orphans = Payment.objects.filter(
+        booking__isnull=True, payment_date__lt=timezone.make_aware(datetime.combine(before, time.min)),
+    )
+    while True:
+        with transaction.atomic():
+            batch = list(orphans.values()[:batch_size])
+            if not batch:
+                break
+            _archive_payments(batch, {}, timezone.now())
+        payments += len(batch)
+    return bookings, payments
+
+
+def compact_callbacks(batch_size=None):
+    """
+    Move raw callbacks still stored in Payment.raw_callback into
+    PaymentRawCallback. Returns the number moved.
+    """
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    moved, last_id = 0, 0
+    while True:
+        batch = list(
+            Payment.objects.filter(id__gt=last_id, raw_callback__isnull=False)
+            .order_by("id")
+            .values_list("id", "raw_callback")[:batch_size]
+        )
+        if not batch:
+            return moved
+        with transaction.atomic():
+            PaymentRawCallback.objects.bulk_create(
+                (PaymentRawCallback(payment_id=payment_id, data=compress(raw)) for payment_id, raw in batch),
+                ignore_conflicts=True,
+            )
+            Payment.objects.filter(id__in=[payment_id for payment_id, _ in batch]).update(raw_callback=None)
+        moved += len(batch)
+        last_id = batch[-1][0]
+
+
+def purge_callbacks(before=None):
+    """Delete queued callbacks processed before `before`. Returns the number deleted."""
+    before = before or timezone.now() - timedelta(days=settings.ARCHIVE_CALLBACKS_AFTER_DAYS)
+    deleted, _ = PaymentCallback.objects.filter(processed_at__lt=before).delete()
+    return deleted
@@ -0,0 +1,142 @@
+"""
+Async-native versions of the read-heavy endpoints and of payment callback
+intake, for ASGI deployments (`uvicorn KGH.asgi:application`).
+
+DRF views are synchronous, so under ASGI each request to them holds a
+thread for its whole duration. These plain Django async views use the
+async ORM and only touch a thread for the queries themselves, so one
+worker can keep thousands of slow clients and pending callbacks open.
+
+They return the same serializer output as their DRF counterparts but
+page with a keyset (`?after=<id>&limit=`) instead of DRF's cursor, and
+the property endpoints are not cached. The property list takes the same
+filters, including ?near= and ?bbox=, but always keeps its id order.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.utils.urls import replace_query_param
+
+from .authentication import ClaimsJWTAuthentication
+from .filters import filter_properties
+from .models import PaymentCallback, Property
+from .payments import CallbackError, apply_callback
+from .serializers import BookingDashboardSerializer, PropertySerializer
+from .throttling import rate_limit
+from .views import BookingDashboardMixin
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def parse_positive_int(params, key, default=None, maximum=None):
+    value = params.get(key)
+    if not value:
+        return default
+    if not value.isdigit() or int(value) < 1:
+        raise ValidationError({key: "Expected a positive integer."})
+    return min(int(value), maximum) if maximum else int(value)
+
+
+async def keyset_page(request, queryset, serializer_class):
+    """
+    One page of `queryset`, newest first, starting below ?after=<id>.
+    Fetches one extra row to know whether there is a next page.
+    """
+    limit = parse_positive_int(request.GET, "limit", PAGE_SIZE, MAX_PAGE_SIZE)
+    after = parse_positive_int(request.GET, "after")
+    if after is not None:
+        queryset = queryset.filter(id__lt=after)
+    rows = [row async for row in queryset.order_by("-id")[: limit + 1]]
+
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_url = replace_query_param(request.build_absolute_uri(), "after", rows[-1].id)
+    return JsonResponse({"next": next_url, "results": serializer_class(rows, many=True).data})
+
+
+async def authenticate(request):
+    """The request's ClaimsUser, or None without a valid bearer token."""
+    try:
+        result = ClaimsJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    if result is None:
+        return None
+    user = result[0]
+    if "role" not in user.token:
+        # Tokens without a role claim fall back to a profile query
+        await sync_to_async(lambda: user.role)()
+    return user
+
+
+@require_GET
+async def property_list(request):
+    try:
+        # Location filters may check for the spatial index, which reads the
+        # table list synchronously the first time in each process
+        queryset = await sync_to_async(filter_properties)(
+            Property.objects.filter(approved=True).select_related("landlord"), request.GET
+        )
+        return await keyset_page(request, queryset, PropertySerializer)
+    except ValidationError as e:
+        return JsonResponse(e.detail, status=400)
+
+
+@require_GET
+async def property_detail(request, pk):
+    try:
+        prop = await Property.objects.select_related("landlord").aget(pk=pk, approved=True)
+    except Property.DoesNotExist:
+        return JsonResponse({"detail": "No Property matches the given query."}, status=404)
+    return JsonResponse(PropertySerializer(prop).data)
+
+
+@require_GET
+async def landlord_bookings(request):
+    user = await authenticate(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    if user.role != "landlord":
+        return JsonResponse({"detail": "You do not have permission to perform this action."}, status=403)
+
+    queryset = BookingDashboardMixin.get_dashboard_queryset().filter(property__landlord_id=user.pk)
+    try:
+        return await keyset_page(request, queryset, BookingDashboardSerializer)
+    except ValidationError as e:
+        return JsonResponse(e.detail, status=400)
+
+
+# M-Pesa payment callback; same contract as views.payment_callback
+@csrf_exempt
+@require_POST
+@rate_limit("callback")
+async def payment_callback(request):
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    if settings.PAYMENT_CALLBACK_MODE == "queued":
+        callback = await PaymentCallback.objects.acreate(payload=data)
+        return JsonResponse({"message": "Callback accepted", "id": callback.id}, status=202)
+
+    # Applying a callback takes row locks inside a transaction, which the
+    # async ORM cannot do; run it on a thread
+    try:
+        payment, created = await sync_to_async(apply_callback)(data)
+    except CallbackError as e:
+        return JsonResponse({"error": str(e)}, status=404)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    return JsonResponse(
+        {"message": f"Payment processed, Booking status: {payment.payment_status}"},
+        status=201 if created else 200,
+    )
@@ -0,0 +1,66 @@
+from django.contrib.auth.models import User
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import UserProfile
+
+
+class ClaimsUser(TokenUser):
+    """
+    Stateless user backed by the claims CustomTokenObtainPairSerializer puts
+    in the access token (user id, username, email, role).
+
+    Nothing is read from the database unless a claim is missing (e.g. tokens
+    issued by djoser's /auth/jwt/create/ carry no role) or a view needs the
+    real model instance through `user`. A role change or deactivation
+    therefore only takes effect once the user's current access token
+    expires (SIMPLE_JWT's ACCESS_TOKEN_LIFETIME); refreshing it fails for
+    an inactive user.
+    """
+
+    def __str__(self):
+        return self.username
+
+    @cached_property
+    def id(self):
+        # The claim may be serialized as a string; match User.pk's type
+        return User._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def role(self):
+        role = self.token.get("role")
+        if role is None:
+            role = (
+                UserProfile.objects.filter(user_id=self.id)
+                .values_list("role", flat=True)
+                .first()
+            )
+        return role
+
+    @cached_property
+    def email(self):
+        email = self.token.get("email")
+        if email is None:
+            email = self.user.email
+        return email
+
+    @cached_property
+    def user(self):
+        return User.objects.get(pk=self.id)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the token claims instead of loading the
+    user, so authenticating a request costs no queries.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken("Token contained no recognizable user identification")
+        if validated_token.get("is_active") is False:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return ClaimsUser(validated_token)
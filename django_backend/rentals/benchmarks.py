@@ -0,0 +1,614 @@
+"""
+Query-count and latency benchmarks for the rentals API.
+
+`seed()` fills the database with synthetic landlords, tenants, properties,
+bookings and payments at a given scale, and `run_scenario()` drives a
+route of rentals/urls.py through the Django test client, recording the
+number of queries and the latency of each request. SCENARIOS covers every
+route, each with a query budget and p50/p99 latency thresholds; breaches
+are reported as failures.
+
+Used by the `benchmark` management command.
+"""
+import csv
+import io
+import itertools
+import statistics
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import analytics, archive, geo, images, reconciliation, search
+from .models import (
+    ArchivedBooking, ArchivedPayment, Booking, Payment, Property, PropertyOccupancy, Reconciliation, Tenant,
+    UserProfile,
+)
+from .tokens import CustomTokenObtainPairSerializer
+
+PASSWORD = "benchmark-password"
+
+BATCH_SIZE = 5000
+
+NAIROBI = (-1.2864, 36.8172)
+
+
+@dataclass
+class SeedContext:
+    """Ids of seeded rows the scenarios build their requests from."""
+    scale: int
+    admin: User = None
+    landlord: User = None
+    tenant_user: User = None
+    property_id: int = None
+    landlord_property_id: int = None
+    booking: Booking = None
+    tenant_booking_ids: list = field(default_factory=list)
+    pending_property_ids: list = field(default_factory=list)
+    reconciliation_id: int = None
+    archived_booking: ArchivedBooking = None
+    archived_receipt: str = ""
+    refresh_token: str = ""
+
+
+@dataclass
+class Scenario:
+    name: str  # URL name in rentals/urls.py
+    method: str
+    path: callable  # (context, iteration) -> path
+    query_budget: int
+    p50_ms: float
+    p99_ms: float
+    auth: str = "anon"  # anon, tenant, landlord or admin
+    payload: callable = None  # (context, iteration) -> request body
+    content_type: str = "application/json"  # None sends the payload as multipart
+    iterations: int = None  # overrides the command's --iterations
+    max_scale: int = None  # skip larger scales (unpaginated endpoints)
+
+
+def parse_scale(value):
+    value = value.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+    number = value[:-1] if multiplier != 1 else value
+    return int(float(number) * multiplier)
+
+
+def _batched(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def _create_users(prefix, count, role, password):
+    """Bulk-create users with their profiles (and tenants) without signals."""
+    start = User.objects.count()
+    for batch in _batched(range(count)):
+        User.objects.bulk_create(
+            User(
+                username=f"{prefix}{start + i}",
+                email=f"{prefix}{start + i}@example.com",
+                password=password,
+            )
+            for i in batch
+        )
+    users = list(User.objects.filter(username__startswith=prefix).order_by("id"))
+    UserProfile.objects.bulk_create(
+        (UserProfile(user=user, role=role) for user in users), batch_size=BATCH_SIZE
+    )
+    if role == "tenant":
+        Tenant.objects.bulk_create(
+            (Tenant(user=user, phone_number="254700000000") for user in users),
+            batch_size=BATCH_SIZE,
+        )
+    return users
+
+
+def sample_photo(seed, size=(1600, 1200)):
+    """A JPEG upload that differs for every seed, so none is deduplicated."""
+    from PIL import Image
+
+    image = Image.linear_gradient("L").resize(size).convert("RGB")
+    image.paste((seed * 37 % 256, seed * 91 % 256, 120), (0, 0, size[0] // 4, size[1] // 4))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return SimpleUploadedFile(f"photo-{seed}.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+
+def sample_statement(seed, lines=200):
+    """
+    An M-Pesa statement CSV whose even lines are seeded payments (every
+    tenth with the wrong amount) and odd lines unknown receipts.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["Receipt No.", "Completion Time", "Transaction Status", "Paid In", "Other Party Info"])
+    for i in range(lines):
+        receipt = f"BENCH{i // 2:010d}" if i % 2 == 0 else f"BENCHX{seed:04d}{i:06d}"
+        amount = "4000.00" if i % 20 == 0 else "5000.00"
+        writer.writerow([receipt, "", "Completed", amount, "254700000000 - BENCH"])
+    return buffer.getvalue()
+
+
+def seed(scale):
+    """
+    Create `scale` properties and `scale` bookings (plus half as many
+    payments) with the tenants and landlords they belong to.
+    """
+    password = make_password(PASSWORD)
+    context = SeedContext(scale=scale)
+
+    with transaction.atomic():
+        context.admin = _create_users("bench-admin-", 1, "admin", password)[0]
+        landlords = _create_users("bench-landlord-", max(scale // 100, 1), "landlord", password)
+        tenant_users = _create_users("bench-tenant-", max(scale // 10, 1), "tenant", password)
+        context.landlord = landlords[0]
+        context.tenant_user = tenant_users[0]
+
+        # Properties are spread over roughly 50 x 50 km around Nairobi;
+        # every tenth one is still waiting for approval
+        for batch in _batched(range(scale)):
+            Property.objects.bulk_create(
+                Property(
+                    landlord=landlords[i % len(landlords)],
+                    name=f"Property {i} {('studio', 'bedsitter', 'apartment')[i % 3]}",
+                    description="Spacious unit close to town with parking and water. " * 4,
+                    price_per_month=Decimal(5000 + (i * 37) % 50000),
+                    approved=i % 10 != 0,
+                    latitude=NAIROBI[0] - 0.225 + (i * 7919 % 1000) * 0.00045,
+                    longitude=NAIROBI[1] - 0.225 + (i * 104729 % 997) * 0.00045,
+                )
+                for i in batch
+            )
+        property_ids = list(Property.objects.filter(approved=True).values_list("id", flat=True))
+        context.pending_property_ids = list(
+            Property.objects.filter(approved=False).values_list("id", flat=True)[:1000]
+        )
+        context.property_id = property_ids[0]
+        context.landlord_property_id = (
+            Property.objects.filter(landlord=context.landlord).values_list("id", flat=True).first()
+        )
+
+        tenants = list(Tenant.objects.select_related("user").order_by("id"))
+        today = date.today()
+        for batch in _batched(range(scale)):
+            Booking.objects.bulk_create(
+                Booking(
+                    tenant=tenants[i % len(tenants)],
+                    property_id=property_ids[i % len(property_ids)],
+                    booking_date=today - timedelta(days=i % 365),
+                    email=tenants[i % len(tenants)].user.email,
+                    status=Booking.Status.PAID if i % 2 == 0 else Booking.Status.PENDING,
+                )
+                for i in batch
+            )
+
+        occupancy = Booking.objects.values_list("id", "property_id", "booking_date").iterator()
+        for batch in _batched(occupancy):
+            PropertyOccupancy.objects.bulk_create(
+                (
+                    PropertyOccupancy(booking_id=booking_id, property_id=property_id, date=day)
+                    for booking_id, property_id, day in batch
+                ),
+                ignore_conflicts=True,
+            )
+
+        booking_ids = Booking.objects.filter(status=Booking.Status.PAID).values_list("id", flat=True).iterator()
+        for batch in _batched(enumerate(booking_ids)):
+            Payment.objects.bulk_create(
+                Payment(
+                    booking_id=booking_id,
+                    amount=Decimal("5000.00"),
+                    payment_status=Payment.Status.PAID,
+                    mpesa_receipt=f"BENCH{i:010d}",
+                    phone_number="254700000000",
+                    result_code=0,
+                )
+                for i, booking_id in batch
+            )
+
+    # The last days of the seeded year go to the archive
+    archive.archive_bookings(before=date.today() - timedelta(days=360))
+    context.archived_booking = ArchivedBooking.objects.order_by("id").first()
+    context.archived_receipt = ArchivedPayment.objects.order_by("id").values_list("mpesa_receipt", flat=True).first()
+
+    search.rebuild_index()
+    geo.rebuild_index()
+    analytics.rebuild()
+    images.add_image(Property.objects.get(pk=context.property_id), sample_photo(0).read())
+    context.reconciliation_id = reconciliation.reconcile(
+        Reconciliation.objects.create(), io.StringIO(sample_statement(0))
+    ).pk
+
+    context.booking = Booking.objects.select_related("tenant__user").filter(
+        tenant__user=context.tenant_user
+    ).first()
+    context.tenant_booking_ids = list(
+        Booking.objects.filter(tenant__user=context.tenant_user).values_list("id", flat=True)
+    )
+    context.refresh_token = str(CustomTokenObtainPairSerializer.get_token(context.tenant_user))
+    return context
+
+
+SCENARIOS = [
+    Scenario(
+        "properties-list", "get",
+        lambda ctx, i: reverse("properties-list") + "?ordering=price_per_month&min_price=10000",
+        query_budget=1, p50_ms=50, p99_ms=250,
+    ),
+    Scenario(
+        "properties-list", "get",
+        lambda ctx, i: reverse("properties-list") + f"?near={NAIROBI[0]},{NAIROBI[1]}&radius=3",
+        query_budget=1, p50_ms=50, p99_ms=250,
+    ),
+    Scenario(
+        "properties-list", "get",
+        lambda ctx, i: reverse("properties-list") + "?bbox=36.80,-1.30,36.83,-1.27&fields=id,name,image",
+        query_budget=1, p50_ms=50, p99_ms=250,
+    ),
+    Scenario(
+        "async-properties-list", "get",
+        lambda ctx, i: reverse("async-properties-list") + "?min_price=10000",
+        query_budget=1, p50_ms=50, p99_ms=250,
+    ),
+    Scenario(
+        "properties-search", "get",
+        lambda ctx, i: reverse("properties-search") + "?q=spacious apart",
+        query_budget=2, p50_ms=100, p99_ms=400,
+    ),
+    Scenario(
+        "properties-detail", "get",
+        lambda ctx, i: reverse("properties-detail", args=[ctx.property_id]),
+        query_budget=1, p50_ms=20, p99_ms=100,
+    ),
+    Scenario(
+        "async-properties-detail", "get",
+        lambda ctx, i: reverse("async-properties-detail", args=[ctx.property_id]),
+        query_budget=1, p50_ms=20, p99_ms=100,
+    ),
+    Scenario(
+        "properties-available", "get",
+        lambda ctx, i: reverse("properties-available")
+        + f"?start={date.today() - timedelta(days=30)}&end={date.today()}&fields=id,name",
+        query_budget=1, p50_ms=100, p99_ms=400,
+    ),
+    Scenario(
+        "property-availability", "get",
+        lambda ctx, i: reverse("property-availability", args=[ctx.property_id])
+        + f"?start={date.today() - timedelta(days=365)}&end={date.today()}",
+        query_budget=2, p50_ms=20, p99_ms=100,
+    ),
+    Scenario(
+        "property-images", "get",
+        lambda ctx, i: reverse("property-images", args=[ctx.property_id]),
+        query_budget=1, p50_ms=20, p99_ms=100,
+    ),
+    Scenario(
+        "landlord-property-images", "get",
+        lambda ctx, i: reverse("landlord-property-images", args=[ctx.landlord_property_id]),
+        query_budget=1, p50_ms=20, p99_ms=100, auth="landlord",
+    ),
+    Scenario(
+        "landlord-property-images", "post",
+        lambda ctx, i: reverse("landlord-property-images", args=[ctx.landlord_property_id]),
+        query_budget=7, p50_ms=1000, p99_ms=2000, auth="landlord", iterations=5,
+        payload=lambda ctx, i: {"file": sample_photo(i + 1)}, content_type=None,
+    ),
+    Scenario(
+        "landlord-properties", "get",
+        lambda ctx, i: reverse("landlord-properties"),
+        query_budget=1, p50_ms=100, p99_ms=400, auth="landlord",
+    ),
+    Scenario(
+        "admin-pending-properties", "get",
+        lambda ctx, i: reverse("admin-pending-properties") + "?page_size=100",
+        query_budget=1, p50_ms=50, p99_ms=250, auth="admin",
+    ),
+    Scenario(
+        "approve-property", "post",
+        lambda ctx, i: reverse("approve-property", args=[ctx.pending_property_ids[i % len(ctx.pending_property_ids)]]),
+        query_budget=9, p50_ms=50, p99_ms=250, auth="admin", payload=lambda ctx, i: {},
+    ),
+    Scenario(
+        "bookings-list-create", "get",
+        lambda ctx, i: reverse("bookings-list-create"),
+        query_budget=1, p50_ms=500, p99_ms=2000, iterations=5, max_scale=1_000,
+    ),
+    Scenario(
+        "bookings-list-create", "post",
+        lambda ctx, i: reverse("bookings-list-create"),
+        query_budget=11, p50_ms=50, p99_ms=250,
+        payload=lambda ctx, i: {
+            "tenant": ctx.booking.tenant_id,
+            "property": ctx.property_id,
+            "booking_date": str(date.today() + timedelta(days=i + 1)),
+            "email": ctx.tenant_user.email,
+        },
+    ),
+    Scenario(
+        "booking-cancel", "post",
+        lambda ctx, i: reverse("booking-cancel", args=[ctx.tenant_booking_ids[i % len(ctx.tenant_booking_ids)]]),
+        query_budget=7, p50_ms=50, p99_ms=250, auth="tenant",
+    ),
+    Scenario(
+        "bookings-bulk-create", "post",
+        lambda ctx, i: reverse("bookings-bulk-create"),
+        query_budget=13, p50_ms=250, p99_ms=1000, auth="admin", iterations=10,
+        payload=lambda ctx, i: [
+            {
+                "tenant": ctx.booking.tenant_id,
+                "property": ctx.property_id,
+                "booking_date": str(date.today() + timedelta(days=1000 + i * 100 + n)),
+                "email": ctx.tenant_user.email,
+            }
+            for n in range(100)
+        ],
+    ),
+    Scenario(
+        "payments-bulk-create", "post",
+        lambda ctx, i: reverse("payments-bulk-create"),
+        query_budget=7, p50_ms=250, p99_ms=1000, auth="admin", iterations=10,
+        payload=lambda ctx, i: [
+            {"booking": ctx.booking.id, "amount": "5000.00", "mpesa_receipt": f"BENCHBULK{i:03d}{n:03d}"}
+            for n in range(100)
+        ],
+    ),
+    Scenario(
+        "payments-create", "post",
+        lambda ctx, i: reverse("payments-create"),
+        query_budget=6, p50_ms=50, p99_ms=250,
+        payload=lambda ctx, i: {"booking": ctx.booking.id, "amount": "5000.00"},
+    ),
+    Scenario(
+        "tenant-list-create", "get",
+        lambda ctx, i: reverse("tenant-list-create") + f"?search={ctx.tenant_user.email}",
+        query_budget=1, p50_ms=200, p99_ms=1000, max_scale=100_000,
+    ),
+    Scenario(
+        "user-register", "post",
+        lambda ctx, i: reverse("user-register"),
+        query_budget=6, p50_ms=2000, p99_ms=4000, iterations=5,
+        payload=lambda ctx, i: {
+            "username": f"bench-new-{i}",
+            "email": f"bench-new-{i}@example.com",
+            "password": PASSWORD,
+            "phone_number": "254700000000",
+        },
+    ),
+    Scenario(
+        "api_login", "post",
+        lambda ctx, i: reverse("api_login"),
+        query_budget=5, p50_ms=2000, p99_ms=4000, iterations=5,
+        payload=lambda ctx, i: {"username": ctx.tenant_user.username, "password": PASSWORD},
+    ),
+    Scenario(
+        "payment-callback", "post",
+        lambda ctx, i: reverse("payment-callback"),
+        query_budget=10, p50_ms=50, p99_ms=250,
+        payload=lambda ctx, i: {
+            "booking_id": ctx.booking.id,
+            "email": ctx.tenant_user.email,
+            "result_code": 0,
+            "result_desc": "The service request is processed successfully.",
+            "amount": 5000,
+            "mpesa_receipt": f"BENCHCB{i:06d}",
+            "phone_number": "254700000000",
+            "transaction_date": "20250101120000",
+        },
+    ),
+    Scenario(
+        "async-payment-callback", "post",
+        lambda ctx, i: reverse("async-payment-callback"),
+        query_budget=10, p50_ms=50, p99_ms=250,
+        payload=lambda ctx, i: {
+            "booking_id": ctx.booking.id,
+            "email": ctx.tenant_user.email,
+            "result_code": 0,
+            "result_desc": "The service request is processed successfully.",
+            "amount": 5000,
+            "mpesa_receipt": f"BENCHACB{i:06d}",
+            "phone_number": "254700000000",
+            "transaction_date": "20250101120000",
+        },
+    ),
+    Scenario(
+        "token_obtain_pair", "post",
+        lambda ctx, i: reverse("token_obtain_pair"),
+        query_budget=3, p50_ms=2000, p99_ms=4000, iterations=5,
+        payload=lambda ctx, i: {"username": ctx.tenant_user.username, "password": PASSWORD},
+    ),
+    Scenario(
+        "token_refresh", "post",
+        lambda ctx, i: reverse("token_refresh"),
+        query_budget=1, p50_ms=20, p99_ms=100,
+        payload=lambda ctx, i: {"refresh": ctx.refresh_token},
+    ),
+    Scenario(
+        "me", "get",
+        lambda ctx, i: reverse("me"),
+        query_budget=1, p50_ms=20, p99_ms=100, auth="tenant",
+    ),
+    Scenario(
+        "my-bookings", "get",
+        lambda ctx, i: reverse("my-bookings"),
+        query_budget=1, p50_ms=50, p99_ms=250, auth="tenant",
+    ),
+    Scenario(
+        "my-payments", "get",
+        lambda ctx, i: reverse("my-payments"),
+        query_budget=1, p50_ms=50, p99_ms=250, auth="tenant",
+    ),
+    Scenario(
+        "my-bookings", "get",
+        lambda ctx, i: reverse("my-bookings") + "?archived=1",
+        query_budget=1, p50_ms=50, p99_ms=250, auth="tenant",
+    ),
+    Scenario(
+        "my-payments", "get",
+        lambda ctx, i: reverse("my-payments") + "?archived=1",
+        query_budget=1, p50_ms=50, p99_ms=250, auth="tenant",
+    ),
+    Scenario(
+        "landlord-bookings", "get",
+        lambda ctx, i: reverse("landlord-bookings"),
+        query_budget=1, p50_ms=100, p99_ms=400, auth="landlord",
+    ),
+    Scenario(
+        "async-landlord-bookings", "get",
+        lambda ctx, i: reverse("async-landlord-bookings"),
+        query_budget=1, p50_ms=100, p99_ms=400, auth="landlord",
+    ),
+    Scenario(
+        "admin-bookings", "get",
+        lambda ctx, i: reverse("admin-bookings"),
+        query_budget=1, p50_ms=100, p99_ms=400, auth="admin",
+    ),
+    Scenario(
+        "landlord-analytics", "get",
+        lambda ctx, i: reverse("landlord-analytics") + "?group=month"
+        + f"&start={date.today() - timedelta(days=365)}&end={date.today()}",
+        query_budget=2, p50_ms=50, p99_ms=250, auth="landlord",
+    ),
+    Scenario(
+        "admin-export-bookings", "get",
+        lambda ctx, i: reverse("admin-export-bookings", args=["csv"]) + "?status=Paid",
+        query_budget=5, p50_ms=2000, p99_ms=4000, auth="admin", iterations=3, max_scale=100_000,
+    ),
+    Scenario(
+        "admin-export-payments", "get",
+        lambda ctx, i: reverse("admin-export-payments", args=["ndjson"]),
+        query_budget=5, p50_ms=2000, p99_ms=4000, auth="admin", iterations=3, max_scale=100_000,
+    ),
+    Scenario(
+        "admin-reconciliations", "get",
+        lambda ctx, i: reverse("admin-reconciliations"),
+        query_budget=1, p50_ms=20, p99_ms=100, auth="admin",
+    ),
+    Scenario(
+        "admin-reconciliations", "post",
+        lambda ctx, i: reverse("admin-reconciliations"),
+        query_budget=4, p50_ms=50, p99_ms=250, auth="admin", content_type=None,
+        payload=lambda ctx, i: {
+            "file": SimpleUploadedFile(f"statement-{i}.csv", sample_statement(i + 1).encode(), content_type="text/csv"),
+        },
+    ),
+    Scenario(
+        "admin-reconciliation-issues", "get",
+        lambda ctx, i: reverse("admin-reconciliation-issues", args=[ctx.reconciliation_id]) + "?kind=Missing",
+        query_budget=1, p50_ms=20, p99_ms=100, auth="admin",
+    ),
+    Scenario(
+        "admin-archived-bookings", "get",
+        lambda ctx, i: reverse("admin-archived-bookings")
+        + f"?tenant={ctx.archived_booking.tenant_id}&end={ctx.archived_booking.booking_date}",
+        query_budget=1, p50_ms=20, p99_ms=100, auth="admin",
+    ),
+    Scenario(
+        "admin-archived-booking-detail", "get",
+        lambda ctx, i: reverse("admin-archived-booking-detail", args=[ctx.archived_booking.id]),
+        query_budget=2, p50_ms=20, p99_ms=100, auth="admin",
+    ),
+    Scenario(
+        "admin-archived-payments", "get",
+        lambda ctx, i: reverse("admin-archived-payments") + f"?receipt={ctx.archived_receipt}",
+        query_budget=1, p50_ms=20, p99_ms=100, auth="admin",
+    ),
+    Scenario(
+        "metrics", "get",
+        lambda ctx, i: reverse("metrics"),
+        query_budget=0, p50_ms=20, p99_ms=100,
+    ),
+]
+
+
+def _percentile(samples, percent):
+    ordered = sorted(samples)
+    index = min(int(round(percent / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def auth_headers(context, auth):
+    """HTTP headers authenticating as the seeded `auth` user."""
+    if auth == "anon":
+        return {}
+    user = {"tenant": context.tenant_user, "landlord": context.landlord, "admin": context.admin}[auth]
+    token = CustomTokenObtainPairSerializer.get_token(user).access_token
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _client(context, auth):
+    return Client(headers=auth_headers(context, auth))
+
+
+def run_scenario(scenario, context, iterations, latency_factor=1.0):
+    """Run one scenario and return its result dict."""
+    iterations = scenario.iterations or iterations
+    result = {"route": scenario.name, "method": scenario.method.upper()}
+
+    if scenario.max_scale and context.scale > scenario.max_scale:
+        result["skipped"] = f"not run above {scenario.max_scale} rows"
+        return result
+
+    client = _client(context, scenario.auth)
+    latencies, query_counts, statuses = [], [], set()
+    for i in range(iterations):
+        path = scenario.path(context, i)
+        kwargs = {}
+        if scenario.payload:
+            kwargs = {"data": scenario.payload(context, i)}
+            if scenario.content_type:
+                kwargs["content_type"] = scenario.content_type
+
+        with CaptureQueriesContext(connections["default"]) as queries:
+            start = time.perf_counter()
+            response = getattr(client, scenario.method)(path, **kwargs)
+            if response.streaming:
+                # Exports only run their queries while being consumed
+                for _ in response.streaming_content:
+                    pass
+            latencies.append((time.perf_counter() - start) * 1000)
+        query_counts.append(len(queries))
+        statuses.add(response.status_code)
+
+    p50, p99 = _percentile(latencies, 50), _percentile(latencies, 99)
+    result.update(
+        iterations=iterations,
+        statuses=sorted(statuses),
+        queries_max=max(query_counts),
+        queries_median=statistics.median(query_counts),
+        query_budget=scenario.query_budget,
+        p50_ms=round(p50, 3),
+        p99_ms=round(p99, 3),
+        p50_threshold_ms=scenario.p50_ms * latency_factor,
+        p99_threshold_ms=scenario.p99_ms * latency_factor,
+    )
+
+    failures = []
+    if any(status >= 400 for status in statuses):
+        failures.append(f"error responses: {sorted(statuses)}")
+    if max(query_counts) > scenario.query_budget:
+        failures.append(f"{max(query_counts)} queries > budget {scenario.query_budget}")
+    if p50 > result["p50_threshold_ms"]:
+        failures.append(f"p50 {p50:.1f}ms > {result['p50_threshold_ms']}ms")
+    if p99 > result["p99_threshold_ms"]:
+        failures.append(f"p99 {p99:.1f}ms > {result['p99_threshold_ms']}ms")
+    result["failures"] = failures
+    return result
+
+
+def unbenchmarked_routes():
+    """URL names in rentals/urls.py that have no scenario."""
+    from . import urls
+
+    covered = {scenario.name for scenario in SCENARIOS}
+    return sorted(
+        pattern.name for pattern in urls.urlpatterns
+        if pattern.name and pattern.name not in covered
+    )
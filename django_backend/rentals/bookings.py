@@ -0,0 +1,63 @@
+"""
+Reserving and cancelling bookings against the availability calendar.
+
+A booking holds its date through a PropertyOccupancy row created in the
+same transaction; the (property, date) unique constraint rejects a second
+booking for the same night even when two requests race.
+"""
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import analytics, jobs, notifications
+from .models import Booking, PropertyOccupancy
+
+CANCELLED = Booking.Status.CANCELLED
+
+
+class BookingConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The property is already booked on that date."
+    default_code = "booking_conflict"
+
+
+def reserve(serializer):
+    """Save a validated BookingSerializer and claim its date."""
+    try:
+        with transaction.atomic():
+            booking = serializer.save()
+            if booking.status != CANCELLED:
+                PropertyOccupancy.objects.create(
+                    property_id=booking.property_id, date=booking.booking_date, booking=booking
+                )
+                analytics.record_bookings([booking])
+                jobs.enqueue(notifications.BOOKING_CREATED, {"booking_id": booking.pk})
+    except IntegrityError:
+        data = serializer.validated_data
+        if PropertyOccupancy.objects.filter(property=data["property"], date=data["booking_date"]).exists():
+            raise BookingConflict()
+        raise
+    return booking
+
+
+def cancel(booking_id):
+    """Cancel a booking and free its date. Returns the booking."""
+    with transaction.atomic():
+        booking = Booking.objects.select_for_update().get(pk=booking_id)
+        if booking.status != CANCELLED:
+            analytics.record_bookings([booking], sign=-1)
+            booking.transition_to(CANCELLED)
+            PropertyOccupancy.objects.filter(booking=booking).delete()
+    return booking
+
+
+def booked_pairs(pairs):
+    """Subset of (property_id, date) pairs that are already booked."""
+    pairs = set(pairs)
+    if not pairs:
+        return set()
+    existing = PropertyOccupancy.objects.filter(
+        property_id__in={property_id for property_id, _ in pairs},
+        date__in={day for _, day in pairs},
+    ).values_list("property_id", "date")
+    return pairs & set(existing)
@@ -0,0 +1,171 @@
+"""
+Bulk creation of bookings and payments.
+
+An importer reads rows (dicts, e.g. from a JSON list or the NDJSON parser)
+in chunks. Each chunk is validated through the regular serializer with its
+foreign keys prefetched in one query per model. Conflicts such as a
+repeated M-Pesa receipt are checked once per chunk, and the valid rows are
+inserted with a single bulk_create inside a transaction. The result for
+every row is reported by its position in the input.
+"""
+import itertools
+
+from django.db import IntegrityError, transaction
+
+from . import analytics, bookings
+from .models import HAS_RECEIPT, ArchivedPayment, Booking, Payment, Property, PropertyOccupancy, Tenant
+from .parsers import InvalidLine
+from .serializers import BookingSerializer, PaymentSerializer
+
+
+class BulkImporter:
+    serializer_class = None
+    # Foreign key fields resolved through CachedPrimaryKeyRelatedField
+    related_fields = {}
+    chunk_size = 500
+
+    def __init__(self, context=None, chunk_size=None):
+        self.context = context or {}
+        if chunk_size:
+            self.chunk_size = chunk_size
+
+    @property
+    def model(self):
+        return self.serializer_class.Meta.model
+
+    def run(self, rows):
+        """Import all rows; returns one result dict per row, in order."""
+        results = []
+        rows = iter(rows)
+        start = 0
+        while chunk := list(itertools.islice(rows, self.chunk_size)):
+            results.extend(self.import_chunk(chunk, start))
+            start += len(chunk)
+        return results
+
+    def import_chunk(self, chunk, start):
+        results = {}
+        context = {**self.context, "related_cache": self.prefetch_related(chunk)}
+
+        pending = []  # (index, validated_data)
+        for offset, row in enumerate(chunk):
+            index = start + offset
+            if isinstance(row, InvalidLine):
+                results[index] = self.error(index, {"non_field_errors": [row.error]})
+                continue
+            if not isinstance(row, dict):
+                results[index] = self.error(index, {"non_field_errors": ["Expected a JSON object."]})
+                continue
+            serializer = self.serializer_class(data=row, context=context)
+            if serializer.is_valid():
+                pending.append((index, serializer.validated_data))
+            else:
+                results[index] = self.error(index, serializer.errors)
+
+        for index, errors in self.find_conflicts(pending).items():
+            results[index] = self.error(index, errors)
+        pending = [(index, data) for index, data in pending if index not in results]
+
+        if pending:
+            instances = [self.model(**data) for _, data in pending]
+            try:
+                with transaction.atomic():
+                    self.model.objects.bulk_create(instances)
+                    self.after_create(instances)
+            except IntegrityError as exc:
+                # Lost a race with a concurrent writer; the whole chunk was
+                # rolled back
+                for index, _ in pending:
+                    results[index] = self.error(index, {"non_field_errors": [str(exc)]})
+            else:
+                for (index, _), instance in zip(pending, instances):
+                    results[index] = {"index": index, "status": "created", "id": instance.pk}
+
+        return [results[index] for index in sorted(results)]
+
+    def prefetch_related(self, chunk):
+        cache = {}
+        for field, model in self.related_fields.items():
+            ids = set()
+            for row in chunk:
+                if isinstance(row, dict):
+                    try:
+                        ids.add(model._meta.pk.to_python(row.get(field)))
+                    except Exception:
+                        continue
+            ids.discard(None)
+            cache[model] = model.objects.in_bulk(ids) if ids else {}
+        return cache
+
+    def find_conflicts(self, pending):
+        """Return {index: errors} for rows that cannot be inserted."""
+        return {}
+
+    def after_create(self, instances):
+        """Called inside the chunk's transaction after the insert."""
+
+    @staticmethod
+    def error(index, errors):
+        return {"index": index, "status": "error", "errors": errors}
+
+
+class BookingImporter(BulkImporter):
+    serializer_class = BookingSerializer
+    related_fields = {"tenant": Tenant, "property": Property}
+
+    # BookingSerializer keeps status read-only, so every imported booking
+    # is Pending and takes its date on the calendar
+    def find_conflicts(self, pending):
+        pairs = [(index, (data["property"].pk, data["booking_date"])) for index, data in pending]
+        taken = bookings.booked_pairs(pair for _, pair in pairs)
+        conflicts = {}
+        for index, pair in pairs:
+            if pair in taken:
+                conflicts[index] = {"booking_date": [bookings.BookingConflict.default_detail]}
+            taken.add(pair)
+        return conflicts
+
+    def after_create(self, instances):
+        PropertyOccupancy.objects.bulk_create(
+            PropertyOccupancy(property_id=booking.property_id, date=booking.booking_date, booking=booking)
+            for booking in instances
+        )
+        analytics.record_bookings(instances)
+
+
+class BulkPaymentSerializer(PaymentSerializer):
+    class Meta(PaymentSerializer.Meta):
+        # Receipt uniqueness is checked once per chunk by PaymentImporter
+        extra_kwargs = {"mpesa_receipt": {"validators": []}}
+
+    def validate_mpesa_receipt(self, value):
+        return value
+
+
+class PaymentImporter(BulkImporter):
+    serializer_class = BulkPaymentSerializer
+    related_fields = {"booking": Booking}
+
+    def find_conflicts(self, pending):
+        conflicts = {}
+        seen = set()
+        receipts = {data.get("mpesa_receipt") for _, data in pending} - {None, ""}
+        existing = set()
+        if receipts:
+            # Archived payments keep their receipts, as in apply_callback
+            for queryset in (Payment.objects.filter(HAS_RECEIPT), ArchivedPayment.objects.all()):
+                existing.update(
+                    queryset.filter(mpesa_receipt__in=receipts).values_list("mpesa_receipt", flat=True)
+                )
+
+        for index, data in pending:
+            receipt = data.get("mpesa_receipt")
+            if not receipt:
+                continue
+            if receipt in existing or receipt in seen:
+                conflicts[index] = {"mpesa_receipt": ["Payment with this receipt already exists."]}
+            seen.add(receipt)
+        return conflicts
+
+    def after_create(self, instances):
+        analytics.record_payments(instances)
@@ -0,0 +1,77 @@
+"""
+Versioned read-through cache for the public property endpoints.
+
+Cached responses are keyed by the full request URI under a version number.
+Any committed Property save or delete (including admin approval) bumps the
+version, which orphans every cached listing at once; orphaned entries
+simply expire. The bump waits for the commit, so a request running in
+between cannot cache the old row under the new version.
+
+Works with any Django cache backend, but the version is only shared
+between workers through a shared one; see CACHES in settings.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+VERSION_KEY = "rentals:properties:version"
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from a timestamp rather than 1 so an evicted version key can
+        # never resurrect entries cached under an older version
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def response_key(request):
+    uri = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+    return f"rentals:properties:{get_version()}:{uri}"
+
+
+def make_etag(data):
+    return quote_etag(hashlib.md5(JSONRenderer().render(data)).hexdigest())
+
+
+class PropertyCacheMixin:
+    """
+    Serve GET responses from the property cache, with ETag/If-None-Match
+    support so unchanged listings are answered with a 304.
+    """
+
+    def get(self, request, *args, **kwargs):
+        key = response_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cached = (response.data, make_etag(response.data))
+            cache.set(key, cached, settings.PROPERTY_CACHE_TIMEOUT)
+
+        data, etag = cached
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response["ETag"] = etag
+        # Let clients and proxies keep the body but revalidate every time
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
@@ -0,0 +1,188 @@
+"""
+Streaming CSV/NDJSON exports of bookings and payments.
+
+Rows are read with `.values_list().iterator(chunk_size=...)` (a server-side
+cursor on PostgreSQL) and written out one at a time by a generator, so
+memory use does not depend on the size of the export.
+
+Archived bookings and payments (rentals.archive) come first, as they are
+the oldest. They are decoded a chunk at a time, with one query per chunk
+for each of the tenant emails, property names and payments they need.
+"""
+import csv
+import itertools
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import OuterRef, Subquery
+from django.utils.dateparse import parse_datetime
+
+from . import archive
+from .models import ArchivedBooking, ArchivedPayment, Booking, Payment, Property, Tenant
+
+EXPORT_CHUNK_SIZE = 2000
+
+BOOKING_COLUMNS = [
+    ("id", "id"),
+    ("booking_date", "booking_date"),
+    ("created_at", "created_at"),
+    ("status", "status"),
+    ("tenant_email", "tenant__user__email"),
+    ("property_id", "property_id"),
+    ("property_name", "property__name"),
+    ("latest_payment_status", "latest_payment_status"),
+    ("latest_payment_amount", "latest_payment_amount"),
+    ("latest_mpesa_receipt", "latest_mpesa_receipt"),
+]
+
+PAYMENT_COLUMNS = [
+    ("id", "id"),
+    ("payment_date", "payment_date"),
+    ("amount", "amount"),
+    ("payment_status", "payment_status"),
+    ("mpesa_receipt", "mpesa_receipt"),
+    ("phone_number", "phone_number"),
+    ("result_code", "result_code"),
+    ("transaction_time", "transaction_time"),
+    ("booking_id", "booking_id"),
+    ("tenant_email", "booking__tenant__user__email"),
+    ("property_name", "booking__property__name"),
+]
+
+
+def booking_rows(start=None, end=None, status=None):
+    """Booking rows with the tenant email, property name and latest payment."""
+    latest_payment = Payment.objects.filter(booking=OuterRef("pk")).order_by("-payment_date", "-id")
+    queryset = Booking.objects.annotate(
+        latest_payment_status=Subquery(latest_payment.values("payment_status")[:1]),
+        latest_payment_amount=Subquery(latest_payment.values("amount")[:1]),
+        latest_mpesa_receipt=Subquery(latest_payment.values("mpesa_receipt")[:1]),
+    )
+    if start:
+        queryset = queryset.filter(booking_date__gte=start)
+    if end:
+        queryset = queryset.filter(booking_date__lte=end)
+    if status:
+        queryset = queryset.filter(status=status)
+
+    archived = ArchivedBooking.objects.all()
+    if start:
+        archived = archived.filter(booking_date__gte=start)
+    if end:
+        archived = archived.filter(booking_date__lte=end)
+    if status:
+        archived = archived.filter(status=status)
+    return itertools.chain(
+        _archived(archived, ("id", "tenant_id", "property_id", "data"), _archived_booking_rows),
+        _iterate(queryset, BOOKING_COLUMNS),
+    )
+
+
+def payment_rows(start=None, end=None, status=None):
+    """Payment rows with the tenant email and property name of the booking."""
+    queryset = Payment.objects.all()
+    if start:
+        queryset = queryset.filter(payment_date__date__gte=start)
+    if end:
+        queryset = queryset.filter(payment_date__date__lte=end)
+    if status:
+        queryset = queryset.filter(payment_status=status)
+
+    archived = ArchivedPayment.objects.all()
+    if start:
+        archived = archived.filter(payment_date__date__gte=start)
+    if end:
+        archived = archived.filter(payment_date__date__lte=end)
+    if status:
+        archived = archived.filter(payment_status=status)
+    return itertools.chain(
+        _archived(archived, ("id", "booking_id", "property_id", "data"), _archived_payment_rows),
+        _iterate(queryset, PAYMENT_COLUMNS),
+    )
+
+
+def _iterate(queryset, columns):
+    return (
+        queryset.order_by("id")
+        .values_list(*(lookup for _, lookup in columns))
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def _archived(queryset, fields, to_rows):
+    """Archived rows in chunks of EXPORT_CHUNK_SIZE, turned into export rows by `to_rows`."""
+    rows = queryset.order_by("id").values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    while chunk := list(itertools.islice(rows, EXPORT_CHUNK_SIZE)):
+        yield from to_rows(chunk)
+
+
+def _tenant_emails(tenant_ids):
+    tenant_ids = set(tenant_ids) - {None}
+    if not tenant_ids:
+        return {}
+    return dict(Tenant.objects.filter(id__in=tenant_ids).values_list("id", "user__email"))
+
+
+def _property_names(property_ids):
+    property_ids = set(property_ids) - {None}
+    if not property_ids:
+        return {}
+    return dict(Property.objects.filter(id__in=property_ids).values_list("id", "name"))
+
+
+def _archived_booking_rows(chunk):
+    emails = _tenant_emails(tenant_id for _, tenant_id, _, _ in chunk)
+    names = _property_names(property_id for _, _, property_id, _ in chunk)
+    latest = {}
+    payments = (
+        ArchivedPayment.objects.filter(booking_id__in=[booking_id for booking_id, _, _, _ in chunk])
+        .order_by("payment_date", "id")
+        .values_list("booking_id", "payment_status", "amount", "mpesa_receipt")
+    )
+    for booking_id, *payment in payments:
+        latest[booking_id] = payment
+    for booking_id, tenant_id, property_id, data in chunk:
+        booking = archive.decompress(data)
+        yield (
+            booking_id, booking["booking_date"], parse_datetime(booking["created_at"]), booking["status"],
+            emails.get(tenant_id), property_id, names.get(property_id),
+            *latest.get(booking_id, (None, None, None)),
+        )
+
+
+def _archived_payment_rows(chunk):
+    booking_ids = {booking_id for _, booking_id, _, _ in chunk} - {None}
+    tenants = dict(
+        ArchivedBooking.objects.filter(id__in=booking_ids).values_list("id", "tenant_id")
+    ) if booking_ids else {}
+    emails = _tenant_emails(tenants.values())
+    names = _property_names(property_id for _, _, property_id, _ in chunk)
+    for payment_id, booking_id, property_id, data in chunk:
+        payment = archive.decompress(data)
+        transaction_time = payment["transaction_time"]
+        yield (
+            payment_id, parse_datetime(payment["payment_date"]), payment["amount"], payment["payment_status"],
+            payment["mpesa_receipt"], payment["phone_number"], payment["result_code"],
+            transaction_time and parse_datetime(transaction_time),
+            booking_id, emails.get(tenants.get(booking_id)), names.get(property_id),
+        )
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in columns])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(columns, rows):
+    names = [name for name, _ in columns]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + "\n"
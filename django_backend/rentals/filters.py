@@ -0,0 +1,129 @@
+import math
+from decimal import Decimal, InvalidOperation
+
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from . import geo
+
+DEFAULT_RADIUS_KM = 5
+MAX_RADIUS_KM = 50
+
+
+def filter_properties(queryset, params):
+    """
+    Server-side filters for property listings, read from a QueryDict.
+
+    Supported query parameters:
+        min_price / max_price  range on price_per_month
+        landlord               landlord user id
+        name                   case-insensitive substring of the name
+        near=<lat>,<lng>       within ?radius= km (default 5, at most 50)
+        bbox=<min_lng>,<min_lat>,<max_lng>,<max_lat>
+                               inside the box
+
+    Location searches annotate each property with its `distance` in km
+    from `near`, or from the centre of `bbox` without it.
+    """
+    min_price = _parse_decimal(params, "min_price")
+    if min_price is not None:
+        queryset = queryset.filter(price_per_month__gte=min_price)
+
+    max_price = _parse_decimal(params, "max_price")
+    if max_price is not None:
+        queryset = queryset.filter(price_per_month__lte=max_price)
+
+    landlord = params.get("landlord")
+    if landlord:
+        if not landlord.isdigit():
+            raise ValidationError({"landlord": "Expected a landlord id."})
+        queryset = queryset.filter(landlord_id=int(landlord))
+
+    name = params.get("name")
+    if name:
+        queryset = queryset.filter(name__icontains=name)
+
+    return filter_location(queryset, params)
+
+
+def filter_location(queryset, params):
+    near = _parse_coordinates(params, "near", 2)
+    bbox = _parse_coordinates(params, "bbox", 4)
+    if near is None and bbox is None:
+        if params.get("radius"):
+            raise ValidationError({"radius": "Only valid together with near."})
+        return queryset
+
+    if bbox is not None:
+        min_lng, min_lat, max_lng, max_lat = bbox
+        if min_lat > max_lat or min_lng > max_lng:
+            raise ValidationError({"bbox": "Expected min_lng,min_lat,max_lng,max_lat."})
+        bbox = geo.BoundingBox(min_lat, min_lng, max_lat, max_lng)
+        queryset = geo.within(queryset, bbox)
+
+    if near is None:
+        return queryset.annotate(distance=geo.distance(*bbox.center))
+
+    radius = _parse_decimal(params, "radius")
+    radius = DEFAULT_RADIUS_KM if radius is None else float(radius)
+    if not 0 < radius <= MAX_RADIUS_KM:
+        raise ValidationError({"radius": f"Expected a distance in km up to {MAX_RADIUS_KM}."})
+    queryset = geo.within(queryset, geo.around(*near, radius))
+    return queryset.annotate(distance=geo.distance(*near)).filter(distance__lte=radius)
+
+
+def _parse_coordinates(params, key, count):
+    value = params.get(key)
+    if not value:
+        return None
+    try:
+        numbers = [float(part) for part in value.split(",")]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count or not all(map(math.isfinite, numbers)):
+        raise ValidationError({key: f"Expected {count} comma-separated numbers."})
+    # Latitude comes first in near, second and fourth in bbox
+    latitudes = numbers[:1] if count == 2 else numbers[1::2]
+    longitudes = numbers[1:] if count == 2 else numbers[::2]
+    if any(abs(lat) > 90 for lat in latitudes) or any(abs(lng) > 180 for lng in longitudes):
+        raise ValidationError({key: "Coordinates out of range."})
+    return numbers
+
+
+def _parse_decimal(params, key):
+    value = params.get(key)
+    if not value:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({key: "Expected a number."})
+
+
+class PropertyFilterBackend(filters.BaseFilterBackend):
+    """DRF filter backend applying `filter_properties()` to a listing."""
+
+    def filter_queryset(self, request, queryset, view):
+        return filter_properties(queryset, request.query_params)
+
+
+class PropertyOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter for location searches: they are sorted nearest first
+    unless ?ordering= says otherwise, and only they accept
+    ?ordering=distance.
+    """
+
+    def get_default_ordering(self, view):
+        if self._is_location_search(view.request):
+            return ["distance"]
+        return super().get_default_ordering(view)
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        if not self._is_location_search(request):
+            fields = [field for field in fields if field.lstrip("-") != "distance"]
+        return super().remove_invalid_fields(queryset, fields, view, request)
+
+    @staticmethod
+    def _is_location_search(request):
+        return bool(request.query_params.get("near") or request.query_params.get("bbox"))
@@ -0,0 +1,128 @@
+"""
+Location search over Property.latitude/longitude.
+
+The spatial index depends on the database:
+
+- SQLite: an R*Tree (`rentals_property_rtree`, created by migration 0013)
+  kept in sync by the Property save/delete signals, like the FTS index.
+- PostgreSQL: a GiST index on point(longitude, latitude), also from
+  migration 0013, matched with `<@ box`.
+- Other backends fall back to range filters on the two columns, which
+  keep working, only slower.
+
+The index narrows a search to a bounding box; exact filtering and
+ordering then use an equirectangular distance. It needs only arithmetic
+and one square root, and at city scale it is within a fraction of a
+percent of the great-circle distance.
+"""
+import math
+from typing import NamedTuple
+
+from django.db import connection
+from django.db.models import BooleanField, F, FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Sqrt
+
+from .models import Property
+
+RTREE_TABLE = "rentals_property_rtree"
+
+# Mean Earth radius (6371 km) times pi / 180
+KM_PER_DEGREE = 111.195
+
+_rtree_tables = {}
+
+
+class BoundingBox(NamedTuple):
+    min_lat: float
+    min_lng: float
+    max_lat: float
+    max_lng: float
+
+    @property
+    def center(self):
+        return (self.min_lat + self.max_lat) / 2, (self.min_lng + self.max_lng) / 2
+
+
+def rtree_enabled():
+    """Return True if the R*Tree index exists on the current database."""
+    if connection.vendor != "sqlite":
+        return False
+    name = connection.settings_dict["NAME"]
+    if name not in _rtree_tables:
+        _rtree_tables[name] = RTREE_TABLE in connection.introspection.table_names()
+    return _rtree_tables[name]
+
+
+def index_property(instance, created=False):
+    if not rtree_enabled():
+        return
+    if instance.latitude is None or instance.longitude is None:
+        # A new property without a location has nothing to replace
+        if not created:
+            remove_property(instance.pk)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {RTREE_TABLE} (id, min_lat, max_lat, min_lng, max_lng) "
+            f"VALUES (%s, %s, %s, %s, %s)",
+            [instance.pk, instance.latitude, instance.latitude, instance.longitude, instance.longitude],
+        )
+
+
+def remove_property(pk):
+    if not rtree_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {RTREE_TABLE} WHERE id = %s", [pk])
+
+
+def rebuild_index():
+    """Re-index every located property; returns the number of indexed rows."""
+    if not rtree_enabled():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {RTREE_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {RTREE_TABLE} (id, min_lat, max_lat, min_lng, max_lng) "
+            f"SELECT id, latitude, latitude, longitude, longitude FROM {Property._meta.db_table} "
+            f"WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        )
+        return cursor.rowcount
+
+
+def around(lat, lng, radius_km):
+    """The bounding box of a circle of `radius_km` around lat/lng."""
+    dlat = radius_km / KM_PER_DEGREE
+    # Longitude degrees shrink towards the poles
+    dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    return BoundingBox(max(lat - dlat, -90), max(lng - dlng, -180), min(lat + dlat, 90), min(lng + dlng, 180))
+
+
+def within(queryset, box):
+    """Properties of `queryset` inside `box`, using the spatial index when there is one."""
+    queryset = queryset.filter(
+        latitude__range=(box.min_lat, box.max_lat),
+        longitude__range=(box.min_lng, box.max_lng),
+    )
+    table = queryset.model._meta.db_table
+    if connection.vendor == "postgresql":
+        return queryset.filter(RawSQL(
+            f'point("{table}"."longitude", "{table}"."latitude") <@ box(point(%s, %s), point(%s, %s))',
+            [box.min_lng, box.min_lat, box.max_lng, box.max_lat],
+            output_field=BooleanField(),
+        ))
+    if rtree_enabled():
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT id FROM {RTREE_TABLE} "
+            f"WHERE max_lat >= %s AND min_lat <= %s AND max_lng >= %s AND min_lng <= %s",
+            [box.min_lat, box.max_lat, box.min_lng, box.max_lng],
+        ))
+    return queryset
+
+
+def distance(lat, lng):
+    """Expression for the distance in km from lat/lng to a property."""
+    dx = (F("longitude") - lng) * (KM_PER_DEGREE * math.cos(math.radians(lat)))
+    dy = (F("latitude") - lat) * KM_PER_DEGREE
+    return Sqrt(dx * dx + dy * dy, output_field=FloatField())
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the iteration count taken from PASSWORD_HASH_ITERATIONS, so
+    development and test environments can hash cheaply while production
+    keeps Django's default work factor.
+
+    It shares the "pbkdf2_sha256" algorithm name, so existing hashes keep
+    verifying at the iteration count they were stored with, and are
+    re-hashed at the configured count on the user's next login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or PBKDF2PasswordHasher.iterations
@@ -0,0 +1,316 @@
+"""
+Property photo pipeline.
+
+`add_image()` stores an upload as is and records a PropertyImage;
+`process()` then makes a WebP and a JPEG copy at each of
+PROPERTY_IMAGE_WIDTHS (never wider than the original) plus a blurhash
+placeholder clients can paint while the photo loads. The first processed
+photo of a property is copied onto Property.image, so listings get their
+card image without an extra query.
+
+Every file is stored under a name derived from its content,
+properties/<2 hex>/<hash>.<ext>. A name therefore never points at
+different bytes, which lets media be served with a year-long immutable
+Cache-Control and sit behind a CDN; identical files are only stored once.
+
+With PROPERTY_IMAGE_PROCESSING = "queued" uploads only store the original
+and `manage.py process_property_images` does the resizing, the same way
+queued payment callbacks are handled.
+
+Pillow is an optional dependency: without it uploads are refused and
+everything else keeps working.
+"""
+import hashlib
+import io
+import math
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import cache
+from .models import Property, PropertyImage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+# Accepted upload formats and the extension their originals are stored with
+FORMATS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+
+WEBP_OPTIONS = {"quality": 80, "method": 4}
+JPEG_OPTIONS = {"quality": 82, "optimize": True, "progressive": True}
+
+# EXIF orientations that swap width and height
+_TRANSPOSED = {5, 6, 7, 8}
+
+
+class InvalidImage(ValueError):
+    """An upload that is not a usable photo."""
+
+
+def _require_pillow():
+    if Image is None:
+        raise ImproperlyConfigured("Property photos need Pillow: pip install Pillow")
+
+
+def content_name(data, suffix):
+    digest = hashlib.sha256(data).hexdigest()
+    return f"properties/{digest[:2]}/{digest[:32]}{suffix}"
+
+
+def store(data, suffix):
+    """Save `data` under its content-addressed name, unless already stored."""
+    name = content_name(data, suffix)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def open_image(data):
+    """Open uploaded bytes with Pillow, raising InvalidImage for bad uploads."""
+    _require_pillow()
+    try:
+        image = Image.open(io.BytesIO(data))
+    except (OSError, Image.DecompressionBombError):
+        raise InvalidImage("Upload a JPEG, PNG or WebP photo.")
+    if image.format not in FORMATS:
+        raise InvalidImage("Upload a JPEG, PNG or WebP photo.")
+    if image.width * image.height > settings.PROPERTY_IMAGE_MAX_PIXELS:
+        raise InvalidImage("The photo has too many pixels.")
+    return image
+
+
+def add_image(prop, data):
+    """
+    Store an uploaded photo of `prop` and, in sync mode, process it straight
+    away. A photo the property already has returns the existing image.
+    """
+    image = open_image(data)
+    digest = hashlib.sha256(data).hexdigest()
+    name = store(data, FORMATS[image.format])
+    try:
+        with transaction.atomic():
+            photo = PropertyImage.objects.create(property=prop, original=name, sha256=digest)
+    except IntegrityError:
+        return PropertyImage.objects.get(property=prop, sha256=digest)
+
+    if settings.PROPERTY_IMAGE_PROCESSING == "sync":
+        process(photo, image)
+    return photo
+
+
+def target_widths(width):
+    """Variant widths for an original `width` pixels wide, narrowest first."""
+    widths = [target for target in sorted(settings.PROPERTY_IMAGE_WIDTHS) if target < width]
+    if width <= max(settings.PROPERTY_IMAGE_WIDTHS):
+        widths.append(width)
+    return widths
+
+
+def _flatten(image):
+    """RGB copy of `image`, with any transparency laid over white."""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _encode(image, file_format, options):
+    buffer = io.BytesIO()
+    image.save(buffer, file_format, **options)
+    return buffer.getvalue()
+
+
+def make_variants(image):
+    """
+    Resize `image` (a freshly opened PIL image) into its variants. Returns
+    (width, height, blurhash, variants) with width and height those of the
+    upright original.
+    """
+    width, height = image.size
+    if image.getexif().get(0x0112) in _TRANSPOSED:
+        width, height = height, width
+    widths = target_widths(width)
+
+    # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale for much less work;
+    # ask for a square so the widest variant fits either orientation
+    image.draft("RGB", (widths[-1], widths[-1]))
+    image = _flatten(ImageOps.exif_transpose(image))
+
+    variants = []
+    # Widest first, each resized from the one before it
+    for target in reversed(widths):
+        size = (target, max(round(height * target / width), 1))
+        if image.size != size:
+            image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        variants.append({
+            "width": size[0],
+            "height": size[1],
+            "webp": store(_encode(image, "WEBP", WEBP_OPTIONS), ".webp"),
+            "jpeg": store(_encode(image, "JPEG", JPEG_OPTIONS), ".jpg"),
+        })
+    variants.reverse()
+
+    image.thumbnail((32, 32))
+    return width, height, blurhash(image), variants
+
+
+def process(photo, image=None):
+    """
+    Make the variants and blurhash of `photo`, then refresh its property's
+    cover. Unreadable originals are closed with an error; other failures
+    leave the photo pending for the worker to retry.
+    """
+    photo.attempts += 1
+    try:
+        if image is None:
+            with photo.original.open("rb") as fh:
+                image = open_image(fh.read())
+        photo.width, photo.height, photo.blurhash, photo.variants = make_variants(image)
+    except InvalidImage as exc:
+        photo.processed_at = timezone.now()
+        photo.error = str(exc)
+    except Exception as exc:
+        photo.error = repr(exc)
+    else:
+        photo.processed_at = timezone.now()
+        photo.error = ""
+    photo.save(update_fields=[
+        "width", "height", "blurhash", "variants", "processed_at", "attempts", "error",
+    ])
+    if photo.processed_at and not photo.error:
+        refresh_cover(photo.property_id)
+
+
+def process_pending(batch_size=20, max_attempts=3):
+    """
+    Process up to `batch_size` pending photos. Returns the number handled.
+
+    Unlike payment callbacks the batch is not one transaction: resizing
+    takes long enough that it would hold up every other writer. Two workers
+    may pick the same photo; both produce the same files.
+    """
+    batch = list(
+        PropertyImage.objects.filter(processed_at__isnull=True, attempts__lt=max_attempts)
+        .order_by("id")[:batch_size]
+    )
+    for photo in batch:
+        process(photo)
+    return len(batch)
+
+
+def cover_data(photo):
+    return {
+        "width": photo.width,
+        "height": photo.height,
+        "blurhash": photo.blurhash,
+        "original": photo.original.name,
+        "variants": photo.variants,
+    }
+
+
+def refresh_cover(property_id):
+    """Copy the property's first processed photo onto Property.image."""
+    cover = (
+        PropertyImage.objects.filter(property_id=property_id, processed_at__isnull=False, error="")
+        .order_by("id")
+        .first()
+    )
+    Property.objects.filter(pk=property_id).update(image=cover_data(cover) if cover else None)
+    # update() sends no post_save, so invalidate cached listings here,
+    # once the caller's transaction (if any) commits
+    transaction.on_commit(cache.bump_version)
+
+
+def variant_urls(variants):
+    return [
+        {**variant, "webp": default_storage.url(variant["webp"]), "jpeg": default_storage.url(variant["jpeg"])}
+        for variant in variants
+    ]
+
+
+def cover_urls(cover):
+    """Property.image with storage names turned into URLs."""
+    return {
+        **cover,
+        "original": default_storage.url(cover["original"]),
+        "variants": variant_urls(cover["variants"]),
+    }
+
+
+# Blurhash (https://blurha.sh): a few DCT components of the photo packed
+# into a short base-83 string that clients decode into a blurred preview
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _base83(value, length):
+    return "".join(_BASE83[value // 83 ** (length - i) % 83] for i in range(1, length + 1))
+
+
+def _to_linear(value):
+    value /= 255
+    return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+
+_LINEAR = [_to_linear(value) for value in range(256)]
+
+
+def _to_srgb(value):
+    value = min(max(value, 0), 1)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value, exponent):
+    return math.copysign(abs(value) ** exponent, value)
+
+
+def blurhash(image, x_components=4, y_components=3):
+    """Blurhash of a small RGB image (a 32px thumbnail is plenty)."""
+    width, height = image.size
+    if height > width:
+        x_components, y_components = y_components, x_components
+    data = image.tobytes()
+    linear = [
+        (_LINEAR[data[k]], _LINEAR[data[k + 1]], _LINEAR[data[k + 2]]) for k in range(0, len(data), 3)
+    ]
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            scale = (1 if i == j == 0 else 2) / (width * height)
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[i][x] * cos_y[j][y]
+                    pr, pg, pb = linear[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83(x_components - 1 + (y_components - 1) * 9, 1)
+    if ac:
+        quantized = max(0, min(82, int(max(abs(c) for factor in ac for c in factor) * 166 - 0.5)))
+        maximum = (quantized + 1) / 166
+    else:
+        quantized, maximum = 0, 1
+    result += _base83(quantized, 1)
+    result += _base83((_to_srgb(dc[0]) << 16) + (_to_srgb(dc[1]) << 8) + _to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (max(0, min(18, int(_sign_pow(c / maximum, 0.5) * 9 + 9.5))) for c in factor)
+        result += _base83(r * 19 * 19 + g * 19 + b, 2)
+    return result
@@ -0,0 +1,182 @@
+"""
+Durable background jobs with the database as the broker.
+
+Jobs are rows of the Job table. `enqueue()` inserts one within the
+caller's transaction, so a job exists exactly when the write that caused
+it commits, and a request handler pays one INSERT for it.
+
+Workers (`manage.py run_jobs`) claim due jobs in a short transaction,
+run them outside of it and record the outcome:
+
+- Handlers are registered with `@handler(name)` and take a list of
+  payloads. With batch_size > 1 one call gets many jobs of its kind,
+  e.g. to send emails over a single connection.
+- A failed job is retried after JOB_RETRY_BASE_SECONDS, doubling with
+  each attempt up to JOB_RETRY_MAX_SECONDS (with jitter), until it has
+  had max_attempts; then it stays Failed.
+- A job whose worker died is claimed again once its lease
+  (JOB_LEASE_SECONDS, or the handler's lease_seconds for long jobs) runs
+  out, so handlers must cope with running twice.
+
+On PostgreSQL concurrent workers skip each other's rows (SKIP LOCKED);
+SQLite runs write transactions one at a time, which has the same effect.
+"""
+import logging
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger("rentals.jobs")
+
+QUEUED = Job.Status.QUEUED
+RUNNING = Job.Status.RUNNING
+DONE = Job.Status.DONE
+FAILED = Job.Status.FAILED
+
+
+@dataclass
+class Handler:
+    func: callable
+    batch_size: int
+    max_attempts: int
+    lease_seconds: int = None
+
+
+_handlers = {}
+
+
+def handler(name, batch_size=1, max_attempts=None, lease_seconds=None):
+    """
+    Register `func(payloads)` as the handler of `name` jobs. It gets up to
+    `batch_size` payloads and returns None when all of them succeeded, or
+    a list holding None or an exception for each payload. Raising fails
+    the whole batch. Handlers that may run longer than JOB_LEASE_SECONDS
+    pass a longer `lease_seconds`.
+    """
+
+    def decorator(func):
+        _handlers[name] = Handler(func, batch_size, max_attempts or settings.JOB_MAX_ATTEMPTS, lease_seconds)
+        return func
+
+    return decorator
+
+
+def enqueue(name, payload=None, run_at=None):
+    """Queue one `name` job; part of the current transaction, if any."""
+    return enqueue_many(name, [payload or {}], run_at)[0]
+
+
+def enqueue_many(name, payloads, run_at=None):
+    if name not in _handlers:
+        raise LookupError(f"No job handler registered for {name!r}")
+    run_at = run_at or timezone.now()
+    max_attempts = _handlers[name].max_attempts
+    return Job.objects.bulk_create(
+        Job(name=name, payload=payload, run_at=run_at, max_attempts=max_attempts)
+        for payload in payloads
+    )
+
+
+def backoff(attempts):
+    """Delay before retrying a job that has failed `attempts` times."""
+    delay = min(settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.5))
+
+
+def claim(worker, limit):
+    """
+    Lock up to `limit` due jobs for `worker`, oldest first, after putting
+    jobs with an expired lease back in the queue.
+    """
+    now = timezone.now()
+    long_leases = {name: registered.lease_seconds for name, registered in _handlers.items() if registered.lease_seconds}
+    lease_expired = Q(locked_at__lt=now - timedelta(seconds=settings.JOB_LEASE_SECONDS)) & ~Q(name__in=long_leases)
+    for name, seconds in long_leases.items():
+        lease_expired |= Q(name=name, locked_at__lt=now - timedelta(seconds=seconds))
+
+    with transaction.atomic():
+        expired = Job.objects.filter(lease_expired, status=RUNNING)
+        # A job that keeps killing its worker must not be retried forever
+        expired.filter(attempts__gte=F("max_attempts")).update(
+            status=FAILED, finished_at=now, locked_by="", locked_at=None, last_error="Worker lease expired",
+        )
+        expired.update(status=QUEUED, run_at=now, locked_by="", locked_at=None, last_error="Worker lease expired")
+
+        batch = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=QUEUED, run_at__lte=now)
+            .order_by("run_at", "id")[:limit]
+        )
+        Job.objects.filter(id__in=[job.id for job in batch]).update(
+            status=RUNNING, locked_by=worker, locked_at=now, attempts=F("attempts") + 1,
+        )
+    for job in batch:
+        job.status, job.locked_by, job.locked_at = RUNNING, worker, now
+        job.attempts += 1
+    return batch
+
+
+def _lease(name):
+    registered = _handlers.get(name)
+    return (registered and registered.lease_seconds) or settings.JOB_LEASE_SECONDS
+
+
+def _run(jobs):
+    """Run claimed jobs of one name; returns an error (or None) per job."""
+    registered = _handlers.get(jobs[0].name)
+    if registered is None:
+        return [LookupError(f"No job handler registered for {jobs[0].name!r}")] * len(jobs)
+
+    errors = []
+    for start in range(0, len(jobs), registered.batch_size):
+        chunk = jobs[start:start + registered.batch_size]
+        try:
+            results = registered.func([job.payload for job in chunk])
+        except Exception as exc:
+            results = [exc] * len(chunk)
+        errors.extend(results or [None] * len(chunk))
+    return errors
+
+
+def run_once(worker, limit=50):
+    """Claim and run one batch of due jobs. Returns the number of jobs run."""
+    batch = claim(worker, limit)
+    if not batch:
+        return 0
+
+    # Jobs with a long lease run last, so the others are finished and
+    # recorded well within theirs
+    batch.sort(key=lambda job: (_lease(job.name), job.name))
+    for name, group in groupby(batch, key=lambda job: job.name):
+        group = list(group)
+        errors = _run(group)
+        now = timezone.now()
+        for job, error in zip(group, errors):
+            job.locked_by, job.locked_at = "", None
+            if error is None:
+                job.status, job.finished_at, job.last_error = DONE, now, ""
+                continue
+            job.last_error = repr(error)
+            if job.attempts >= job.max_attempts or job.name not in _handlers:
+                job.status, job.finished_at = FAILED, now
+                logger.error("Job %s (%s) failed for good: %r", job.pk, name, error)
+            else:
+                job.status, job.run_at = QUEUED, now + backoff(job.attempts)
+        Job.objects.bulk_update(
+            group, ["status", "run_at", "locked_by", "locked_at", "last_error", "finished_at"]
+        )
+    return len(batch)
+
+
+def purge(older_than):
+    """Delete jobs that finished successfully before `older_than`."""
+    deleted, _ = Job.objects.filter(status=DONE, finished_at__lt=older_than).delete()
+    return deleted
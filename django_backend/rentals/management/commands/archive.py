@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rentals import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move old bookings and their payments to the archive tables, move raw "
+        "callbacks out of the payments table and delete old processed callbacks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before", default=None,
+            help="Archive bookings dated before this day, YYYY-MM-DD (default: ARCHIVE_AFTER_DAYS ago).",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="Bookings per transaction (default: ARCHIVE_BATCH_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        before = None
+        if options["before"]:
+            try:
+                before = date.fromisoformat(options["before"])
+            except ValueError:
+                raise CommandError("--before must be a date, YYYY-MM-DD.")
+
+        bookings, payments = archive.archive_bookings(before, options["batch_size"])
+        self.stdout.write(f"Archived {bookings} booking(s) and {payments} payment(s).")
+        moved = archive.compact_callbacks(options["batch_size"])
+        self.stdout.write(f"Moved {moved} raw callback(s) out of the payments table.")
+        purged = archive.purge_callbacks()
+        self.stdout.write(f"Deleted {purged} processed callback(s).")
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,148 @@
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from rentals import benchmarks, profiler
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic data into a throwaway test database and check every "
+        "API route against its query budget and latency thresholds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale", action="append", dest="scales",
+            help="Rows of properties and bookings to seed, e.g. 1k, 100k, 1m. "
+                 "Repeat for several scales (default: 1k).",
+        )
+        parser.add_argument("--iterations", type=int, default=50, help="Requests per route.")
+        parser.add_argument(
+            "--route", action="append", dest="routes",
+            help="Only run the given URL name(s).",
+        )
+        parser.add_argument(
+            "--latency-factor", type=float, default=1.0,
+            help="Multiply every latency threshold, for slower machines.",
+        )
+        parser.add_argument(
+            "--profile", action="store_true",
+            help="Run with the query profiler: log N+1 and slow queries, and add "
+                 "each route's query fingerprints to the JSON results.",
+        )
+        parser.add_argument("--output", help="Write the JSON results to this file.")
+        parser.add_argument(
+            "--no-fail", action="store_true",
+            help="Exit successfully even when a budget or threshold is exceeded.",
+        )
+
+    def handle(self, *args, **options):
+        scales = [benchmarks.parse_scale(scale) for scale in options["scales"] or ["1k"]]
+        scenarios = [
+            scenario for scenario in benchmarks.SCENARIOS
+            if not options["routes"] or scenario.name in options["routes"]
+        ]
+
+        report = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "commit": self._git_commit(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "unbenchmarked_routes": benchmarks.unbenchmarked_routes(),
+            "scales": {},
+        }
+        failures = [f"no scenario for route {name}" for name in report["unbenchmarked_routes"]]
+
+        for scale in scales:
+            # Each scale gets a fresh test database so runs are comparable
+            setup_test_environment(debug=False)
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            # SQLite's in-memory test database survives destroy_test_db()
+            # within a process, and so do cached responses
+            call_command("flush", interactive=False, verbosity=0)
+            for cache in caches.all():
+                cache.clear()
+            media_root = tempfile.mkdtemp(prefix="rentals-benchmark-")
+            overrides = override_settings(
+                QUERY_PROFILER=options["profile"],
+                MEDIA_ROOT=media_root,
+                PROPERTY_IMAGE_PROCESSING="sync",
+                # Keep the buckets in the request path, but never let the
+                # repeated requests of a scenario run dry
+                RATE_LIMITS={
+                    scope: {"capacity": 10**9, "rate": "1000000/s"} for scope in settings.RATE_LIMITS
+                },
+            )
+            overrides.enable()
+            profiler.reset()
+            try:
+                self.stdout.write(f"Seeding {scale} rows...")
+                context = benchmarks.seed(scale)
+                results = []
+                for scenario in scenarios:
+                    result = benchmarks.run_scenario(
+                        scenario, context, options["iterations"], options["latency_factor"]
+                    )
+                    results.append(result)
+                    self._print_result(scale, result)
+                    failures.extend(
+                        f"[{scale}] {result['method']} {result['route']}: {failure}"
+                        for failure in result.get("failures", [])
+                    )
+                report["scales"][str(scale)] = results
+                if options["profile"]:
+                    report.setdefault("fingerprints", {})[str(scale)] = {
+                        route: dict(counts.most_common())
+                        for route, counts in profiler.view_fingerprints().items()
+                    }
+            finally:
+                overrides.disable()
+                shutil.rmtree(media_root, ignore_errors=True)
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        report["failures"] = failures
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            if not options["no_fail"]:
+                raise CommandError(f"{len(failures)} benchmark check(s) failed.")
+        else:
+            self.stdout.write(self.style.SUCCESS("All routes within budget."))
+
+    def _print_result(self, scale, result):
+        label = f"[{scale}] {result['method']:<5} {result['route']:<29}"
+        if "skipped" in result:
+            self.stdout.write(f"{label} skipped ({result['skipped']})")
+            return
+        line = (
+            f"{label} queries={result['queries_max']}/{result['query_budget']} "
+            f"p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms"
+        )
+        style = self.style.ERROR if result["failures"] else self.style.SUCCESS
+        self.stdout.write(style(line))
+
+    @staticmethod
+    def _git_commit():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,78 @@
+import csv
+
+from django.contrib.auth.hashers import identify_hasher
+from django.core.management.base import BaseCommand, CommandError
+
+from rentals import accounts
+from rentals.models import UserProfile
+
+COLUMNS = ["username", "email", "first_name", "last_name", "phone_number", "role", "password", "password_hash"]
+
+ROLES = {role for role, _ in UserProfile.ROLE_CHOICES}
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users from a CSV file with the columns "
+        f"{', '.join(COLUMNS)} (only username and email are required). "
+        "Each row goes through the same path as registration. password_hash "
+        "takes a Django-format hash as is; rows with neither password get an "
+        "unusable password and have to reset it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file to import.")
+        parser.add_argument(
+            "--role", default="landlord", choices=sorted(ROLES),
+            help="Role for rows without a role column (default: landlord).",
+        )
+        parser.add_argument(
+            "--skip-existing", action="store_true",
+            help="Silently skip rows whose username or email already exists.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            fh = open(options["path"], newline="", encoding="utf-8")
+        except OSError as e:
+            raise CommandError(str(e))
+
+        created = skipped = 0
+        errors = []
+        with fh:
+            reader = csv.DictReader(fh)
+            missing = {"username", "email"} - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(f"Missing column(s): {', '.join(sorted(missing))}")
+
+            # Line 1 is the header
+            for line, row in enumerate(reader, start=2):
+                row = {key: (value or "").strip() for key, value in row.items() if key in COLUMNS}
+                role = row.pop("role", "") or options["role"]
+                if role not in ROLES:
+                    errors.append(f"line {line}: unknown role {role!r}")
+                    continue
+                if not row["username"] or not row["email"]:
+                    errors.append(f"line {line}: username and email are required")
+                    continue
+                if row.get("password_hash"):
+                    try:
+                        identify_hasher(row["password_hash"])
+                    except ValueError:
+                        errors.append(f"line {line}: unrecognized password_hash format")
+                        continue
+
+                try:
+                    accounts.create_user(role=role, **{key: value for key, value in row.items() if value})
+                except accounts.DuplicateUser as e:
+                    if options["skip_existing"]:
+                        skipped += 1
+                    else:
+                        errors.append(f"line {line}: {'; '.join(e.errors.values())}")
+                    continue
+                created += 1
+
+        for error in errors:
+            self.stderr.write(error)
+        summary = f"Created {created} users, skipped {skipped}, {len(errors)} error(s)."
+        self.stdout.write(self.style.SUCCESS(summary) if not errors else self.style.WARNING(summary))
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from rentals import benchmarks
+
+# (DRF route, async-native route, auth, path arguments from the seed)
+ROUTE_PAIRS = [
+    ("properties-list", "async-properties-list", "anon", lambda ctx: []),
+    ("properties-detail", "async-properties-detail", "anon", lambda ctx: [ctx.property_id]),
+    ("landlord-bookings", "async-landlord-bookings", "landlord", lambda ctx: []),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput of the DRF views under WSGI with the async-native "
+        "views under ASGI, issuing concurrent requests against seeded data in a "
+        "throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", default="1k", help="Rows to seed, e.g. 1k, 100k.")
+        parser.add_argument("--requests", type=int, default=500, help="Requests per route and mode.")
+        parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight at once.")
+        parser.add_argument("--output", help="Write the JSON results to this file.")
+
+    def handle(self, *args, **options):
+        scale = benchmarks.parse_scale(options["scale"])
+        requests, concurrency = options["requests"], options["concurrency"]
+
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f"Seeding {scale} rows...")
+            context = benchmarks.seed(scale)
+            results = []
+            for sync_route, async_route, auth, path_args in ROUTE_PAIRS:
+                headers = benchmarks.auth_headers(context, auth)
+                sync_path = reverse(sync_route, args=path_args(context))
+                async_path = reverse(async_route, args=path_args(context))
+                runs = [
+                    # DRF view, one thread per in-flight request (WSGI)
+                    (sync_route, "wsgi", self._run_wsgi(sync_path, headers, requests, concurrency)),
+                    # The same DRF view behind the ASGI handler
+                    (sync_route, "asgi", self._run_asgi(sync_path, headers, requests, concurrency)),
+                    (async_route, "asgi", self._run_asgi(async_path, headers, requests, concurrency)),
+                ]
+                for route, mode, (elapsed, latencies, errors) in runs:
+                    result = {
+                        "route": route,
+                        "mode": mode,
+                        "requests": requests,
+                        "concurrency": concurrency,
+                        "errors": errors,
+                        "requests_per_second": round(requests / elapsed, 1),
+                        "p50_ms": round(benchmarks._percentile(latencies, 50), 3),
+                        "p99_ms": round(benchmarks._percentile(latencies, 99), 3),
+                    }
+                    results.append(result)
+                    self._print_result(result)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                json.dump({"scale": scale, "results": results}, fh, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def _run_wsgi(self, path, headers, requests, concurrency):
+        def request(_):
+            start = time.perf_counter()
+            response = Client().get(path, headers=headers)
+            return (time.perf_counter() - start) * 1000, response.status_code >= 400
+
+        def close_connections(_):
+            connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(request, range(requests)))
+            # Worker threads each opened their own database connection
+            list(pool.map(close_connections, range(concurrency)))
+        return self._summarize(time.perf_counter() - start, samples)
+
+    def _run_asgi(self, path, headers, requests, concurrency):
+        async def run():
+            client = AsyncClient()
+            slots = asyncio.Semaphore(concurrency)
+
+            async def request():
+                async with slots:
+                    start = time.perf_counter()
+                    response = await client.get(path, headers=headers)
+                    return (time.perf_counter() - start) * 1000, response.status_code >= 400
+
+            return await asyncio.gather(*(request() for _ in range(requests)))
+
+        start = time.perf_counter()
+        samples = asyncio.run(run())
+        return self._summarize(time.perf_counter() - start, samples)
+
+    @staticmethod
+    def _summarize(elapsed, samples):
+        return elapsed, [latency for latency, _ in samples], sum(failed for _, failed in samples)
+
+    def _print_result(self, result):
+        line = (
+            f"{result['mode']:<4} {result['route']:<24} "
+            f"{result['requests_per_second']:>8.1f} req/s "
+            f"p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms"
+        )
+        if result["errors"]:
+            self.stdout.write(self.style.ERROR(f"{line} errors={result['errors']}"))
+        else:
+            self.stdout.write(line)
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rentals.payments import process_pending_callbacks
+
+
+class Command(BaseCommand):
+    help = "Apply queued M-Pesa callbacks to bookings and payments in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--max-attempts", type=int, default=5,
+            help="Give up on a callback after this many failed attempts.",
+        )
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep polling for new callbacks instead of exiting when the queue is empty.",
+        )
+        parser.add_argument(
+            "--sleep", type=float, default=1.0,
+            help="Seconds to wait between polls when the queue is empty (with --loop).",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            handled = process_pending_callbacks(options["batch_size"], options["max_attempts"])
+            total += handled
+            if handled:
+                self.stdout.write(f"Applied {handled} callback(s).")
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Done, {total} callback(s) handled."))
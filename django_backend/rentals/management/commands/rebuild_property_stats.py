@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from rentals import analytics
+
+
+class Command(BaseCommand):
+    help = "Recompute the landlord analytics summary table from bookings and payments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Properties aggregated per query.",
+        )
+
+    def handle(self, *args, **options):
+        written = analytics.rebuild(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} daily stats rows."))
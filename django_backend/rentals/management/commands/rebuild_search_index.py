@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from rentals import geo, search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text and spatial property search indexes from scratch."
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            self.stdout.write("Full-text index is not available on this database; nothing to do.")
+        else:
+            count = search.rebuild_index()
+            self.stdout.write(self.style.SUCCESS(f"Indexed {count} properties."))
+
+        # PostgreSQL's GiST index is maintained by the database itself
+        if geo.rtree_enabled():
+            count = geo.rebuild_index()
+            self.stdout.write(self.style.SUCCESS(f"Spatially indexed {count} located properties."))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rentals.models import Reconciliation
+from rentals.reconciliation import StatementError, reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Match an M-Pesa statement CSV against the recorded payments and record "
+        "missing, duplicate and mismatched payments and bookings stuck in Pending. "
+        "The issues are listed at /api/admin/reconciliations/<id>/issues/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Statement CSV file.")
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="Statement lines per batch (default: RECONCILIATION_BATCH_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            fh = open(options["path"], newline="", encoding="utf-8-sig")
+        except OSError as e:
+            raise CommandError(str(e))
+
+        rec = Reconciliation.objects.create()
+        with fh:
+            try:
+                reconcile(rec, fh, options["batch_size"])
+            except StatementError as e:
+                raise CommandError(f"Reconciliation {rec.pk} failed: {e}")
+
+        self.stdout.write(
+            f"Reconciliation {rec.pk}: {rec.lines} line(s), {rec.matched} matched, {rec.skipped} skipped."
+        )
+        for kind, count in sorted(rec.summary.items()):
+            self.stdout.write(f"  {kind}: {count}")
+        summary = f"{sum(rec.summary.values())} issue(s)."
+        self.stdout.write(self.style.SUCCESS(summary) if not rec.summary else self.style.WARNING(summary))
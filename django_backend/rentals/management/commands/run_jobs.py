@@ -0,0 +1,75 @@
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from rentals import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (emails and notifications)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, default=1,
+            help="Number of worker threads.",
+        )
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep polling for new jobs instead of exiting when the queue is empty.",
+        )
+        parser.add_argument(
+            "--sleep", type=float, default=1.0,
+            help="Seconds to wait between polls when the queue is empty (with --loop).",
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.total = 0
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+        threads = [
+            threading.Thread(target=self.work, args=(f"{prefix}:{n}",), daemon=True)
+            for n in range(options["concurrency"])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            # Let workers finish their current batch so it is not left Running
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS(f"Done, {self.total} job(s) run."))
+
+    def work(self, worker):
+        purged_at = None
+        try:
+            while not self.stop.is_set():
+                if purged_at is None or time.monotonic() - purged_at > 3600:
+                    jobs.purge(timezone.now() - timedelta(days=settings.JOB_KEEP_DAYS))
+                    purged_at = time.monotonic()
+
+                handled = jobs.run_once(worker, self.options["batch_size"])
+                if handled:
+                    with self.lock:
+                        self.total += handled
+                    self.stdout.write(f"{worker}: ran {handled} job(s).")
+                    continue
+                if not self.options["loop"]:
+                    break
+                self.stop.wait(self.options["sleep"])
+        finally:
+            connection.close()
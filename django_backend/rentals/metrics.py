@@ -0,0 +1,199 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware starts a RequestMetrics for each request in a
+context variable. While it is set:
+
+- `record_query()`, installed as an execute wrapper on every database
+  connection, counts queries and their time (also for queries that async
+  views run on worker threads, since the context variable follows them);
+- `serializer_call()`, used by TimedSerializerMixin, adds up the time
+  spent serializing and validating, counting nested serializers once.
+
+With QUERY_PROFILER on, each query is also kept for rentals.profiler.
+
+When the response is ready the middleware adds a Server-Timing header,
+logs one JSON line to the "rentals.performance" logger and observes the
+histograms below, labelled by URL name. `render()` returns them in the
+Prometheus text format for the /api/metrics/ endpoint. The histograms
+live in process memory, so each worker process is scraped separately.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from . import profiler
+
+_current = ContextVar("request_metrics", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+@dataclass
+class RequestMetrics:
+    started: float = field(default_factory=time.perf_counter)
+    db_queries: int = 0
+    db_time: float = 0.0
+    serializer_time: float = 0.0
+    serializing: bool = False
+    # QueryRecords for rentals.profiler; None unless QUERY_PROFILER is on
+    queries: list = None
+
+
+def start(profile=False):
+    """Begin collecting for the current request; returns (metrics, token)."""
+    metrics = RequestMetrics(queries=[] if profile else None)
+    return metrics, _current.set(metrics)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        metrics.db_queries += 1
+        metrics.db_time += duration
+        if metrics.queries is not None:
+            metrics.queries.append(profiler.capture(sql, duration))
+
+
+def serializer_call(method, *args):
+    """Call a serializer method, timing it unless a serializer already is."""
+    metrics = _current.get()
+    if metrics is None or metrics.serializing:
+        return method(*args)
+    metrics.serializing = True
+    started = time.perf_counter()
+    try:
+        return method(*args)
+    finally:
+        metrics.serializing = False
+        metrics.serializer_time += time.perf_counter() - started
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., +Inf count, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = sorted((key, list(series)) for key, series in self._series.items())
+        for label_values, series in series_items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REQUESTS = Counter(
+    "rentals_requests_total", "Requests handled.", ("route", "method", "status")
+)
+LATENCY = Histogram(
+    "rentals_request_duration_seconds", "Time to produce the response.",
+    ("route", "method"), LATENCY_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    "rentals_request_db_queries", "Database queries per request.", ("route", "method"), QUERY_BUCKETS,
+)
+DB_TIME = Histogram(
+    "rentals_request_db_seconds", "Time spent in database queries per request.",
+    ("route", "method"), LATENCY_BUCKETS,
+)
+SERIALIZER_TIME = Histogram(
+    "rentals_request_serializer_seconds", "Time spent in serializers per request.",
+    ("route", "method"), LATENCY_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "rentals_response_size_bytes", "Response body size (streaming responses excluded).",
+    ("route", "method"), SIZE_BUCKETS,
+)
+
+METRICS = [REQUESTS, LATENCY, DB_QUERIES, DB_TIME, SERIALIZER_TIME, RESPONSE_SIZE]
+
+
+def observe(route, method, status, metrics, duration, size):
+    REQUESTS.inc(route, method, status)
+    LATENCY.observe(duration, route, method)
+    DB_QUERIES.observe(metrics.db_queries, route, method)
+    DB_TIME.observe(metrics.db_time, route, method)
+    SERIALIZER_TIME.observe(metrics.serializer_time, route, method)
+    if size is not None:
+        RESPONSE_SIZE.observe(size, route, method)
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,186 @@
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpRequest, JsonResponse
+from django.urls import Resolver404, resolve
+
+from . import metrics, profiler, routers
+
+logger = logging.getLogger("rentals.performance")
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class AsyncCapableMiddleware:
+    """
+    Base for middleware that runs natively under both WSGI and ASGI, like
+    Django's MiddlewareMixin. Subclasses define `handle(request)` and
+    `async __acall__(request)`. With an async `get_response` the instance
+    is itself a coroutine function and `__call__` hands over to
+    `__acall__`, so Django never adapts the chain through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.handle(request)
+
+
+class ReplicaPinningMiddleware(AsyncCapableMiddleware):
+    """
+    After a successful write (a booking, payment, approval, ...) keep the
+    client on the primary database for a few seconds; see rentals.routers.
+    """
+
+    def handle(self, request):
+        response = self.get_response(request)
+        if self.should_pin(request, response):
+            routers.pin_to_primary(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.should_pin(request, response):
+            # Reading request.user may load the session user
+            await sync_to_async(routers.pin_to_primary)(request, response)
+        return response
+
+    @staticmethod
+    def should_pin(request, response):
+        return (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and bool(routers.replica_aliases())
+        )
+
+
+class PerformanceMiddleware(AsyncCapableMiddleware):
+    """
+    Measures every request (latency, database queries and time, serializer
+    time, response size) and reports it as a Server-Timing header, a JSON
+    log line and Prometheus histograms; see rentals.metrics. In profiler
+    mode it also checks the request's queries, see rentals.profiler.
+    """
+
+    def handle(self, request):
+        collected, token = metrics.start(profile=settings.QUERY_PROFILER)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.stop(token)
+        return self.report(request, response, collected)
+
+    async def __acall__(self, request):
+        collected, token = metrics.start(profile=settings.QUERY_PROFILER)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.stop(token)
+        return self.report(request, response, collected)
+
+    def report(self, request, response, collected):
+        duration = time.perf_counter() - collected.started
+
+        match = request.resolver_match
+        route = match.view_name if match else "unmatched"
+        # Streaming bodies are produced after this point
+        size = None if response.streaming else len(response.content)
+        metrics.observe(route, request.method, response.status_code, collected, duration, size)
+        if collected.queries is not None:
+            profiler.report(profiler.analyze(route, request.method, collected.queries))
+
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response["Server-Timing"] = (
+                f"app;dur={duration * 1000:.1f}, "
+                f'db;dur={collected.db_time * 1000:.1f};desc="{collected.db_queries} queries", '
+                f"serializer;dur={collected.serializer_time * 1000:.1f}"
+            )
+
+        level = logging.WARNING if duration * 1000 >= settings.PERFORMANCE_SLOW_REQUEST_MS else logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps({
+                "route": route,
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "duration_ms": round(duration * 1000, 2),
+                "db_queries": collected.db_queries,
+                "db_ms": round(collected.db_time * 1000, 2),
+                "serializer_ms": round(collected.serializer_time * 1000, 2),
+                "response_bytes": size,
+            }))
+        return response
+
+
+class LoadSheddingMiddleware(AsyncCapableMiddleware):
+    """
+    Counts the requests in flight in this worker. Once more than
+    LOAD_SHED_MAX_IN_FLIGHT are running, requests to LOAD_SHED_ROUTES
+    (registration, login, payment callbacks) get a 503 with Retry-After
+    before any authentication, database or password hashing work.
+
+    The limit is per worker process. Under ASGI one process serves many
+    requests at once; a single-threaded WSGI worker never has more than
+    one in flight, so there only a threaded server makes it useful.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def handle(self, request):
+        depth = self.enter()
+        try:
+            if self.shed(request, depth):
+                return self.busy()
+            return self.get_response(request)
+        finally:
+            self.leave()
+
+    async def __acall__(self, request):
+        depth = self.enter()
+        try:
+            if self.shed(request, depth):
+                return self.busy()
+            return await self.get_response(request)
+        finally:
+            self.leave()
+
+    def enter(self):
+        with self.lock:
+            self.in_flight += 1
+            return self.in_flight
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def shed(self, request, depth):
+        return depth > settings.LOAD_SHED_MAX_IN_FLIGHT and self.sheddable(request)
+
+    @staticmethod
+    def busy():
+        response = JsonResponse({"detail": "Server is busy, please retry shortly."}, status=503)
+        response["Retry-After"] = str(settings.LOAD_SHED_RETRY_AFTER)
+        return response
+
+    @staticmethod
+    def sheddable(request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return match.view_name in settings.LOAD_SHED_ROUTES
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rentals", "0004_property_approved_property_landlord_userprofile"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="property",
+            index=models.Index(
+                fields=["approved", "price_per_month"],
+                name="property_approved_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="property",
+            index=models.Index(
+                condition=models.Q(("approved", True)),
+                fields=["-id"],
+                name="property_approved_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def create_fts_index(apps, schema_editor):
+    # The FTS5 index only exists on SQLite; rentals.search falls back to a
+    # plain scan on other backends.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS rentals_property_fts "
+        "USING fts5(name, description, tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO rentals_property_fts (rowid, name, description) "
+        "SELECT id, name, description FROM rentals_property"
+    )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS rentals_property_fts")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rentals", "0005_property_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rentals", "0006_property_fts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentCallback",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("payload", models.JSONField()),
+                ("received_at", models.DateTimeField(auto_now_add=True)),
+                ("processed_at", models.DateTimeField(blank=True, null=True)),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("error", models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="payment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("mpesa_receipt__isnull", False),
+                    models.Q(("mpesa_receipt", ""), _negated=True),
+                ),
+                fields=("mpesa_receipt",),
+                name="payment_unique_mpesa_receipt",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paymentcallback",
+            index=models.Index(
+                condition=models.Q(("processed_at__isnull", True)),
+                fields=["id"],
+                name="paymentcallback_pending_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BACKFILL_CHUNK_SIZE = 2000
+
+
+def backfill_occupancy(apps, schema_editor):
+    # The earliest live booking keeps each (property, date); later double
+    # bookings are left without a calendar row.
+    Booking = apps.get_model("rentals", "Booking")
+    PropertyOccupancy = apps.get_model("rentals", "PropertyOccupancy")
+    bookings = (
+        Booking.objects.exclude(status="Cancelled")
+        .order_by("id")
+        .values_list("id", "property_id", "booking_date")
+        .iterator(chunk_size=BACKFILL_CHUNK_SIZE)
+    )
+    chunk = []
+    for booking_id, property_id, booking_date in bookings:
+        chunk.append(
+            PropertyOccupancy(booking_id=booking_id, property_id=property_id, date=booking_date)
+        )
+        if len(chunk) >= BACKFILL_CHUNK_SIZE:
+            PropertyOccupancy.objects.bulk_create(chunk, ignore_conflicts=True)
+            chunk = []
+    PropertyOccupancy.objects.bulk_create(chunk, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rentals", "0007_payment_callback_inbox"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PropertyOccupancy",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "booking",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occupancy",
+                        to="rentals.booking",
+                    ),
+                ),
+                (
+                    "property",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occupancy",
+                        to="rentals.property",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["date", "property"], name="occupancy_date_property_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("property", "date"),
+                        name="occupancy_unique_property_date",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rentals", "0008_property_occupancy"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PropertyDailyStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("bookings", models.IntegerField(default=0)),
+                (
+                    "paid_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("paid_payments", models.IntegerField(default=0)),
+                ("failed_payments", models.IntegerField(default=0)),
+                (
+                    "property",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="rentals.property",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("property", "day"),
+                        name="dailystats_unique_property_day",
+                    )
+                ],
+            },
+        ),
+    ]
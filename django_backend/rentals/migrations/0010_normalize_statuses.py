@@ -0,0 +1,63 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:50
+
+from django.db import migrations
+from django.db.models import Case, Value, When
+from django.db.models.functions import Lower, Trim
+
+NORMALIZE_CHUNK_SIZE = 2000
+
+BOOKING_STATUSES = {
+    "pending": "Pending",
+    "paid": "Paid",
+    "cancelled": "Cancelled",
+    "canceled": "Cancelled",
+}
+
+PAYMENT_STATUSES = {
+    "pending": "Pending",
+    "paid": "Paid",
+    "success": "Paid",
+    "completed": "Paid",
+    "failed": "Failed",
+}
+
+
+def normalize(model, field, statuses, default):
+    # Rewrite free-text values to the canonical choices one id range at a
+    # time. The migration is non-atomic, so each UPDATE commits on its own
+    # and only ever locks a chunk of rows.
+    canonical = sorted(set(statuses.values()))
+    mapping = Case(
+        *[When(normalized=key, then=Value(value)) for key, value in statuses.items()],
+        default=Value(default),
+    )
+    ids = model.objects.order_by("id").values_list("id", flat=True)
+    last_id = 0
+    while True:
+        upper = ids.filter(id__gt=last_id)[NORMALIZE_CHUNK_SIZE - 1 : NORMALIZE_CHUNK_SIZE].first()
+        chunk = model.objects.filter(id__gt=last_id)
+        if upper is not None:
+            chunk = chunk.filter(id__lte=upper)
+        chunk.exclude(**{f"{field}__in": canonical}).annotate(
+            normalized=Lower(Trim(field))
+        ).update(**{field: mapping})
+        if upper is None:
+            break
+        last_id = upper
+
+
+def normalize_statuses(apps, schema_editor):
+    normalize(apps.get_model("rentals", "Booking"), "status", BOOKING_STATUSES, "Pending")
+    normalize(apps.get_model("rentals", "Payment"), "payment_status", PAYMENT_STATUSES, "Pending")
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("rentals", "0009_property_daily_stats"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_statuses, migrations.RunPython.noop),
+    ]
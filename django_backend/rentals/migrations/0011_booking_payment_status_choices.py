@@ -0,0 +1,57 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rentals", "0010_normalize_statuses"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="booking",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("Pending", "Pending"),
+                    ("Paid", "Paid"),
+                    ("Cancelled", "Cancelled"),
+                ],
+                default="Pending",
+                max_length=10,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="payment_status",
+            field=models.CharField(
+                choices=[
+                    ("Pending", "Pending"),
+                    ("Paid", "Paid"),
+                    ("Failed", "Failed"),
+                ],
+                default="Pending",
+                max_length=10,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["property", "status", "booking_date"],
+                name="booking_prop_status_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["status", "booking_date"], name="booking_status_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["booking", "payment_status"], name="payment_booking_status_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rentals", "0011_booking_payment_status_choices"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="property",
+            name="image",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name="PropertyImage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "original",
+                    models.FileField(editable=False, max_length=255, upload_to=""),
+                ),
+                ("sha256", models.CharField(editable=False, max_length=64)),
+                ("width", models.PositiveIntegerField(blank=True, null=True)),
+                ("height", models.PositiveIntegerField(blank=True, null=True)),
+                ("blurhash", models.CharField(blank=True, max_length=64)),
+                ("variants", models.JSONField(blank=True, default=list)),
+                ("uploaded_at", models.DateTimeField(auto_now_add=True)),
+                ("processed_at", models.DateTimeField(blank=True, null=True)),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("error", models.TextField(blank=True)),
+                (
+                    "property",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="images",
+                        to="rentals.property",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("processed_at__isnull", True)),
+                        fields=["id"],
+                        name="propertyimage_pending_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("property", "sha256"),
+                        name="propertyimage_unique_sha256",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:10
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def create_spatial_index(apps, schema_editor):
+    # rentals.geo uses whichever of these exists and falls back to plain
+    # range filters elsewhere
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS rentals_property_rtree "
+            "USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+        )
+        schema_editor.execute(
+            "INSERT INTO rentals_property_rtree (id, min_lat, max_lat, min_lng, max_lng) "
+            "SELECT id, latitude, latitude, longitude, longitude FROM rentals_property "
+            "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS property_location_gist ON rentals_property "
+            "USING gist (point(longitude, latitude)) WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        )
+
+
+def drop_spatial_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS rentals_property_rtree")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS property_location_gist")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rentals", "0012_property_images"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="property",
+            name="latitude",
+            field=models.FloatField(
+                blank=True,
+                null=True,
+                validators=[
+                    django.core.validators.MinValueValidator(-90),
+                    django.core.validators.MaxValueValidator(90),
+                ],
+            ),
+        ),
+        migrations.AddField(
+            model_name="property",
+            name="longitude",
+            field=models.FloatField(
+                blank=True,
+                null=True,
+                validators=[
+                    django.core.validators.MinValueValidator(-180),
+                    django.core.validators.MaxValueValidator(180),
+                ],
+            ),
+        ),
+        migrations.RunPython(create_spatial_index, drop_spatial_index),
+    ]
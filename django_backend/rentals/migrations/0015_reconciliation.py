@@ -0,0 +1,173 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rentals", "0014_job_queue"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Reconciliation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "statement",
+                    models.FileField(
+                        blank=True,
+                        editable=False,
+                        max_length=255,
+                        upload_to="statements/%Y/%m/",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Queued", "Queued"),
+                            ("Running", "Running"),
+                            ("Done", "Done"),
+                            ("Failed", "Failed"),
+                        ],
+                        default="Queued",
+                        max_length=10,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("lines", models.PositiveIntegerField(default=0)),
+                ("matched", models.PositiveIntegerField(default=0)),
+                ("skipped", models.PositiveIntegerField(default=0)),
+                ("period_start", models.DateTimeField(blank=True, null=True)),
+                ("period_end", models.DateTimeField(blank=True, null=True)),
+                ("summary", models.JSONField(blank=True, default=dict)),
+                ("error", models.TextField(blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ReconciliationIssue",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("Missing", "Missing"),
+                            ("Unmatched", "Unmatched"),
+                            ("Duplicate", "Duplicate"),
+                            ("Mismatch", "Mismatch"),
+                            ("PendingBooking", "Pending booking"),
+                            ("Invalid", "Invalid"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("line", models.PositiveIntegerField(blank=True, null=True)),
+                ("mpesa_receipt", models.CharField(blank=True, max_length=50)),
+                ("details", models.JSONField(blank=True, default=dict)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StatementLine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("line", models.PositiveIntegerField()),
+                ("mpesa_receipt", models.CharField(max_length=50)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["transaction_time"], name="payment_transaction_time_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="reconciliation",
+            name="created_by",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="reconciliationissue",
+            name="booking",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="rentals.booking",
+            ),
+        ),
+        migrations.AddField(
+            model_name="reconciliationissue",
+            name="payment",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="rentals.payment",
+            ),
+        ),
+        migrations.AddField(
+            model_name="reconciliationissue",
+            name="reconciliation",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="issues",
+                to="rentals.reconciliation",
+            ),
+        ),
+        migrations.AddField(
+            model_name="statementline",
+            name="reconciliation",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="rentals.reconciliation"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reconciliationissue",
+            index=models.Index(
+                fields=["reconciliation", "kind", "id"], name="recissue_kind_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="statementline",
+            index=models.Index(
+                fields=["reconciliation", "mpesa_receipt"],
+                name="statementline_receipt_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rentals", "0015_reconciliation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentRawCallback",
+            fields=[
+                (
+                    "payment",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="raw_callback_data",
+                        serialize=False,
+                        to="rentals.payment",
+                    ),
+                ),
+                ("data", models.BinaryField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ArchivedBooking",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("tenant_id", models.BigIntegerField()),
+                ("property_id", models.BigIntegerField()),
+                ("booking_date", models.DateField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Pending", "Pending"),
+                            ("Paid", "Paid"),
+                            ("Cancelled", "Cancelled"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                ("data", models.BinaryField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["tenant_id", "booking_date"],
+                        name="archbooking_tenant_date_idx",
+                    ),
+                    models.Index(
+                        fields=["property_id", "booking_date"],
+                        name="archbooking_prop_date_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedPayment",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("booking_id", models.BigIntegerField(blank=True, null=True)),
+                ("property_id", models.BigIntegerField(blank=True, null=True)),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("payment_date", models.DateTimeField()),
+                (
+                    "payment_status",
+                    models.CharField(
+                        choices=[
+                            ("Pending", "Pending"),
+                            ("Paid", "Paid"),
+                            ("Failed", "Failed"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "mpesa_receipt",
+                    models.CharField(blank=True, max_length=50, null=True),
+                ),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                ("data", models.BinaryField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["booking_id"], name="archpayment_booking_idx"),
+                    models.Index(
+                        fields=["mpesa_receipt"], name="archpayment_receipt_idx"
+                    ),
+                    models.Index(
+                        fields=["property_id", "payment_date"],
+                        name="archpayment_prop_date_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:07
+
+import json
+import zlib
+
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+
+
+def copy_transaction_times(apps, schema_editor):
+    # Rows archived before the column existed keep the time in `data`
+    ArchivedPayment = apps.get_model("rentals", "ArchivedPayment")
+    archived = ArchivedPayment.objects.filter(transaction_time__isnull=True).only(
+        "id", "data"
+    )
+    batch = []
+    for payment in archived.iterator(chunk_size=1000):
+        value = json.loads(zlib.decompress(bytes(payment.data))).get("transaction_time")
+        if value:
+            payment.transaction_time = parse_datetime(value)
+            batch.append(payment)
+        if len(batch) >= 1000:
+            ArchivedPayment.objects.bulk_update(batch, ["transaction_time"])
+            batch = []
+    ArchivedPayment.objects.bulk_update(batch, ["transaction_time"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rentals", "0016_archive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivedpayment",
+            name="transaction_time",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="archivedpayment",
+            index=models.Index(
+                fields=["transaction_time"], name="archpayment_time_idx"
+            ),
+        ),
+        migrations.RunPython(copy_transaction_times, migrations.RunPython.noop),
+    ]
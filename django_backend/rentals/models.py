@@ -1,5 +1,45 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
+
+
+class InvalidTransition(Exception):
+    """A status change that the model's state machine does not allow."""
+
+    def __init__(self, instance, current, target):
+        self.instance = instance
+        self.current = current
+        self.target = target
+        super().__init__(f"{type(instance).__name__} cannot move from {current} to {target}")
+
+
+class StatusMachine:
+    """
+    Model mixin for a choices-backed status column. `TRANSITIONS` maps each
+    status to the statuses it may move to; anything else is rejected by
+    `transition_to()`.
+    """
+    status_field = "status"
+    TRANSITIONS = {}
+
+    def can_transition_to(self, target):
+        return target in self.TRANSITIONS.get(getattr(self, self.status_field), ())
+
+    def transition_to(self, target, save=True):
+        """
+        Move to `target`. Returns False when already there, raises
+        InvalidTransition for an illegal move.
+        """
+        current = getattr(self, self.status_field)
+        if current == target:
+            return False
+        if not self.can_transition_to(target):
+            raise InvalidTransition(self, current, target)
+        setattr(self, self.status_field, target)
+        if save:
+            self.save(update_fields=[self.status_field])
+        return True
 
 
 # Extend User with roles
@@ -29,12 +69,68 @@ class Property(models.Model):
     description = models.TextField(blank=True)
     price_per_month = models.DecimalField(max_digits=10, decimal_places=2)
     image_url = models.URLField(blank=True)
+    # WGS84 degrees; spatially indexed for ?near= and ?bbox= searches (rentals/geo.py)
+    latitude = models.FloatField(
+        blank=True, null=True, validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        blank=True, null=True, validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
+    # Cover photo: the variants of the first processed PropertyImage,
+    # copied here so listings need no extra query (see rentals/images.py)
+    image = models.JSONField(blank=True, null=True, editable=False)
     approved = models.BooleanField(default=False)  # admin approval flag
 
+    class Meta:
+        indexes = [
+            # Public listing: approved properties filtered/sorted by price
+            models.Index(fields=["approved", "price_per_month"], name="property_approved_price_idx"),
+            # Public listing in id (recency) order only touches approved rows
+            models.Index(fields=["-id"], condition=models.Q(approved=True), name="property_approved_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class PropertyImage(models.Model):
+    """
+    An uploaded property photo. `original` and every variant are stored
+    under content-addressed names; `variants` lists the resized copies as
+    [{"width", "height", "webp", "jpeg"}] with storage names, narrowest
+    first. Filled in by rentals.images.process(); a property's photos are
+    shown in upload (id) order.
+    """
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="images")
+    original = models.FileField(max_length=255, editable=False)
+    sha256 = models.CharField(max_length=64, editable=False)
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
+    blurhash = models.CharField(max_length=64, blank=True)
+    variants = models.JSONField(default=list, blank=True)
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            # The same photo uploaded twice to a property is stored once
+            models.UniqueConstraint(fields=["property", "sha256"], name="propertyimage_unique_sha256"),
+        ]
+        indexes = [
+            # The worker only ever scans images that are still pending
+            models.Index(
+                fields=["id"],
+                condition=models.Q(processed_at__isnull=True),
+                name="propertyimage_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Image {self.pk} of {self.property}"
+
+
 class Tenant(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
     phone_number = models.CharField(max_length=20, blank=True)
@@ -43,23 +139,106 @@ class Tenant(models.Model):
         return f"{self.user.first_name} {self.user.last_name}" if self.user else "No User"
 
 
-class Booking(models.Model):
+class Booking(StatusMachine, models.Model):
+    class Status(models.TextChoices):
+        PENDING = "Pending", "Pending"
+        PAID = "Paid", "Paid"
+        CANCELLED = "Cancelled", "Cancelled"
+
+    TRANSITIONS = {
+        Status.PENDING: {Status.PAID, Status.CANCELLED},
+        Status.PAID: {Status.CANCELLED},
+        Status.CANCELLED: set(),
+    }
+
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
     property = models.ForeignKey(Property, on_delete=models.CASCADE)
     booking_date = models.DateField()
     email = models.EmailField()
     created_at = models.DateTimeField(auto_now_add=True)
-    status = models.CharField(max_length=20, default="Pending")
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+
+    class Meta:
+        indexes = [
+            # Landlord dashboards: a property's bookings in a status, by date
+            models.Index(fields=["property", "status", "booking_date"], name="booking_prop_status_date_idx"),
+            # Admin exports and reconciliation filter on status across properties
+            models.Index(fields=["status", "booking_date"], name="booking_status_date_idx"),
+        ]
 
     def __str__(self):
         return f"Booking for {self.tenant} - {self.property}"
 
 
-class Payment(models.Model):
+class PropertyOccupancy(models.Model):
+    """
+    Availability calendar: one row per property per booked date. The unique
+    constraint is what makes double-booking impossible, even for concurrent
+    requests; cancelling a booking deletes its row.
+    """
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="occupancy")
+    date = models.DateField()
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name="occupancy")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["property", "date"], name="occupancy_unique_property_date"),
+        ]
+        indexes = [
+            # Date-range searches across all properties
+            models.Index(fields=["date", "property"], name="occupancy_date_property_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.property} booked on {self.date}"
+
+
+class PropertyDailyStats(models.Model):
+    """
+    Per-property, per-day summary kept up to date by the booking and
+    payment write paths (see rentals/analytics.py), so landlord dashboards
+    never aggregate raw bookings or payments. Bookings count against their
+    booking_date, payments against the day they were recorded.
+    """
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="daily_stats")
+    day = models.DateField()
+    bookings = models.IntegerField(default=0)
+    paid_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid_payments = models.IntegerField(default=0)
+    failed_payments = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["property", "day"], name="dailystats_unique_property_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.property} on {self.day}"
+
+
+# Payments that have a receipt. SQLite only uses the partial unique index
+# on the receipt for queries that repeat its condition, so lookups by
+# receipt filter on this too.
+HAS_RECEIPT = models.Q(mpesa_receipt__isnull=False) & ~models.Q(mpesa_receipt="")
+
+
+class Payment(StatusMachine, models.Model):
+    class Status(models.TextChoices):
+        PENDING = "Pending", "Pending"
+        PAID = "Paid", "Paid"
+        FAILED = "Failed", "Failed"
+
+    status_field = "payment_status"
+    TRANSITIONS = {
+        Status.PENDING: {Status.PAID, Status.FAILED},
+        Status.PAID: set(),
+        Status.FAILED: set(),
+    }
+
     booking = models.ForeignKey(Booking, on_delete=models.CASCADE, null=True, blank=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_date = models.DateTimeField(auto_now_add=True)
-    payment_status = models.CharField(max_length=50, default="Pending")
+    payment_status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
 
     mpesa_receipt = models.CharField(max_length=50, blank=True, null=True)
     phone_number = models.CharField(max_length=20, blank=True, null=True)
@@ -68,6 +247,234 @@ class Payment(models.Model):
     transaction_time = models.DateTimeField(blank=True, null=True)
     raw_callback = models.JSONField(blank=True, null=True)
 
+    class Meta:
+        constraints = [
+            # Safaricom retries callbacks; a receipt may only be recorded once
+            models.UniqueConstraint(
+                fields=["mpesa_receipt"],
+                condition=HAS_RECEIPT,
+                name="payment_unique_mpesa_receipt",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["booking", "payment_status"], name="payment_booking_status_idx"),
+            # Reconciliation looks for payments within a statement's period
+            models.Index(fields=["transaction_time"], name="payment_transaction_time_idx"),
+        ]
+
     def __str__(self):
         return f"Payment {self.amount} for {self.booking or 'No booking'}"
 
+
+class PaymentCallback(models.Model):
+    """
+    Raw M-Pesa callback as forwarded by the Node server. In queued mode the
+    callback view only stores it; the process_payment_callbacks worker
+    applies it later.
+    """
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker only ever scans callbacks that are still pending
+            models.Index(
+                fields=["id"],
+                condition=models.Q(processed_at__isnull=True),
+                name="paymentcallback_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Callback {self.pk} ({'processed' if self.processed_at else 'pending'})"
+
+
+class Job(models.Model):
+    """
+    A unit of background work in the database-backed queue (rentals/jobs.py).
+    `run_jobs` workers claim due jobs, run the handler registered for
+    `name` and retry failures with backoff until `max_attempts` is reached.
+    """
+    class Status(models.TextChoices):
+        QUEUED = "Queued", "Queued"
+        RUNNING = "Running", "Running"
+        DONE = "Done", "Done"
+        FAILED = "Failed", "Failed"
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    # Worker holding the job and when it took it; the lease on a running
+    # job expires after JOB_LEASE_SECONDS
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim due jobs in run_at order
+            models.Index(
+                fields=["run_at", "id"],
+                condition=models.Q(status="Queued"),
+                name="job_due_idx",
+            ),
+            # ...and look for running jobs whose worker died
+            models.Index(
+                fields=["locked_at"],
+                condition=models.Q(status="Running"),
+                name="job_running_idx",
+            ),
+            # Pruning finished jobs
+            models.Index(fields=["finished_at"], name="job_finished_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} job {self.pk} ({self.status})"
+
+
+class Reconciliation(models.Model):
+    """
+    One run of matching an M-Pesa statement against the recorded payments
+    (rentals/reconciliation.py). What did not match is in its issues.
+    """
+    class Status(models.TextChoices):
+        QUEUED = "Queued", "Queued"
+        RUNNING = "Running", "Running"
+        DONE = "Done", "Done"
+        FAILED = "Failed", "Failed"
+
+    statement = models.FileField(upload_to="statements/%Y/%m/", max_length=255, blank=True, editable=False)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # Statement lines read, matched to a payment, and skipped as not
+    # completed incoming payments
+    lines = models.PositiveIntegerField(default=0)
+    matched = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    # Earliest and latest transaction on the statement
+    period_start = models.DateTimeField(blank=True, null=True)
+    period_end = models.DateTimeField(blank=True, null=True)
+    # Number of issues of each kind
+    summary = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Reconciliation {self.pk} ({self.status})"
+
+
+class StatementLine(models.Model):
+    """
+    The receipt of each statement line while its reconciliation runs, for
+    the passes that need the whole statement; deleted when the run finishes.
+    """
+    reconciliation = models.ForeignKey(Reconciliation, on_delete=models.CASCADE)
+    line = models.PositiveIntegerField()
+    mpesa_receipt = models.CharField(max_length=50)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["reconciliation", "mpesa_receipt"], name="statementline_receipt_idx"),
+        ]
+
+
+class ReconciliationIssue(models.Model):
+    class Kind(models.TextChoices):
+        # On the statement, but no payment has its receipt
+        MISSING = "Missing", "Missing"
+        # A paid payment within the statement period that is not on it
+        UNMATCHED = "Unmatched", "Unmatched"
+        # A receipt on more than one statement line
+        DUPLICATE = "Duplicate", "Duplicate"
+        # Amount, phone, time or status differ between statement and payment
+        MISMATCH = "Mismatch", "Mismatch"
+        # The payment went through but its booking is still Pending
+        PENDING_BOOKING = "PendingBooking", "Pending booking"
+        # A line that could not be read
+        INVALID = "Invalid", "Invalid"
+
+    reconciliation = models.ForeignKey(Reconciliation, on_delete=models.CASCADE, related_name="issues")
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    line = models.PositiveIntegerField(blank=True, null=True)
+    mpesa_receipt = models.CharField(max_length=50, blank=True)
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True)
+    booking = models.ForeignKey(Booking, on_delete=models.SET_NULL, null=True, blank=True)
+    details = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["reconciliation", "kind", "id"], name="recissue_kind_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.mpesa_receipt or self.line}"
+
+
+class PaymentRawCallback(models.Model):
+    """
+    The Safaricom callback a payment was recorded from, as zlib-compressed
+    JSON outside the payments table (see rentals/archive.py).
+    """
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, primary_key=True, related_name="raw_callback_data")
+    data = models.BinaryField()
+
+
+class ArchivedBooking(models.Model):
+    """
+    A booking moved out of the hot tables by rentals/archive.py. The columns
+    it is looked up by are kept as plain values (the tenant or property may
+    be gone); the full row is `data`, zlib-compressed JSON.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    tenant_id = models.BigIntegerField()
+    property_id = models.BigIntegerField()
+    booking_date = models.DateField()
+    status = models.CharField(max_length=10, choices=Booking.Status.choices)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["tenant_id", "booking_date"], name="archbooking_tenant_date_idx"),
+            models.Index(fields=["property_id", "booking_date"], name="archbooking_prop_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived booking {self.pk}"
+
+
+class ArchivedPayment(models.Model):
+    """A payment archived with its booking; `data` includes the raw callback."""
+    id = models.BigIntegerField(primary_key=True)
+    booking_id = models.BigIntegerField(blank=True, null=True)
+    property_id = models.BigIntegerField(blank=True, null=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_date = models.DateTimeField()
+    payment_status = models.CharField(max_length=10, choices=Payment.Status.choices)
+    mpesa_receipt = models.CharField(max_length=50, blank=True, null=True)
+    transaction_time = models.DateTimeField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["booking_id"], name="archpayment_booking_idx"),
+            models.Index(fields=["mpesa_receipt"], name="archpayment_receipt_idx"),
+            # Reconciliation looks for paid payments of a statement's period
+            models.Index(fields=["transaction_time"], name="archpayment_time_idx"),
+            # Rebuilding the landlord analytics
+            models.Index(fields=["property_id", "payment_date"], name="archpayment_prop_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived payment {self.pk}"
@@ -0,0 +1,120 @@
+"""
+Emails to tenants and landlords, sent from the job queue (rentals/jobs.py).
+
+Request handlers only enqueue a `notify.*` job holding ids, which costs
+them one INSERT. A worker later loads what the messages need for a whole
+batch of events at once and queues one `email.send` job per message;
+those are sent in batches over a single mail server connection.
+"""
+from django.core.mail import EmailMessage, get_connection
+
+from . import jobs
+from .models import Booking, Payment, Property
+
+BOOKING_CREATED = "notify.booking_created"
+PROPERTY_APPROVED = "notify.property_approved"
+PAYMENT_RESULT = "notify.payment_result"
+SEND_EMAIL = "email.send"
+
+SIGNATURE = "\n\nRental Connect"
+
+
+def email(to, subject, body):
+    return {"to": to, "subject": subject, "body": body + SIGNATURE}
+
+
+def _queue_emails(messages):
+    messages = [message for message in messages if message["to"]]
+    if messages:
+        jobs.enqueue_many(SEND_EMAIL, messages)
+
+
+@jobs.handler(SEND_EMAIL, batch_size=50, max_attempts=8)
+def send_emails(payloads):
+    # Failing to connect raises and retries the whole batch; a rejected
+    # message only retries that one
+    errors = []
+    with get_connection() as connection:
+        for payload in payloads:
+            message = EmailMessage(payload["subject"], payload["body"], to=[payload["to"]], connection=connection)
+            try:
+                message.send()
+            except Exception as exc:
+                errors.append(exc)
+            else:
+                errors.append(None)
+    return errors
+
+
+@jobs.handler(BOOKING_CREATED, batch_size=100)
+def booking_created(payloads):
+    bookings = Booking.objects.select_related("property__landlord").in_bulk(
+        [payload["booking_id"] for payload in payloads]
+    )
+    messages = []
+    for booking in bookings.values():
+        prop = booking.property
+        messages.append(email(
+            booking.email,
+            "Booking received",
+            f"Your booking for {prop.name} on {booking.booking_date:%d %b %Y} has been received. "
+            f"Complete the payment of KES {prop.price_per_month} to confirm it.",
+        ))
+        if prop.landlord is not None:
+            messages.append(email(
+                prop.landlord.email,
+                f"New booking for {prop.name}",
+                f"{prop.name} has been booked for {booking.booking_date:%d %b %Y} by {booking.email}.",
+            ))
+    _queue_emails(messages)
+
+
+@jobs.handler(PROPERTY_APPROVED, batch_size=100)
+def property_approved(payloads):
+    properties = Property.objects.select_related("landlord").in_bulk(
+        [payload["property_id"] for payload in payloads]
+    )
+    _queue_emails(
+        email(
+            prop.landlord.email,
+            f"{prop.name} is now listed",
+            f"{prop.name} has been approved and is now visible to tenants.",
+        )
+        for prop in properties.values()
+        if prop.landlord is not None
+    )
+
+
+@jobs.handler(PAYMENT_RESULT, batch_size=100)
+def payment_result(payloads):
+    payments = Payment.objects.select_related("booking__property__landlord").in_bulk(
+        [payload["payment_id"] for payload in payloads]
+    )
+    messages = []
+    for payment in payments.values():
+        booking = payment.booking
+        if booking is None:
+            continue
+        prop = booking.property
+        if payment.payment_status != Payment.Status.PAID:
+            reason = f" ({payment.result_desc})" if payment.result_desc else ""
+            messages.append(email(
+                booking.email,
+                "Payment failed",
+                f"Your payment of KES {payment.amount} for {prop.name} did not go through{reason}. "
+                f"Your booking is still pending; please try again.",
+            ))
+            continue
+        messages.append(email(
+            booking.email,
+            "Booking confirmed",
+            f"We received your payment of KES {payment.amount} (M-Pesa receipt {payment.mpesa_receipt}). "
+            f"Your booking for {prop.name} on {booking.booking_date:%d %b %Y} is confirmed.",
+        ))
+        if prop.landlord is not None:
+            messages.append(email(
+                prop.landlord.email,
+                f"Payment received for {prop.name}",
+                f"{booking.email} paid KES {payment.amount} for {booking.booking_date:%d %b %Y}.",
+            ))
+    _queue_emails(messages)
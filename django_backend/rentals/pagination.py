@@ -0,0 +1,69 @@
+from rest_framework.pagination import CursorPagination
+
+
+class PropertyCursorPagination(CursorPagination):
+    """
+    Keyset pagination for property listings.
+
+    Ordering by the primary key keeps the order stable and lets every page
+    be fetched with an indexed `WHERE id < cursor` instead of an OFFSET scan.
+    """
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = "-id"
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        # Break ties on non-unique sort keys (e.g. price) by id so the
+        # order, and therefore every cursor, stays deterministic.
+        if not any(field.lstrip("-") in ("id", "pk") for field in ordering):
+            ordering += ("-id" if ordering[0].startswith("-") else "id",)
+        return ordering
+
+
+class BookingCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the booking dashboards, newest booking first.
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    ordering = "-id"
+
+
+class PaymentCursorPagination(CursorPagination):
+    """
+    Keyset pagination for a tenant's payments, newest first.
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    ordering = "-id"
+
+
+class ReconciliationCursorPagination(CursorPagination):
+    """
+    Keyset pagination for reconciliation runs, newest first.
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = "-id"
+
+
+class ReconciliationIssueCursorPagination(ReconciliationCursorPagination):
+    """
+    Keyset pagination for the issues of a reconciliation, in statement order.
+    """
+    ordering = "id"
+
+
+class ArchiveCursorPagination(CursorPagination):
+    """
+    Keyset pagination for archived bookings and payments, newest first.
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    ordering = "-id"
@@ -0,0 +1,38 @@
+import json
+
+from rest_framework.parsers import BaseParser
+
+
+class InvalidLine:
+    """Placeholder for an NDJSON line that is not a JSON object."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON lazily: `request.data` is a generator
+    yielding one dict per non-blank line (or an InvalidLine), so large
+    uploads are never held in memory at once.
+    """
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", "utf-8")
+        return self._iter_lines(stream, encoding)
+
+    @staticmethod
+    def _iter_lines(stream, encoding):
+        if stream is None:
+            return
+        for raw in stream:
+            line = raw.decode(encoding).strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield InvalidLine(f"Invalid JSON: {exc}")
+                continue
+            yield row if isinstance(row, dict) else InvalidLine("Expected a JSON object.")
@@ -0,0 +1,130 @@
+"""
+Applying M-Pesa callbacks to bookings and payments.
+
+`apply_callback()` is shared by the synchronous callback view and the
+queued pipeline (`PaymentCallback` rows drained by the
+process_payment_callbacks worker). It is idempotent on `mpesa_receipt`,
+archived payments included, so Safaricom retries never create a second
+payment.
+"""
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import analytics, archive, jobs, notifications
+from .models import HAS_RECEIPT, ArchivedPayment, Booking, Payment, PaymentCallback
+
+
+class CallbackError(Exception):
+    """A callback that can never be applied, e.g. for an unknown booking."""
+
+
+def parse_transaction_date(value):
+    if not value:
+        return None
+    try:
+        return timezone.make_aware(datetime.strptime(str(value), "%Y%m%d%H%M%S"))
+    except ValueError:
+        return None
+
+
+def apply_callback(data):
+    """
+    Record the payment described by a forwarded callback and mark the
+    booking paid on success. A Pending payment already holding the receipt
+    (e.g. created through /api/payments/) is settled instead of left as it
+    is. Returns `(payment, created)`; `payment` is an ArchivedPayment when
+    the receipt was recorded and archived already.
+    """
+    mpesa_receipt = data.get("mpesa_receipt")
+    result_code = data.get("result_code")
+    status = Payment.Status.PAID if result_code == 0 else Payment.Status.FAILED
+
+    with transaction.atomic():
+        existing = None
+        if mpesa_receipt:
+            existing = Payment.objects.select_for_update().filter(HAS_RECEIPT, mpesa_receipt=mpesa_receipt).first()
+            if existing is None:
+                archived = ArchivedPayment.objects.filter(mpesa_receipt=mpesa_receipt).first()
+                if archived is not None:
+                    return archived, False
+            elif existing.payment_status != Payment.Status.PENDING:
+                return existing, False
+
+        try:
+            booking = (
+                Booking.objects.select_for_update(of=("self",))
+                .get(id=data.get("booking_id"), tenant__user__email=data.get("email"))
+            )
+        except (Booking.DoesNotExist, ValueError, TypeError):
+            raise CallbackError("Booking not found")
+
+        # Money received for a cancelled booking is still recorded, but
+        # does not revive the booking
+        if status == Payment.Status.PAID and booking.can_transition_to(Booking.Status.PAID):
+            booking.transition_to(Booking.Status.PAID)
+
+        fields = {
+            "booking": booking,
+            "amount": data.get("amount") or 0,
+            "phone_number": data.get("phone_number"),
+            "result_code": result_code,
+            "result_desc": data.get("result_desc"),
+            "transaction_time": parse_transaction_date(data.get("transaction_date")),
+        }
+        if existing is not None:
+            # The callback is the authority on the booking and amount
+            payment = existing
+            for name, value in fields.items():
+                setattr(payment, name, value)
+            payment.transition_to(status, save=False)
+            payment.save(update_fields=[*fields, "payment_status"])
+            archive.store_raw_callback(payment, data.get("raw_callback"))
+        else:
+            try:
+                # Savepoint, so losing a race on the receipt constraint
+                # only undoes the insert
+                with transaction.atomic():
+                    payment = Payment.objects.create(payment_status=status, mpesa_receipt=mpesa_receipt, **fields)
+                    archive.store_raw_callback(payment, data.get("raw_callback"))
+            except IntegrityError:
+                if not mpesa_receipt:
+                    raise
+                return Payment.objects.get(HAS_RECEIPT, mpesa_receipt=mpesa_receipt), False
+
+        analytics.record_payments([payment])
+        jobs.enqueue(notifications.PAYMENT_RESULT, {"payment_id": payment.pk})
+
+    return payment, existing is None
+
+
+def process_pending_callbacks(batch_size=100, max_attempts=5):
+    """
+    Apply up to `batch_size` queued callbacks inside one transaction, each
+    in its own savepoint. Returns the number of callbacks handled.
+
+    Callbacks that fail with CallbackError are closed with the error;
+    unexpected errors leave them pending until `max_attempts` is reached.
+    """
+    with transaction.atomic():
+        batch = list(
+            PaymentCallback.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, attempts__lt=max_attempts)
+            .order_by("id")[:batch_size]
+        )
+        now = timezone.now()
+        for callback in batch:
+            callback.attempts += 1
+            try:
+                apply_callback(callback.payload)
+            except CallbackError as exc:
+                callback.processed_at = now
+                callback.error = str(exc)
+            except Exception as exc:
+                callback.error = repr(exc)
+            else:
+                callback.processed_at = now
+                callback.error = ""
+        PaymentCallback.objects.bulk_update(batch, ["attempts", "processed_at", "error"])
+    return len(batch)
@@ -1,12 +1,25 @@
 from rest_framework import permissions
 
+from .authentication import ClaimsUser
+
+
+def get_role(user):
+    """
+    Role of an authenticated user: taken from the token claims for
+    ClaimsUser, otherwise from the user's profile.
+    """
+    if isinstance(user, ClaimsUser):
+        return user.role
+    profile = getattr(user, "profile", None)
+    return profile.role if profile is not None else None
+
+
 class IsLandlord(permissions.BasePermission):
     def has_permission(self, request, view):
         return (
             request.user
             and request.user.is_authenticated
-            and hasattr(request.user, "profile")
-            and request.user.profile.role == "landlord"
+            and get_role(request.user) == "landlord"
         )
     
 class IsAdmin(permissions.BasePermission):
@@ -17,6 +30,5 @@ class IsAdmin(permissions.BasePermission):
         return (
             request.user
             and request.user.is_authenticated
-            and hasattr(request.user, "profile")
-            and request.user.profile.role == "admin"
-        )
\ No newline at end of file
+            and get_role(request.user) == "admin"
+        )
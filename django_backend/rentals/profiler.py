@@ -0,0 +1,221 @@
+"""
+Opt-in query profiler for finding N+1 patterns and slow queries.
+
+With QUERY_PROFILER = True, PerformanceMiddleware keeps every query of a
+request along with where it came from: the serializer field being read
+(found by walking the stack for DRF's Field.get_attribute) and the
+innermost line of rentals code. After the response it:
+
+- fingerprints each query (literals and IN lists collapsed) and adds the
+  fingerprints to a per-view tally, see `view_fingerprints()`;
+- flags query shapes repeated QUERY_PROFILER_REPEAT_THRESHOLD or more
+  times in the request, the signature of a per-row lookup;
+- flags queries slower than QUERY_PROFILER_SLOW_MS;
+- compares the query count with the view's budget (QUERY_BUDGETS, or the
+  budgets of the benchmark scenarios when that is None).
+
+Problems are logged on the "rentals.profiler" logger. With
+QUERY_PROFILER_STRICT = True a request over its budget raises
+QueryBudgetExceeded instead, which fails the test that made it.
+
+Walking the stack on every query is too slow for production; the
+profiler is meant for development, tests and the benchmark command.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from rest_framework.fields import Field
+
+logger = logging.getLogger("rentals.profiler")
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Frames of the instrumentation itself are never a query's source
+_SKIPPED_FILES = {
+    os.path.join(APP_DIR, "profiler.py"),
+    os.path.join(APP_DIR, "metrics.py"),
+}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"\bIN \(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(Exception):
+    """A request ran more queries than its view's budget (strict mode)."""
+
+
+def fingerprint(sql):
+    """SQL with its literal values removed, so per-row queries compare equal."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+@dataclass
+class QueryRecord:
+    sql: str
+    duration: float
+    field: str = None  # Serializer.field (source=...) that triggered it
+    location: str = None  # innermost rentals code line
+
+
+def capture(sql, duration):
+    """Record a query together with where it was issued from."""
+    serializer_field = location = None
+    frame = sys._getframe(1)
+    while frame is not None and (serializer_field is None or location is None):
+        code = frame.f_code
+        if serializer_field is None and code.co_name == "get_attribute":
+            owner = frame.f_locals.get("self")
+            if isinstance(owner, Field):
+                serializer_field = (
+                    f"{type(owner.parent).__name__}.{owner.field_name} (source={owner.source})"
+                )
+        if (
+            location is None
+            and code.co_filename.startswith(APP_DIR)
+            and code.co_filename not in _SKIPPED_FILES
+        ):
+            location = f"{os.path.relpath(code.co_filename, APP_DIR)}:{frame.f_lineno} in {code.co_name}"
+        frame = frame.f_back
+    return QueryRecord(sql, duration, serializer_field, location)
+
+
+@dataclass
+class RepeatedQuery:
+    fingerprint: str
+    count: int
+    total_ms: float
+    sources: list
+
+
+@dataclass
+class RequestProfile:
+    route: str
+    method: str
+    query_count: int
+    budget: int = None
+    repeated: list = field(default_factory=list)
+    slow: list = field(default_factory=list)
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.query_count > self.budget
+
+    @property
+    def has_problems(self):
+        return self.over_budget or bool(self.repeated) or bool(self.slow)
+
+
+_view_fingerprints = defaultdict(Counter)
+# Problem sets already logged, so a view logs each kind of problem once
+_reported = set()
+_lock = threading.Lock()
+
+
+def view_fingerprints():
+    """{route: Counter(fingerprint -> queries)} since the last reset()."""
+    with _lock:
+        return {route: Counter(counts) for route, counts in _view_fingerprints.items()}
+
+
+def reset():
+    with _lock:
+        _view_fingerprints.clear()
+        _reported.clear()
+
+
+def _default_budgets():
+    from . import benchmarks
+
+    budgets = defaultdict(dict)
+    for scenario in benchmarks.SCENARIOS:
+        budgets[scenario.name][scenario.method.upper()] = scenario.query_budget
+    return dict(budgets)
+
+
+_budgets = None
+
+
+def budget_for(route, method):
+    """
+    QUERY_BUDGETS maps a URL name to a query budget, either a number or a
+    {method: number} dict; None if the route has no budget.
+    """
+    global _budgets
+    budgets = settings.QUERY_BUDGETS
+    if budgets is None:
+        if _budgets is None:
+            _budgets = _default_budgets()
+        budgets = _budgets
+    budget = budgets.get(route)
+    if isinstance(budget, dict):
+        return budget.get(method)
+    return budget
+
+
+def analyze(route, method, records):
+    """Build the RequestProfile of one request's queries."""
+    fingerprints = [fingerprint(record.sql) for record in records]
+    with _lock:
+        _view_fingerprints[route].update(fingerprints)
+
+    profile = RequestProfile(route, method, len(records), budget_for(route, method))
+
+    by_shape = defaultdict(list)
+    for shape, record in zip(fingerprints, records):
+        by_shape[shape].append(record)
+    for shape, shape_records in by_shape.items():
+        if len(shape_records) >= settings.QUERY_PROFILER_REPEAT_THRESHOLD:
+            sources = Counter(record.field or record.location or "unknown" for record in shape_records)
+            profile.repeated.append(RepeatedQuery(
+                shape,
+                len(shape_records),
+                round(sum(record.duration for record in shape_records) * 1000, 3),
+                [f"{source} x{count}" for source, count in sources.most_common()],
+            ))
+
+    slow_seconds = settings.QUERY_PROFILER_SLOW_MS / 1000
+    profile.slow = [record for record in records if record.duration >= slow_seconds]
+    return profile
+
+
+def report(profile):
+    """
+    Log a request's problems, once per distinct set of problems per view;
+    raise in strict mode when over budget.
+    """
+    if not profile.has_problems:
+        return
+    key = (
+        profile.route,
+        profile.method,
+        profile.over_budget,
+        frozenset(repeated.fingerprint for repeated in profile.repeated),
+        frozenset(fingerprint(record.sql) for record in profile.slow),
+    )
+    lines = [f"{profile.method} {profile.route}: {profile.query_count} queries (budget {profile.budget})"]
+    for repeated in profile.repeated:
+        lines.append(f"  repeated x{repeated.count} ({repeated.total_ms}ms): {repeated.fingerprint}")
+        lines.extend(f"    from {source}" for source in repeated.sources)
+    for record in profile.slow:
+        lines.append(f"  slow {record.duration * 1000:.1f}ms: {fingerprint(record.sql)}")
+        lines.append(f"    from {record.field or record.location or 'unknown'}")
+    with _lock:
+        first = key not in _reported
+        _reported.add(key)
+    if first:
+        logger.warning("\n".join(lines))
+
+    if profile.over_budget and settings.QUERY_PROFILER_STRICT:
+        raise QueryBudgetExceeded(lines[0])
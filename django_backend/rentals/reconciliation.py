@@ -0,0 +1,439 @@
+"""
+Reconciling M-Pesa statements against the recorded payments.
+
+`reconcile()` reads a statement CSV line by line and handles it in
+batches of RECONCILIATION_BATCH_SIZE lines. For each batch it:
+
+- copies the receipts into the StatementLine staging table, and
+- looks up their payments with one `mpesa_receipt IN (...)` query on the
+  unique receipt index, and the receipts not found among the archived
+  payments (rentals.archive). Receipts without a payment, payments whose
+  amount, phone, time or status differ from the statement, and paid
+  bookings still Pending become ReconciliationIssues. Issues about an
+  archived payment name it in `details["archived_payment"]`.
+
+Two grouped queries over the staging table then flag receipts that are on
+more than one line and paid payments from the statement's period that are
+not on it. Memory use depends on the batch size, not on the length of
+the statement.
+
+Statements may use the column names of the M-Pesa portal export
+("Receipt No.", "Completion Time", "Paid In", "Other Party Info",
+"Transaction Status") or the Payment field names. Uploads through the API
+are reconciled by the job queue; `manage.py reconcile_payments` runs a
+local file directly.
+"""
+import csv
+import io
+import re
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Exists, Min, OuterRef, Value
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import archive, jobs
+from .models import (
+    HAS_RECEIPT, ArchivedPayment, Booking, Payment, Reconciliation, ReconciliationIssue, StatementLine,
+)
+
+RUN = "reconciliation.run"
+
+Kind = ReconciliationIssue.Kind
+
+# Accepted header names of each field, lowercase, portal export first
+COLUMNS = {
+    "mpesa_receipt": ("receipt no.", "receipt no", "receipt", "mpesa_receipt"),
+    "amount": ("paid in", "amount"),
+    "transaction_time": ("completion time", "transaction_time"),
+    "phone_number": ("other party info", "phone_number", "phone"),
+    "status": ("transaction status", "status"),
+}
+REQUIRED = ("mpesa_receipt", "amount")
+
+# Any other status is not a completed payment and the line is skipped
+COMPLETED = {"", "completed", "success", "paid"}
+
+# The portal's "01/10/2026 12:00:30" is read with a regex, which is much
+# faster than strptime; other formats are tried in turn
+PORTAL_TIME = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4}) (\d{1,2}):(\d{2})(?::(\d{2}))?$")
+TIME_FORMATS = ("%d-%m-%Y %H:%M:%S", "%Y%m%d%H%M%S")
+
+MAX_AMOUNT = Decimal("100000000")
+
+
+class StatementError(ValueError):
+    """A statement that cannot be reconciled at all."""
+
+
+class Line(NamedTuple):
+    line: int
+    mpesa_receipt: str
+    amount: Decimal
+    phone_number: str
+    transaction_time: datetime
+
+
+def columns(header):
+    """Map each field to its position in the statement's `header` row."""
+    names = [name.strip().lower() for name in header]
+    found = {}
+    for field, aliases in COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                found[field] = names.index(alias)
+                break
+    missing = [f"{COLUMNS[field][0]!r} or {field!r}" for field in REQUIRED if field not in found]
+    if missing:
+        raise StatementError(f"Missing column(s): {', '.join(missing)}")
+    return found
+
+
+def check_header(upload):
+    """Raise StatementError unless `upload` starts with a usable header row."""
+    upload.seek(0)
+    first = upload.readline()
+    upload.seek(0)
+    try:
+        header = next(csv.reader([first.decode("utf-8-sig")]), [])
+    except (UnicodeDecodeError, csv.Error):
+        raise StatementError("Upload a UTF-8 CSV statement.")
+    columns(header)
+
+
+def _cell(row, cols, field):
+    index = cols.get(field)
+    return row[index].strip() if index is not None and index < len(row) else ""
+
+
+def parse_time(value, tz):
+    """A statement time; naive times are in `tz`, like callback TransactionDates."""
+    if not value:
+        return None
+    parsed = None
+    match = PORTAL_TIME.match(value)
+    try:
+        if match:
+            day, month, year, hour, minute, second = match.groups()
+            parsed = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second or 0))
+        else:
+            parsed = parse_datetime(value)
+    except ValueError:
+        pass
+    for time_format in TIME_FORMATS:
+        if parsed is not None:
+            break
+        try:
+            parsed = datetime.strptime(value, time_format)
+        except ValueError:
+            pass
+    if parsed is None:
+        raise ValueError(f"unreadable time {value!r}")
+    return timezone.make_aware(parsed, tz) if timezone.is_naive(parsed) else parsed
+
+
+def parse_phone(value):
+    """Digits of a phone number, or "" when masked ("2547****678 - NAME")."""
+    number = value.split(" - ")[0]
+    if "*" in number:
+        return ""
+    return re.sub(r"\D", "", number)[:20]
+
+
+def same_phone(a, b):
+    # 0712345678, 712345678 and 254712345678 are the same subscriber
+    a, b = re.sub(r"\D", "", a), re.sub(r"\D", "", b)
+    return a[-9:] == b[-9:]
+
+
+def parse_line(number, row, cols, tz):
+    """
+    The Line of a statement row, or None for a row that is not a
+    completed incoming payment. Raises ValueError for a row that cannot
+    be read.
+    """
+    if _cell(row, cols, "status").lower() not in COMPLETED:
+        return None
+    amount = _cell(row, cols, "amount").replace(",", "")
+    if not amount:
+        # Money paid out
+        return None
+    try:
+        amount = Decimal(amount)
+    except InvalidOperation:
+        raise ValueError(f"unreadable amount {amount!r}")
+    if not amount.is_finite() or amount >= MAX_AMOUNT:
+        raise ValueError(f"unreadable amount {str(amount)!r}")
+    if amount <= 0:
+        return None
+    receipt = _cell(row, cols, "mpesa_receipt")
+    if not receipt or len(receipt) > 50:
+        raise ValueError("missing or unreadable receipt")
+    return Line(
+        number,
+        receipt,
+        amount.quantize(Decimal("0.01")),
+        parse_phone(_cell(row, cols, "phone_number")),
+        parse_time(_cell(row, cols, "transaction_time"), tz),
+    )
+
+
+def _json(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return None if value is None else str(value)
+
+
+def _issue(rec, kind, line=None, receipt="", payment=None, **details):
+    if payment and payment.get("archived"):
+        # The payment and booking rows are gone; keep the archived id
+        details["archived_payment"] = payment["id"]
+        payment = None
+    return ReconciliationIssue(
+        reconciliation=rec,
+        kind=kind,
+        line=line,
+        mpesa_receipt=receipt or "",
+        payment_id=payment and payment["id"],
+        booking_id=payment and payment["booking_id"],
+        details=details,
+    )
+
+
+def _archived_payments(receipts):
+    """Archived payments by receipt, shaped like the rows match() reads."""
+    if not receipts:
+        return {}
+    payments = {}
+    archived = ArchivedPayment.objects.filter(mpesa_receipt__in=receipts).values(
+        "id", "mpesa_receipt", "amount", "transaction_time", "payment_status", "booking_id", "data",
+    )
+    for payment in archived:
+        payment["phone_number"] = archive.decompress(payment.pop("data")).get("phone_number")
+        payment["booking__status"] = None
+        payment["archived"] = True
+        payments[payment["mpesa_receipt"]] = payment
+    return payments
+
+
+def match(rec, lines, tolerance):
+    """Compare statement `lines` with their payments. Returns (issues, matched)."""
+    payments = (
+        Payment.objects.filter(HAS_RECEIPT, mpesa_receipt__in={line.mpesa_receipt for line in lines})
+        .values(
+            "id", "mpesa_receipt", "amount", "phone_number", "transaction_time", "payment_status",
+            "booking_id", "booking__status",
+        )
+    )
+    payments = {payment["mpesa_receipt"]: payment for payment in payments}
+    payments.update(_archived_payments({line.mpesa_receipt for line in lines} - payments.keys()))
+    issues, matched = [], 0
+    for line in lines:
+        payment = payments.get(line.mpesa_receipt)
+        if payment is None:
+            issues.append(_issue(
+                rec, Kind.MISSING, line.line, line.mpesa_receipt,
+                amount=_json(line.amount), phone_number=line.phone_number,
+                transaction_time=_json(line.transaction_time),
+            ))
+            continue
+        matched += 1
+
+        differences = {}
+        if payment["amount"] != line.amount:
+            differences["amount"] = (line.amount, payment["amount"])
+        if line.phone_number and payment["phone_number"] and not same_phone(line.phone_number, payment["phone_number"]):
+            differences["phone_number"] = (line.phone_number, payment["phone_number"])
+        if (
+            line.transaction_time and payment["transaction_time"]
+            and abs(line.transaction_time - payment["transaction_time"]) > tolerance
+        ):
+            differences["transaction_time"] = (line.transaction_time, payment["transaction_time"])
+        if payment["payment_status"] != Payment.Status.PAID:
+            differences["payment_status"] = ("Completed", payment["payment_status"])
+        if differences:
+            issues.append(_issue(rec, Kind.MISMATCH, line.line, line.mpesa_receipt, payment, **{
+                field: {"statement": _json(statement), "recorded": _json(recorded)}
+                for field, (statement, recorded) in differences.items()
+            }))
+
+        if payment["booking__status"] == Booking.Status.PENDING:
+            issues.append(_issue(rec, Kind.PENDING_BOOKING, line.line, line.mpesa_receipt, payment))
+    return issues, matched
+
+
+def _stage(rec, lines):
+    # A plain executemany: bulk_create's per-field preparation would cost
+    # more than everything else done with a line
+    table = StatementLine._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (reconciliation_id, line, mpesa_receipt) VALUES (%s, %s, %s)",
+            [(rec.pk, line.line, line.mpesa_receipt) for line in lines],
+        )
+
+
+def _read_batch(rec, rows, cols, tolerance):
+    tz = timezone.get_current_timezone()
+    lines, issues = [], []
+    for number, row in rows:
+        if not any(cell.strip() for cell in row):
+            continue
+        rec.lines += 1
+        try:
+            line = parse_line(number, row, cols, tz)
+        except ValueError as exc:
+            issues.append(_issue(rec, Kind.INVALID, number, error=str(exc)))
+            continue
+        if line is None:
+            rec.skipped += 1
+            continue
+        lines.append(line)
+        if line.transaction_time is not None:
+            rec.period_start = min(rec.period_start or line.transaction_time, line.transaction_time)
+            rec.period_end = max(rec.period_end or line.transaction_time, line.transaction_time)
+
+    matched_issues, matched = match(rec, lines, tolerance)
+    rec.matched += matched
+    with transaction.atomic():
+        if lines:
+            _stage(rec, lines)
+        ReconciliationIssue.objects.bulk_create(issues + matched_issues)
+        # Progress for clients polling the API
+        rec.save(update_fields=["lines", "matched", "skipped", "period_start", "period_end"])
+
+
+def _read(rec, fh, batch_size, tolerance):
+    reader = csv.reader(fh)
+    try:
+        cols = columns(next(reader, []))
+        # Line 1 is the header
+        rows = enumerate(reader, start=2)
+        while batch := list(islice(rows, batch_size)):
+            _read_batch(rec, batch, cols, tolerance)
+    except (UnicodeDecodeError, csv.Error) as exc:
+        # line_num counts the lines read before the failing one
+        raise StatementError(f"Line {reader.line_num + 1}: {exc}")
+
+
+def _create(issues, batch_size):
+    iterator = iter(issues)
+    while batch := list(islice(iterator, batch_size)):
+        ReconciliationIssue.objects.bulk_create(batch)
+
+
+def flag_duplicates(rec, batch_size):
+    """Receipts on more than one line of the statement."""
+    duplicates = (
+        StatementLine.objects.filter(reconciliation=rec)
+        .values("mpesa_receipt")
+        .annotate(count=Count("id"), first_line=Min("line"))
+        .filter(count__gt=1)
+        .order_by()
+        .values_list("mpesa_receipt", "count", "first_line")
+    )
+    _create(
+        (
+            _issue(rec, Kind.DUPLICATE, first_line, receipt, lines=count)
+            for receipt, count, first_line in duplicates.iterator(chunk_size=batch_size)
+        ),
+        batch_size,
+    )
+
+
+def flag_unmatched(rec, batch_size):
+    """Paid payments from the statement's period that are not on it."""
+    if rec.period_start is None:
+        return
+    on_statement = StatementLine.objects.filter(reconciliation=rec, mpesa_receipt=OuterRef("mpesa_receipt"))
+    for model in (Payment, ArchivedPayment):
+        payments = (
+            model.objects.filter(
+                payment_status=Payment.Status.PAID,
+                transaction_time__range=(rec.period_start, rec.period_end),
+            )
+            .filter(~Exists(on_statement))
+            .values("id", "mpesa_receipt", "amount", "transaction_time", "booking_id")
+        )
+        if model is ArchivedPayment:
+            payments = payments.annotate(archived=Value(True))
+        _create(
+            (
+                _issue(
+                    rec, Kind.UNMATCHED, receipt=payment["mpesa_receipt"], payment=payment,
+                    amount=_json(payment["amount"]), transaction_time=_json(payment["transaction_time"]),
+                )
+                for payment in payments.iterator(chunk_size=batch_size)
+            ),
+            batch_size,
+        )
+
+
+def reconcile(rec, fh=None, batch_size=None):
+    """
+    Match the statement of `rec`, or the open text file `fh`, against the
+    payments and record the issues; running it again starts over. Raises
+    StatementError, after marking `rec` Failed, for an unreadable statement.
+    """
+    batch_size = batch_size or settings.RECONCILIATION_BATCH_SIZE
+    tolerance = timedelta(seconds=settings.RECONCILIATION_TIME_TOLERANCE_SECONDS)
+
+    rec.issues.all().delete()
+    StatementLine.objects.filter(reconciliation=rec).delete()
+    rec.status, rec.started_at, rec.finished_at, rec.error = Reconciliation.Status.RUNNING, timezone.now(), None, ""
+    rec.lines = rec.matched = rec.skipped = 0
+    rec.period_start = rec.period_end = None
+    rec.summary = {}
+    rec.save()
+
+    try:
+        if fh is None:
+            with rec.statement.open("rb") as raw:
+                _read(rec, io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""), batch_size, tolerance)
+        else:
+            _read(rec, fh, batch_size, tolerance)
+        flag_duplicates(rec, batch_size)
+        flag_unmatched(rec, batch_size)
+    except Exception as exc:
+        rec.status = Reconciliation.Status.FAILED
+        rec.error = str(exc) if isinstance(exc, StatementError) else repr(exc)
+        raise
+    else:
+        rec.status = Reconciliation.Status.DONE
+    finally:
+        StatementLine.objects.filter(reconciliation=rec).delete()
+        rec.summary = dict(
+            ReconciliationIssue.objects.filter(reconciliation=rec)
+            .values_list("kind").annotate(count=Count("id")).order_by()
+        )
+        rec.finished_at = timezone.now()
+        rec.save()
+    return rec
+
+
+def submit(upload, created_by_id=None):
+    """Store an uploaded statement and queue its reconciliation."""
+    with transaction.atomic():
+        rec = Reconciliation(created_by_id=created_by_id)
+        rec.statement.save(upload.name, upload, save=False)
+        rec.save()
+        jobs.enqueue(RUN, {"reconciliation_id": rec.pk})
+    return rec
+
+
+@jobs.handler(RUN, max_attempts=3, lease_seconds=settings.RECONCILIATION_LEASE_SECONDS)
+def run_reconciliations(payloads):
+    for payload in payloads:
+        rec = Reconciliation.objects.filter(pk=payload["reconciliation_id"]).first()
+        if rec is None:
+            continue
+        try:
+            reconcile(rec)
+        except StatementError:
+            # Recorded on the reconciliation; another attempt reads the same file
+            pass
@@ -0,0 +1,96 @@
+"""
+Primary/replica database routing.
+
+Everything goes to the "default" (primary) database unless the code runs
+inside `use_replica()` or a view using `ReplicaReadMixin` (the read-only
+list views). Clients that have just written are pinned to the primary for
+REPLICA_PIN_SECONDS (see ReplicaPinningMiddleware), so they read their own
+bookings and payments while the replicas catch up. Other clients may see
+a lagging replica for as long as replication is behind, and a property
+listing cached from it is only refreshed by the next property write or
+PROPERTY_CACHE_TIMEOUT.
+
+Without replica aliases in DATABASES every read stays on the primary.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_COOKIE = "rc_primary"
+
+_reading_from_replica = ContextVar("reading_from_replica", default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+@contextmanager
+def use_replica():
+    token = _reading_from_replica.set(True)
+    try:
+        yield
+    finally:
+        _reading_from_replica.reset(token)
+
+
+def pin_key(user_id):
+    return f"rentals:replica-pin:{user_id}"
+
+
+def pin_to_primary(request, response):
+    """Route `request`'s client to the primary for REPLICA_PIN_SECONDS."""
+    seconds = settings.REPLICA_PIN_SECONDS
+    response.set_cookie(PIN_COOKIE, "1", max_age=seconds, httponly=True, samesite="Lax")
+    # API clients authenticate with bearer tokens and rarely send cookies
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        cache.set(pin_key(user.pk), True, timeout=seconds)
+
+
+def is_pinned(request):
+    if request.COOKIES.get(PIN_COOKIE):
+        return True
+    user = getattr(request, "user", None)
+    return user is not None and user.is_authenticated and bool(cache.get(pin_key(user.pk)))
+
+
+class ReplicaReadMixin:
+    """
+    Serve safe requests of an APIView from a replica. The switch happens
+    after authentication, so pinning can be keyed on the user, and is
+    undone once the response is finalized.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and replica_aliases() and not is_pinned(request):
+            self._replica_token = _reading_from_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "_replica_token", None)
+        if token is not None:
+            _reading_from_replica.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _reading_from_replica.get():
+            replicas = replica_aliases()
+            if replicas:
+                return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
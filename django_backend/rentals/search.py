@@ -0,0 +1,114 @@
+"""
+Full-text search over property name and description.
+
+On SQLite the search runs against an FTS5 inverted index
+(`rentals_property_fts`, created by migration 0006) which is kept in sync
+by the Property save/delete signals. Other backends fall back to a plain
+`icontains` scan so the endpoint keeps working, only slower.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Property
+
+FTS_TABLE = "rentals_property_fts"
+
+# Matches on the name count ten times as much as matches on the description
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+MAX_TERMS = 8
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_fts_tables = {}
+
+
+def fts_enabled():
+    """Return True if the FTS5 index exists on the current database."""
+    if connection.vendor != "sqlite":
+        return False
+    name = connection.settings_dict["NAME"]
+    if name not in _fts_tables:
+        _fts_tables[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[name]
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())[:MAX_TERMS]
+
+
+def build_match_query(terms):
+    # Every term must match; each is quoted (so FTS operators in user input
+    # are treated as text) and used as a prefix.
+    return " ".join('"%s"*' % term for term in terms)
+
+
+def index_property(instance):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [instance.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+            [instance.pk, instance.name, instance.description],
+        )
+
+
+def remove_property(pk):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+
+
+def rebuild_index():
+    """Re-index every property; returns the number of indexed rows."""
+    if not fts_enabled():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+            f"SELECT id, name, description FROM {Property._meta.db_table}"
+        )
+        return cursor.rowcount
+
+
+def search_property_ids(query, limit, offset=0):
+    """
+    Return the ids of approved properties matching `query`, best match first.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+
+    if fts_enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT p.id FROM {FTS_TABLE} f "
+                f"JOIN {Property._meta.db_table} p ON p.id = f.rowid "
+                f"WHERE {FTS_TABLE} MATCH %s AND p.approved "
+                f"ORDER BY bm25({FTS_TABLE}, %s, %s), p.id "
+                f"LIMIT %s OFFSET %s",
+                [build_match_query(terms), NAME_WEIGHT, DESCRIPTION_WEIGHT, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(name__icontains=term) | Q(description__icontains=term)
+    return list(
+        Property.objects.filter(condition, approved=True)
+        .annotate(
+            name_match=Case(
+                When(name__icontains=terms[0], then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        )
+        .order_by("name_match", "id")
+        .values_list("id", flat=True)[offset:offset + limit]
+    )
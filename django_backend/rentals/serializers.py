@@ -1,17 +1,51 @@
 from rest_framework import serializers
-from .models import Property, Booking, Payment, Tenant, UserProfile
+from .models import (
+    Property, PropertyImage, Booking, Payment, Tenant, UserProfile, Reconciliation, ReconciliationIssue,
+    ArchivedBooking, ArchivedPayment,
+)
+from django.conf import settings
 from django.contrib.auth.models import User
-from rest_framework.validators import UniqueValidator
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.fields import empty
+from . import accounts, archive, images, metrics, reconciliation
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """Adds the time spent serializing and validating to the request metrics."""
+    def to_representation(self, instance):
+        return metrics.serializer_call(super().to_representation, instance)
+
+    def run_validation(self, data=empty):
+        return metrics.serializer_call(super().run_validation, data)
+
+
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = UserProfile
         fields = ["role"]
 
 
-class PropertySerializer(serializers.ModelSerializer):
+class DynamicFieldsModelSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    ModelSerializer that takes an optional `fields` argument restricting
+    which fields are serialized. Unknown field names are ignored.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            allowed = set(fields)
+            for field_name in set(self.fields) - allowed:
+                self.fields.pop(field_name)
+
+
+class PropertySerializer(DynamicFieldsModelSerializer):
     landlord = serializers.StringRelatedField(read_only=True)
+    # Cover photo: blurhash plus resized WebP/JPEG variants, for srcset
+    image = serializers.SerializerMethodField()
+    # km from the point of a ?near= or ?bbox= search; left out otherwise
+    distance = serializers.FloatField(read_only=True)
 
     class Meta:
         model = Property
@@ -24,22 +58,185 @@ class PropertySerializer(serializers.ModelSerializer):
             'approved': {'read_only': True},
         }
 
+    def validate(self, attrs):
+        located = [attrs.get(key, getattr(self.instance, key, None)) for key in ('latitude', 'longitude')]
+        if located.count(None) == 1:
+            raise serializers.ValidationError("Set both latitude and longitude, or neither.")
+        return attrs
+
+    def get_image(self, obj):
+        return images.cover_urls(obj.image) if obj.image else None
+
+
+class PropertyImageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    file = serializers.FileField(write_only=True)
+    original = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PropertyImage
+        fields = [
+            'id', 'property', 'file', 'width', 'height', 'blurhash', 'original', 'variants',
+            'uploaded_at', 'processed_at', 'error',
+        ]
+        read_only_fields = ['property', 'width', 'height', 'blurhash', 'processed_at', 'error']
+
+    def get_original(self, obj):
+        return obj.original.url
+
+    def get_variants(self, obj):
+        return images.variant_urls(obj.variants)
+
+    def validate_file(self, file):
+        if file.size > settings.PROPERTY_IMAGE_MAX_BYTES:
+            raise serializers.ValidationError(
+                f"Photos are limited to {settings.PROPERTY_IMAGE_MAX_BYTES // (1024 * 1024)} MB."
+            )
+        data = file.read()
+        try:
+            images.open_image(data)
+        except images.InvalidImage as e:
+            raise serializers.ValidationError(str(e))
+        return data
+
+    def create(self, validated_data):
+        return images.add_image(validated_data['property'], validated_data['file'])
+
+
+class ReconciliationSerializer(serializers.ModelSerializer):
+    file = serializers.FileField(write_only=True)
+
+    class Meta:
+        model = Reconciliation
+        fields = [
+            'id', 'file', 'status', 'created_by', 'created_at', 'started_at', 'finished_at',
+            'lines', 'matched', 'skipped', 'period_start', 'period_end', 'summary', 'error',
+        ]
+        read_only_fields = [
+            'status', 'created_by', 'started_at', 'finished_at',
+            'lines', 'matched', 'skipped', 'period_start', 'period_end', 'summary', 'error',
+        ]
+
+    def validate_file(self, file):
+        try:
+            reconciliation.check_header(file)
+        except reconciliation.StatementError as e:
+            raise serializers.ValidationError(str(e))
+        return file
+
+    def create(self, validated_data):
+        return reconciliation.submit(validated_data['file'], validated_data.get('created_by_id'))
+
+
+class ReconciliationIssueSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReconciliationIssue
+        fields = ['id', 'kind', 'line', 'mpesa_receipt', 'payment', 'booking', 'details']
+
+
+class ArchivedRowSerializer(serializers.BaseSerializer):
+    """An archived booking or payment as it was when archived."""
+    # Keys of the archived row to return; all of them when None
+    row_fields = None
+
+    def to_representation(self, instance):
+        row = archive.decompress(instance.data)
+        if self.row_fields is not None:
+            row = {name: row.get(name) for name in self.row_fields}
+        return {
+            **row,
+            "archived_at": serializers.DateTimeField().to_representation(instance.archived_at),
+        }
+
+
+class MyArchivedBookingSerializer(ArchivedRowSerializer):
+    row_fields = ['id', 'property_id', 'booking_date', 'status', 'created_at']
+
+
+class MyArchivedPaymentSerializer(ArchivedRowSerializer):
+    row_fields = [
+        'id', 'booking_id', 'amount', 'payment_status', 'mpesa_receipt', 'payment_date', 'transaction_time',
+    ]
+
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that resolves ids from `context['related_cache']`
+    ({model: {pk: instance}}) when the caller has prefetched them, so
+    validating a batch of rows costs one query per related model instead of
+    one per row. Falls back to a normal lookup otherwise.
+    """
+    def to_internal_value(self, data):
+        cache = self.context.get('related_cache', {}).get(self.get_queryset().model)
+        if cache is None:
+            return super().to_internal_value(data)
+
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = self.get_queryset().model._meta.pk.to_python(data)
+        except DjangoValidationError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in cache:
+            self.fail('does_not_exist', pk_value=data)
+        return cache[pk]
+
+
+class BookingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    serializer_related_field = CachedPrimaryKeyRelatedField
 
-class BookingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = '__all__'
-class BookingDashboardSerializer(serializers.ModelSerializer):
-    tenant_email = serializers.CharField(source='tenant.email', read_only=True)
+        # Status only moves through Booking.transition_to(), i.e. payments
+        # and cancellations
+        read_only_fields = ['status']
+
+
+class BookingDashboardSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # Relies on the queryset joining tenant__user and property; see
+    # BookingDashboardMixin in views.py
+    tenant_email = serializers.EmailField(source='tenant.user.email', read_only=True, default=None)
     property_name = serializers.CharField(source='property.name', read_only=True)
+    property_price = serializers.DecimalField(
+        source='property.price_per_month', max_digits=10, decimal_places=2, read_only=True
+    )
 
     class Meta:
         model = Booking
-        fields = ['id', 'tenant_email', 'property_name', 'booking_date', 'status', 'time_slot', 'room_type']
+        fields = [
+            'id', 'tenant_email', 'property', 'property_name', 'property_price',
+            'booking_date', 'status', 'created_at',
+        ]
 
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class MeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # Relies on the queryset joining profile and tenant; see MeView
+    role = serializers.CharField(source='profile.role', read_only=True, default=None)
+    tenant_id = serializers.IntegerField(source='tenant.id', read_only=True, default=None)
+    phone_number = serializers.CharField(source='tenant.phone_number', read_only=True, default=None)
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'role', 'tenant_id', 'phone_number']
+
+
+class MyPaymentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # Relies on the queryset joining booking__property; see MyPaymentList
+    property_name = serializers.CharField(source='booking.property.name', read_only=True, default=None)
+    booking_date = serializers.DateField(source='booking.booking_date', read_only=True, default=None)
+
+    class Meta:
+        model = Payment
+        fields = [
+            'id', 'booking', 'property_name', 'booking_date', 'amount', 'payment_status',
+            'mpesa_receipt', 'payment_date', 'transaction_time',
+        ]
+
+
+class PaymentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    serializer_related_field = CachedPrimaryKeyRelatedField
     booking_id = serializers.IntegerField(source='booking.id', read_only=True)
     tenant_email = serializers.EmailField(source='booking.tenant.user.email', read_only=True)
     booking_status = serializers.CharField(source='booking.status', read_only=True)
@@ -47,51 +244,47 @@ class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = '__all__'
+        # Payments are created Pending; only M-Pesa callbacks
+        # (payments.apply_callback) record a result, settling the Pending
+        # payment that holds their receipt
+        read_only_fields = ['payment_status']
+
+    def validate_mpesa_receipt(self, value):
+        # Receipts of archived payments stay taken
+        if value and ArchivedPayment.objects.filter(mpesa_receipt=value).exists():
+            raise serializers.ValidationError("Payment with this receipt already exists.")
+        return value
 
 
-class TenantSerializer(serializers.ModelSerializer):
+class TenantSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tenant
         fields = '__all__'
 
 
 
-class UserRegistrationSerializer(serializers.ModelSerializer):
+class UserRegistrationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     phone_number = serializers.CharField(write_only=True, required=True)
-    role = serializers.ChoiceField(choices=UserProfile.ROLE_CHOICES, default="tenant")
-    email = serializers.EmailField(
-        required=True,
-        validators=[UniqueValidator(queryset=User.objects.all())]
-    )
-    username = serializers.CharField(
-        required=True,
-        validators=[UniqueValidator(queryset=User.objects.all())]
-    )
+    role = serializers.ChoiceField(choices=UserProfile.ROLE_CHOICES, default="tenant", source='profile.role')
+    # Uniqueness of both is checked together in validate(), in one query
+    email = serializers.EmailField(required=True)
+    username = serializers.CharField(required=True)
 
     class Meta:
         model = User
         fields = ['username', 'email', 'first_name', 'last_name', 'password', 'phone_number', 'role']
         extra_kwargs = {'password': {'write_only': True}}
 
+    def validate(self, attrs):
+        errors = accounts.find_duplicates(attrs['username'], attrs['email'])
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
     def create(self, validated_data):
-        # Pop extra fields that are not in User model
-        phone_number = validated_data.pop('phone_number', None)
-        role = validated_data.pop('role', 'tenant')
-        password = validated_data.pop('password')
-
-        # Create user
-        user = User(**validated_data)
-        user.set_password(password)
-
-        # Temporarily attach role for signals to pick up
-        user.role = role
-        user.save()  # Signals will handle UserProfile & Tenant creation
-
-        # Update Tenant's phone number if role is tenant
-        if role == "tenant" and phone_number:
-            tenant = getattr(user, 'tenant', None)
-            if tenant:
-                tenant.phone_number = phone_number
-                tenant.save()
-
-        return user
\ No newline at end of file
+        # User, profile and tenant (with its phone number) in one transaction
+        role = validated_data.pop('profile', {}).get('role', 'tenant')
+        try:
+            return accounts.create_user(role=role, check_duplicates=False, **validated_data)
+        except accounts.DuplicateUser as e:
+            raise serializers.ValidationError(e.errors)
\ No newline at end of file
@@ -1,11 +1,15 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Tenant, UserProfile
+from .models import Property, Tenant, UserProfile
+from . import accounts, cache, geo, metrics, search
 
 @receiver(post_save, sender=User)
 def create_user_related(sender, instance, created, **kwargs):
-    if created:
+    # accounts.create_user() creates the profile and tenant itself
+    if created and not getattr(instance, accounts.SKIP_RELATED_SETUP, False):
         # Default role is tenant, or get it from a temporary attribute set during registration
         role = getattr(instance, 'role', 'tenant')
 
@@ -14,4 +18,32 @@ def create_user_related(sender, instance, created, **kwargs):
 
         # Create Tenant only if role is tenant
         if role == 'tenant':
-            Tenant.objects.create(user=instance)
\ No newline at end of file
+            Tenant.objects.create(user=instance)
+
+
+# Keep the full-text and spatial property indexes in step with the table
+@receiver(post_save, sender=Property)
+def index_property(sender, instance, created, **kwargs):
+    search.index_property(instance)
+    geo.index_property(instance, created)
+
+
+@receiver(post_delete, sender=Property)
+def unindex_property(sender, instance, **kwargs):
+    search.remove_property(instance.pk)
+    geo.remove_property(instance.pk)
+
+
+# Any property change (including approval) invalidates cached listings
+# once it is committed
+@receiver([post_save, post_delete], sender=Property)
+def invalidate_property_cache(sender, instance, using, **kwargs):
+    transaction.on_commit(cache.bump_version, using=using)
+
+
+# Count queries per request on every connection, including ones opened by
+# async views' worker threads and replicas
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if metrics.record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.record_query)
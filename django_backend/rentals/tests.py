@@ -1,3 +1,899 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import (
+    analytics, archive, bookings, bulk, cache, geo, images, jobs, payments, profiler, reconciliation, routers,
+)
+from .middleware import ReplicaPinningMiddleware
+from .models import (
+    ArchivedPayment, Booking, InvalidTransition, Job, Payment, PaymentCallback, Property, PropertyImage,
+    PropertyDailyStats, PropertyOccupancy, Reconciliation, ReconciliationIssue, Tenant, UserProfile,
+)
+from .serializers import BookingSerializer
+from .tokens import CustomTokenObtainPairSerializer
+
+STATEMENT_HEADER = "Receipt No.,Completion Time,Transaction Status,Paid In,Other Party Info\n"
+
+_calls = []
+
+
+def create_admin(username="admin"):
+    user = User.objects.create_user(username, f"{username}@example.com", "password")
+    UserProfile.objects.filter(user=user).update(role="admin")
+    return User.objects.get(pk=user.pk)
+
+
+def bearer(user):
+    token = CustomTokenObtainPairSerializer.get_token(user).access_token
+    return {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+
+@jobs.handler("tests.flaky", max_attempts=2)
+def flaky(payloads):
+    _calls.extend(payloads)
+    return [ValueError("boom") if payload.get("fail") else None for payload in payloads]
+
+
+class RentalsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("tenant", "tenant@example.com", "password")
+        cls.tenant = Tenant.objects.get_or_create(user=cls.user)[0]
+        cls.property = Property.objects.create(name="Kilimani studio", price_per_month=5000)
+
+    def book(self, day=date(2020, 1, 1), **kwargs):
+        kwargs = {"tenant": self.tenant, "property": self.property, "email": self.user.email, **kwargs}
+        return Booking.objects.create(booking_date=day, **kwargs)
+
+    def reserve(self, day=date(2020, 1, 1)):
+        serializer = BookingSerializer(
+            data={
+                "tenant": self.tenant.pk, "property": self.property.pk, "booking_date": day,
+                "email": self.user.email,
+            }
+        )
+        serializer.is_valid(raise_exception=True)
+        return bookings.reserve(serializer)
+
+    def callback(self, booking, receipt="RCPT0001", result_code=0, **data):
+        return payments.apply_callback({
+            "booking_id": booking.pk, "email": self.user.email, "result_code": result_code, "amount": "5000",
+            "mpesa_receipt": receipt, "transaction_date": "20200101120000", "raw_callback": {}, **data,
+        })
+
+
+class BookingDashboardTests(RentalsTestCase):
+    def setUp(self):
+        self.landlord = User.objects.create_user("landlord", "landlord@example.com", "password")
+        UserProfile.objects.filter(user=self.landlord).update(role="landlord")
+        self.landlord = User.objects.get(pk=self.landlord.pk)
+        self.landlord_headers = bearer(self.landlord)
+        Property.objects.filter(pk=self.property.pk).update(landlord=self.landlord)
+        for day in range(1, 11):
+            self.book(date(2020, 1, day))
+
+    def test_a_page_is_one_query_however_many_bookings(self):
+        for path, headers in (
+            ("/api/landlord/bookings/", self.landlord_headers), ("/api/admin/bookings/", bearer(create_admin())),
+        ):
+            with self.assertNumQueries(1):
+                response = self.client.get(path, **headers)
+            [row, *_] = response.json()["results"]
+            self.assertEqual(len(response.json()["results"]), 10)
+            self.assertEqual((row["tenant_email"], row["property_name"]), ("tenant@example.com", "Kilimani studio"))
+
+    async def test_async_landlord_dashboard(self):
+        response = await self.async_client.get(
+            "/api/async/landlord/bookings/", headers={"Authorization": self.landlord_headers["HTTP_AUTHORIZATION"]}
+        )
+        self.assertEqual(len(response.json()["results"]), 10)
+
+    def test_landlords_see_only_their_properties(self):
+        other = Property.objects.create(name="Karen house", price_per_month=9000)
+        self.book(date(2020, 2, 1), property=other)
+        response = self.client.get("/api/landlord/bookings/", **self.landlord_headers)
+        self.assertEqual({row["property"] for row in response.json()["results"]}, {self.property.pk})
+
+
+class StatusMachineTests(RentalsTestCase):
+    def test_pending_booking_moves_to_paid_then_cancelled(self):
+        booking = self.book()
+        self.assertTrue(booking.transition_to(Booking.Status.PAID))
+        self.assertTrue(booking.transition_to(Booking.Status.CANCELLED))
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, Booking.Status.CANCELLED)
+
+    def test_transition_to_current_status_is_a_no_op(self):
+        booking = self.book()
+        self.assertFalse(booking.transition_to(Booking.Status.PENDING))
+
+    def test_illegal_transition_is_rejected(self):
+        booking = self.book(status=Booking.Status.CANCELLED)
+        self.assertFalse(booking.can_transition_to(Booking.Status.PAID))
+        with self.assertRaises(InvalidTransition):
+            booking.transition_to(Booking.Status.PAID)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, Booking.Status.CANCELLED)
+
+    def test_settled_payment_cannot_change(self):
+        payment = Payment.objects.create(booking=self.book(), amount=5000, payment_status=Payment.Status.FAILED)
+        with self.assertRaises(InvalidTransition):
+            payment.transition_to(Payment.Status.PAID)
+
+
+class ReservationTests(RentalsTestCase):
+    def test_reserve_claims_the_date(self):
+        booking = self.reserve()
+        self.assertTrue(PropertyOccupancy.objects.filter(booking=booking).exists())
+
+    def test_second_booking_for_the_same_night_conflicts(self):
+        self.reserve()
+        with self.assertRaises(bookings.BookingConflict):
+            self.reserve()
+        self.assertEqual(Booking.objects.count(), 1)
+        self.reserve(date(2020, 1, 2))
+
+    def test_conflict_is_a_409(self):
+        data = {
+            "tenant": self.tenant.pk, "property": self.property.pk, "booking_date": "2020-01-01",
+            "email": self.user.email,
+        }
+        self.assertEqual(self.client.post("/api/bookings/", data).status_code, 201)
+        self.assertEqual(self.client.post("/api/bookings/", data).status_code, 409)
+
+    def test_cancel_frees_the_date(self):
+        booking = self.reserve()
+        bookings.cancel(booking.pk)
+        self.assertFalse(PropertyOccupancy.objects.exists())
+        self.reserve()
+
+
+class AvailabilityTests(RentalsTestCase):
+    def setUp(self):
+        self.property.approved = True
+        self.property.save()
+        self.booking = self.reserve(date(2020, 1, 2))
+
+    def test_booked_dates_and_available_properties(self):
+        other = Property.objects.create(name="Karen house", price_per_month=9000, approved=True)
+        response = self.client.get(f"/api/properties/{self.property.pk}/availability/?start=2020-01-01&end=2020-01-31")
+        self.assertEqual(response.json()["booked"], ["2020-01-02"])
+        response = self.client.get("/api/properties/available/?start=2020-01-01&end=2020-01-03")
+        self.assertEqual([row["id"] for row in response.json()["results"]], [other.pk])
+
+    def test_tenant_cancels_only_their_own_booking(self):
+        url = f"/api/bookings/{self.booking.pk}/cancel/"
+        stranger = User.objects.create_user("stranger", "stranger@example.com", "password")
+        self.assertEqual(self.client.post(url, **bearer(stranger)).status_code, 404)
+        response = self.client.post(url, **bearer(self.user))
+        self.assertEqual(response.json()["status"], Booking.Status.CANCELLED)
+        self.assertFalse(PropertyOccupancy.objects.exists())
+
+    def test_admin_cancels_a_booking_without_a_user(self):
+        booking = self.book(date(2020, 1, 9), tenant=Tenant.objects.create())
+        response = self.client.post(f"/api/bookings/{booking.pk}/cancel/", **bearer(create_admin()))
+        self.assertEqual(response.json()["status"], Booking.Status.CANCELLED)
+
+
+class AnalyticsTests(RentalsTestCase):
+    def setUp(self):
+        self.landlord = User.objects.create_user("landlord", "landlord@example.com", "password")
+        UserProfile.objects.filter(user=self.landlord).update(role="landlord")
+        self.landlord = User.objects.get(pk=self.landlord.pk)
+        Property.objects.filter(pk=self.property.pk).update(landlord=self.landlord)
+
+        today = timezone.localdate()
+        self.callback(self.reserve(today), receipt="RCPT0001")
+        self.callback(self.reserve(today + timedelta(days=1)), receipt="RCPT0002", result_code=1)
+        bookings.cancel(self.reserve(today + timedelta(days=2)).pk)
+
+    def stats(self):
+        # Cancelling leaves a row of zeros behind, which a rebuild skips
+        rows = PropertyDailyStats.objects.order_by("day").values("day", *analytics.STAT_FIELDS)
+        return [row for row in rows if any(row[field] for field in analytics.STAT_FIELDS)]
+
+    def test_write_paths_keep_the_same_stats_as_a_rebuild(self):
+        recorded = self.stats()
+        analytics.rebuild()
+        self.assertEqual(self.stats(), recorded)
+
+    def test_landlord_summary(self):
+        today = timezone.localdate()
+        response = self.client.get(
+            f"/api/landlord/analytics/?start={today}&end={today + timedelta(days=3)}", **bearer(self.landlord)
+        )
+        [summary] = response.json()["properties"]
+        self.assertEqual(summary["totals"], {
+            "bookings": 2, "paid_amount": "5000.00", "paid_payments": 1, "failed_payments": 1,
+            "occupancy": 0.5, "payment_success_rate": 0.5,
+        })
+
+
+class CallbackTests(RentalsTestCase):
+    def test_successful_callback_marks_the_booking_paid(self):
+        booking = self.book()
+        payment, created = self.callback(booking)
+        self.assertTrue(created)
+        self.assertEqual(payment.payment_status, Payment.Status.PAID)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, Booking.Status.PAID)
+
+    def test_retried_callback_is_not_recorded_twice(self):
+        booking = self.book()
+        first, _ = self.callback(booking)
+        again, created = self.callback(booking)
+        self.assertFalse(created)
+        self.assertEqual(again.pk, first.pk)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_retried_callback_for_an_archived_receipt_is_a_duplicate(self):
+        booking = self.book()
+        self.callback(booking)
+        archive.archive_bookings(before=date(2021, 1, 1))
+        payment, created = self.callback(booking)
+        self.assertFalse(created)
+        self.assertIsInstance(payment, ArchivedPayment)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_callback_settles_a_pending_payment_with_its_receipt(self):
+        booking = self.book()
+        response = self.client.post("/api/payments/", {"amount": "1", "mpesa_receipt": "RCPT0001"})
+        self.assertEqual(response.json()["payment_status"], Payment.Status.PENDING)
+
+        payment, created = self.callback(booking)
+        self.assertFalse(created)
+        self.assertEqual(payment.pk, response.json()["id"])
+        payment.refresh_from_db()
+        self.assertEqual((payment.payment_status, payment.booking_id), (Payment.Status.PAID, booking.pk))
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, Booking.Status.PAID)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_payment_for_a_cancelled_booking_does_not_revive_it(self):
+        booking = self.book(status=Booking.Status.CANCELLED)
+        payment, _ = self.callback(booking)
+        self.assertEqual(payment.payment_status, Payment.Status.PAID)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, Booking.Status.CANCELLED)
+
+    def test_unknown_booking(self):
+        with self.assertRaises(payments.CallbackError):
+            payments.apply_callback({"booking_id": 0, "email": self.user.email, "result_code": 0})
+
+
+class ExportTests(RentalsTestCase):
+    def setUp(self):
+        self.headers = bearer(create_admin())
+        self.paid = self.book()
+        self.callback(self.paid, receipt="RCPT0001")
+        self.pending = self.book(date(2020, 2, 1))
+
+    def export(self, path):
+        response = self.client.get(f"/api/admin/exports/{path}", **self.headers)
+        return response, b"".join(response.streaming_content).decode() if response.streaming else None
+
+    def test_csv_rows_carry_the_latest_payment(self):
+        response, body = self.export("bookings/csv/")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        header, *rows = body.splitlines()
+        self.assertTrue(header.startswith("id,booking_date,created_at,status,tenant_email"))
+        self.assertEqual(len(rows), 2)
+        self.assertRegex(rows[0], r",Paid,tenant@example.com,\d+,Kilimani studio,Paid,5000(\.00)?,RCPT0001$")
+        self.assertRegex(rows[1], r",Pending,tenant@example.com,\d+,Kilimani studio,,,$")
+
+    def test_filters(self):
+        _, body = self.export("bookings/ndjson/?status=Pending&start=2020-01-15")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row["id"] for row in rows], [self.pending.pk])
+        _, body = self.export("payments/ndjson/?status=Failed")
+        self.assertEqual(body, "")
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.export("bookings/xml/")[0].status_code, 400)
+        self.assertEqual(self.export("payments/csv/?status=Cancelled")[0].status_code, 400)
+        response = self.client.get("/api/admin/exports/bookings/csv/", **bearer(self.user))
+        self.assertEqual(response.status_code, 403)
+
+
+class BulkImportTests(RentalsTestCase):
+    def setUp(self):
+        self.headers = bearer(create_admin())
+
+    def booking_row(self, day):
+        return {"tenant": self.tenant.pk, "property": self.property.pk, "booking_date": day, "email": self.user.email}
+
+    def test_each_booking_row_gets_its_own_result(self):
+        PropertyOccupancy.objects.create(property=self.property, date=date(2020, 1, 3), booking=self.book())
+        rows = [
+            self.booking_row("2020-01-01"),
+            self.booking_row("2020-01-01"),  # same night as the row above
+            self.booking_row("2020-01-03"),  # already booked
+            {**self.booking_row("2020-01-04"), "property": 0},
+            self.booking_row("2020-01-05"),
+        ]
+        response = self.client.post("/api/bookings/bulk/", rows, content_type="application/json", **self.headers)
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            [row["status"] for row in response.json()["results"]], ["created", "error", "error", "error", "created"]
+        )
+        self.assertEqual(PropertyOccupancy.objects.count(), 3)
+
+    def test_conflicts_are_found_across_chunks(self):
+        rows = [self.booking_row("2020-01-01"), self.booking_row("2020-01-01")]
+        results = bulk.BookingImporter(chunk_size=1).run(rows)
+        self.assertEqual([row["status"] for row in results], ["created", "error"])
+
+    def test_ndjson_payments(self):
+        booking = self.book()
+        body = "\n".join([
+            json.dumps({"booking": booking.pk, "amount": "5000", "mpesa_receipt": "RCPT0001"}),
+            "{not json",
+            json.dumps({"booking": booking.pk, "amount": "5000", "mpesa_receipt": "RCPT0001"}),
+            json.dumps({"booking": booking.pk, "amount": "5000"}),
+        ])
+        response = self.client.post(
+            "/api/payments/bulk/", body, content_type="application/x-ndjson", **self.headers
+        )
+        self.assertEqual(
+            [row["status"] for row in response.json()["results"]], ["created", "error", "error", "created"]
+        )
+        self.assertEqual(set(Payment.objects.values_list("payment_status", flat=True)), {Payment.Status.PENDING})
+
+
+@override_settings(PAYMENT_CALLBACK_MODE="queued")
+class QueuedCallbackTests(RentalsTestCase):
+    def post(self, booking_id, receipt="RCPT0001"):
+        data = {"booking_id": booking_id, "email": self.user.email, "result_code": 0, "mpesa_receipt": receipt}
+        return self.client.post("/api/payments/callback/", data, content_type="application/json")
+
+    def test_callback_is_stored_then_applied_once(self):
+        booking = self.book()
+        self.assertEqual(self.post(booking.pk).status_code, 202)
+        self.assertEqual(self.post(booking.pk).status_code, 202)
+        self.assertFalse(Payment.objects.exists())
+
+        self.assertEqual(payments.process_pending_callbacks(), 2)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertFalse(PaymentCallback.objects.filter(processed_at__isnull=True).exists())
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, Booking.Status.PAID)
+
+    def test_callback_for_an_unknown_booking_is_closed_with_the_error(self):
+        self.post(0)
+        payments.process_pending_callbacks()
+        callback = PaymentCallback.objects.get()
+        self.assertIsNotNone(callback.processed_at)
+        self.assertEqual(callback.error, "Booking not found")
+
+    def test_unexpected_errors_are_retried_up_to_max_attempts(self):
+        self.post(self.book().pk)
+        with mock.patch("rentals.payments.apply_callback", side_effect=RuntimeError("database down")):
+            for _ in range(3):
+                payments.process_pending_callbacks(max_attempts=2)
+        callback = PaymentCallback.objects.get()
+        self.assertEqual((callback.processed_at, callback.attempts), (None, 2))
+        self.assertIn("database down", callback.error)
+
+
+class MeTests(RentalsTestCase):
+    def setUp(self):
+        self.headers = bearer(self.user)
+        self.booking = self.book()
+        self.callback(self.booking, receipt="RCPT0001")
+        other = User.objects.create_user("other", "other@example.com", "password")
+        other_booking = self.book(date(2020, 1, 2), tenant=Tenant.objects.get(user=other), email=other.email)
+        Payment.objects.create(booking=other_booking, amount=5000, mpesa_receipt="RCPT0002")
+
+    def test_account(self):
+        response = self.client.get("/api/me/", **self.headers)
+        self.assertEqual(response.json(), {
+            "id": self.user.pk, "username": "tenant", "email": "tenant@example.com", "first_name": "",
+            "last_name": "", "role": "tenant", "tenant_id": self.tenant.pk, "phone_number": "",
+        })
+
+    def test_lists_hold_only_the_users_own_rows(self):
+        response = self.client.get("/api/me/bookings/", **self.headers)
+        self.assertEqual([row["id"] for row in response.json()["results"]], [self.booking.pk])
+        response = self.client.get("/api/me/payments/", **self.headers)
+        [payment] = response.json()["results"]
+        self.assertEqual((payment["mpesa_receipt"], payment["property_name"]), ("RCPT0001", "Kilimani studio"))
+
+    def test_anonymous_is_rejected(self):
+        for path in ("/api/me/", "/api/me/bookings/", "/api/me/payments/"):
+            self.assertEqual(self.client.get(path).status_code, 401)
+
+
+class ArchiveTests(RentalsTestCase):
+    def setUp(self):
+        self.booking = self.book()
+        self.callback(self.booking, receipt="RCPT0001")
+        archive.archive_bookings(before=date(2021, 1, 1))
+
+    def test_archived_receipt_cannot_be_imported_again(self):
+        rows = [{"amount": "5000", "mpesa_receipt": "RCPT0001"}, {"amount": "5000", "mpesa_receipt": "RCPT0002"}]
+        response = self.client.post(
+            "/api/payments/bulk/", rows, content_type="application/json", **bearer(create_admin())
+        )
+        self.assertEqual([row["status"] for row in response.json()["results"]], ["error", "created"])
+        self.assertEqual(list(Payment.objects.values_list("mpesa_receipt", flat=True)), ["RCPT0002"])
+
+    def test_archived_receipt_cannot_be_posted_again(self):
+        response = self.client.post("/api/payments/", {"amount": "5000", "mpesa_receipt": "RCPT0001"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("mpesa_receipt", response.json())
+
+    def test_exports_include_archived_rows(self):
+        for kind in ("bookings", "payments"):
+            response = self.client.get(f"/api/admin/exports/{kind}/csv/", **bearer(create_admin(kind)))
+            self.assertIn("RCPT0001", b"".join(response.streaming_content).decode())
+
+    def test_tenant_lists_archived_history(self):
+        live = self.client.get("/api/me/payments/", **bearer(self.user)).json()["results"]
+        archived = self.client.get("/api/me/payments/?archived=1", **bearer(self.user)).json()["results"]
+        self.assertEqual((live, [row["mpesa_receipt"] for row in archived]), ([], ["RCPT0001"]))
+        archived = self.client.get("/api/me/bookings/?archived=1", **bearer(self.user)).json()["results"]
+        self.assertEqual([row["id"] for row in archived], [self.booking.pk])
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        _calls.clear()
+
+    def test_enqueue_requires_a_registered_handler(self):
+        with self.assertRaises(LookupError):
+            jobs.enqueue("tests.unknown")
+
+    def test_due_job_runs_once(self):
+        job = jobs.enqueue("tests.flaky", {"n": 1})
+        self.assertEqual(jobs.run_once("worker"), 1)
+        self.assertEqual(_calls, [{"n": 1}])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.DONE, 1))
+        self.assertEqual(jobs.run_once("worker"), 0)
+
+    def test_future_job_waits(self):
+        jobs.enqueue("tests.flaky", run_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(jobs.run_once("worker"), 0)
+
+    def test_failed_job_is_retried_then_fails_for_good(self):
+        job = jobs.enqueue("tests.flaky", {"fail": True})
+        jobs.run_once("worker")
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.QUEUED)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn("boom", job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs("rentals.jobs", level="ERROR"):
+            jobs.run_once("worker")
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+
+    @override_settings(JOB_RETRY_BASE_SECONDS=30, JOB_RETRY_MAX_SECONDS=100)
+    def test_backoff_doubles_up_to_the_maximum(self):
+        with mock.patch("rentals.jobs.random.uniform", return_value=1):
+            delays = [jobs.backoff(attempts).total_seconds() for attempts in (1, 2, 3, 4)]
+        self.assertEqual(delays, [30, 60, 100, 100])
+
+    def test_job_with_expired_lease_is_claimed_again(self):
+        job = jobs.enqueue("tests.flaky")
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.Status.RUNNING, locked_by="dead", locked_at=timezone.now() - timedelta(days=1), attempts=1,
+        )
+        self.assertEqual(jobs.run_once("worker"), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.DONE, 2))
+
+
+class ReconciliationTests(RentalsTestCase):
+    def reconcile(self, *lines):
+        rec = Reconciliation.objects.create()
+        rows = "".join(
+            f"{receipt},2020-01-01 12:00:00,Completed,{amount},254700000000 - T\n" for receipt, amount in lines
+        )
+        reconciliation.reconcile(rec, io.StringIO(STATEMENT_HEADER + rows))
+        rec.refresh_from_db()
+        return rec, dict(rec.issues.values_list("mpesa_receipt", "kind"))
+
+    def test_statement_lines_are_matched_to_payments(self):
+        self.callback(self.book(), receipt="RCPT0001")
+        self.callback(self.book(date(2020, 1, 2)), receipt="RCPT0002")
+        rec, issues = self.reconcile(("RCPT0001", "5000.00"), ("RCPT0002", "4000.00"), ("RCPT0003", "5000.00"))
+        self.assertEqual(rec.status, Reconciliation.Status.DONE)
+        # A line with a payment counts as matched even when it differs
+        self.assertEqual(rec.matched, 2)
+        self.assertEqual(issues, {
+            "RCPT0002": ReconciliationIssue.Kind.MISMATCH, "RCPT0003": ReconciliationIssue.Kind.MISSING,
+        })
+
+    def test_paid_payment_missing_from_the_statement_is_unmatched(self):
+        self.callback(self.book(), receipt="RCPT0001")
+        _, issues = self.reconcile(("RCPT0009", "5000.00"))
+        self.assertEqual(issues["RCPT0001"], ReconciliationIssue.Kind.UNMATCHED)
+
+    def test_archived_payments_are_matched(self):
+        self.callback(self.book(), receipt="RCPT0001")
+        archive.archive_bookings(before=date(2021, 1, 1))
+        rec, issues = self.reconcile(("RCPT0001", "5000.00"))
+        self.assertEqual((rec.matched, issues), (1, {}))
+
+
+class RegistrationTests(TestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+
+    def register(self, **data):
+        data = {
+            "username": "amina", "email": "amina@example.com", "password": "s3cret-pass",
+            "phone_number": "254700000001", **data,
+        }
+        return self.client.post("/api/register/", data)
+
+    def test_tenant_gets_a_profile_and_tenant_with_the_phone_number(self):
+        self.assertEqual(self.register().status_code, 201)
+        user = User.objects.get(username="amina")
+        self.assertTrue(user.check_password("s3cret-pass"))
+        self.assertEqual(user.profile.role, "tenant")
+        self.assertEqual(user.tenant.phone_number, "254700000001")
+
+    def test_landlord_has_no_tenant(self):
+        self.register(role="landlord")
+        self.assertFalse(Tenant.objects.filter(user__username="amina").exists())
+        self.assertEqual(UserProfile.objects.get(user__username="amina").role, "landlord")
+
+    def test_taken_username_and_email_are_both_reported(self):
+        self.register()
+        response = self.register(phone_number="254700000002")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {"username", "email"})
+        self.assertEqual(User.objects.count(), 1)
+
+
+class ClaimsPermissionTests(TestCase):
+    url = "/api/admin/properties/pending/"
+
+    def test_role_comes_from_the_token(self):
+        headers = bearer(create_admin())
+        # Only the list query; the user and role are not loaded
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url, **headers).status_code, 200)
+
+    def test_token_without_a_role_falls_back_to_the_profile(self):
+        admin = create_admin()
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(admin)}"}
+        self.assertEqual(self.client.get(self.url, **headers).status_code, 200)
+
+    def test_other_roles_are_forbidden(self):
+        landlord = User.objects.create_user("landlord", "landlord@example.com", "password")
+        UserProfile.objects.filter(user=landlord).update(role="landlord")
+        landlord = User.objects.get(pk=landlord.pk)
+        self.assertEqual(self.client.get(self.url, **bearer(landlord)).status_code, 403)
+        self.assertEqual(self.client.get("/api/landlord/properties/", **bearer(landlord)).status_code, 200)
+
+    def test_inactive_user_is_rejected(self):
+        admin = create_admin()
+        admin.is_active = False
+        self.assertEqual(self.client.get(self.url, **bearer(admin)).status_code, 401)
+
+
+class PropertyListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.landlord = User.objects.create_user("landlord", "landlord@example.com", "password")
+        cls.cheap = Property.objects.create(name="Bedsitter", price_per_month=4000, approved=True)
+        cls.mid = Property.objects.create(
+            name="Studio", price_per_month=8000, approved=True, landlord=cls.landlord,
+        )
+        cls.dear = Property.objects.create(name="Villa", price_per_month=20000, approved=True)
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def ids(self, query=""):
+        response = self.client.get(f"/api/properties/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return [row["id"] for row in response.json()["results"]]
+
+    def test_filters(self):
+        self.assertEqual(self.ids("min_price=5000&max_price=10000"), [self.mid.pk])
+        self.assertEqual(self.ids(f"landlord={self.landlord.pk}"), [self.mid.pk])
+        self.assertEqual(self.ids("name=STUD"), [self.mid.pk])
+
+    def test_ordering(self):
+        self.assertEqual(self.ids(), [self.dear.pk, self.mid.pk, self.cheap.pk])
+        self.assertEqual(self.ids("ordering=price_per_month"), [self.cheap.pk, self.mid.pk, self.dear.pk])
+        self.assertEqual(self.ids("ordering=-price_per_month"), [self.dear.pk, self.mid.pk, self.cheap.pk])
+
+    def test_pages_follow_the_cursor(self):
+        first = self.client.get("/api/properties/?page_size=2").json()
+        self.assertEqual([row["id"] for row in first["results"]], [self.dear.pk, self.mid.pk])
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(([row["id"] for row in second["results"]], second["next"]), ([self.cheap.pk], None))
+
+    def test_fields_limit_the_response(self):
+        response = self.client.get("/api/properties/?fields=id,name")
+        self.assertEqual(response.json()["results"][0], {"id": self.dear.pk, "name": "Villa"})
+
+    def test_bad_filters_are_a_400(self):
+        for query in ("min_price=abc", "landlord=me", "near=1"):
+            self.assertEqual(self.client.get(f"/api/properties/?{query}").status_code, 400, query)
+
+
+class PropertySearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.studio = Property.objects.create(
+            name="Kilimani studio", description="Quiet, near the bus stop", price_per_month=5000, approved=True,
+        )
+        cls.house = Property.objects.create(
+            name="Karen house", description="Garden and a studio for guests", price_per_month=9000, approved=True,
+        )
+        Property.objects.create(name="Pending studio", price_per_month=5000)
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def search(self, query):
+        return self.client.get(f"/api/properties/search/?{query}").json()
+
+    def test_name_matches_rank_first_and_unapproved_are_left_out(self):
+        self.assertEqual([row["id"] for row in self.search("q=studio")["results"]], [self.studio.pk, self.house.pk])
+
+    def test_terms_are_prefixes_and_all_must_match(self):
+        self.assertEqual([row["id"] for row in self.search("q=gard stud")["results"]], [self.house.pk])
+        self.assertEqual(self.search("q=garden bus")["results"], [])
+
+    def test_search_is_paged(self):
+        first = self.search("q=studio&limit=0")
+        self.assertEqual([row["id"] for row in first["results"]], [self.studio.pk])
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(([row["id"] for row in second["results"]], second["next"]), ([self.house.pk], None))
+
+
+class PropertyCacheTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+
+    def listed(self):
+        return [row["id"] for row in self.client.get("/api/properties/").json()["results"]]
+
+    def test_version_is_bumped_when_the_write_commits(self):
+        version = cache.get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Property.objects.create(name="Kileleshwa flat", price_per_month=5000)
+            self.assertEqual(cache.get_version(), version)
+        self.assertNotEqual(cache.get_version(), version)
+
+    def test_approval_shows_up_in_the_cached_list(self):
+        prop = Property.objects.create(name="Kileleshwa flat", price_per_month=5000)
+        self.assertEqual(self.listed(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/api/admin/properties/{prop.pk}/approve/", **bearer(create_admin()))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.listed(), [prop.pk])
+
+
+class AdminPendingPropertyTests(TestCase):
+    def test_lists_only_unapproved_properties(self):
+        pending = Property.objects.create(name="Kileleshwa flat", price_per_month=5000)
+        Property.objects.create(name="Westlands flat", price_per_month=5000, approved=True)
+        response = self.client.get("/api/admin/properties/pending/", **bearer(create_admin()))
+        self.assertEqual([row["id"] for row in response.json()["results"]], [pending.pk])
+
+    def test_admins_only(self):
+        user = User.objects.create_user("tenant", "tenant@example.com", "password")
+        response = self.client.get("/api/admin/properties/pending/", **bearer(user))
+        self.assertEqual(response.status_code, 403)
+
+
+def sample_photo(size=(1600, 1200), color=(200, 120, 40)):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+class ImageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        landlord = User.objects.create_user("landlord", "landlord@example.com", "password")
+        UserProfile.objects.filter(user=landlord).update(role="landlord")
+        cls.landlord = User.objects.get(pk=landlord.pk)
+        cls.property = Property.objects.create(
+            name="Lavington house", price_per_month=9000, landlord=cls.landlord, approved=True,
+        )
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media, PROPERTY_IMAGE_WIDTHS=[320, 640])
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_upload_makes_variants_and_cover(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = images.add_image(self.property, sample_photo())
+        self.assertEqual((photo.width, photo.height, photo.error), (1600, 1200, ""))
+        self.assertEqual([(v["width"], v["height"]) for v in photo.variants], [(320, 240), (640, 480)])
+        self.assertTrue(photo.blurhash)
+        self.property.refresh_from_db()
+        self.assertEqual(self.property.image["original"], photo.original.name)
+
+    def test_small_original_is_not_upscaled(self):
+        photo = images.add_image(self.property, sample_photo(size=(400, 300)))
+        self.assertEqual([v["width"] for v in photo.variants], [320, 400])
+
+    def test_duplicate_upload_returns_existing_photo(self):
+        data = sample_photo()
+        first = images.add_image(self.property, data)
+        self.assertEqual(images.add_image(self.property, data).pk, first.pk)
+        self.assertEqual(PropertyImage.objects.count(), 1)
+
+    def test_bad_upload_is_refused(self):
+        response = self.client.post(
+            f"/api/landlord/properties/{self.property.pk}/images/",
+            {"file": io.BytesIO(b"not a photo")}, **bearer(self.landlord),
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PropertyImage.objects.exists())
+
+    @override_settings(PROPERTY_IMAGE_PROCESSING="queued")
+    def test_queued_upload_is_processed_by_worker(self):
+        photo = images.add_image(self.property, sample_photo())
+        self.assertIsNone(photo.processed_at)
+        self.assertFalse(self.client.get(f"/api/properties/{self.property.pk}/images/").json())
+
+        self.assertEqual(images.process_pending(), 1)
+        photo.refresh_from_db()
+        self.assertIsNotNone(photo.processed_at)
+        [listed] = self.client.get(f"/api/properties/{self.property.pk}/images/").json()
+        self.assertEqual(listed["id"], photo.pk)
+
+
+class GeoSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.near = Property.objects.create(
+            name="Westlands flat", price_per_month=5000, approved=True, latitude=-1.265, longitude=36.805,
+        )
+        cls.far = Property.objects.create(
+            name="Mombasa villa", price_per_month=5000, approved=True, latitude=-4.04, longitude=39.67,
+        )
+
+    def setUp(self):
+        caches["default"].clear()
+
+    async def test_async_location_search_in_a_fresh_process(self):
+        # The first lookup of the spatial index reads the table list
+        geo._rtree_tables.clear()
+        response = await self.async_client.get("/api/async/properties/?near=-1.28,36.8")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["id"] for row in response.json()["results"]], [self.near.pk])
+
+    def test_bbox_search(self):
+        response = self.client.get("/api/properties/?bbox=39,-5,40,-3")
+        self.assertEqual([row["id"] for row in response.json()["results"]], [self.far.pk])
+
+
+@override_settings(RATE_LIMITS={
+    "token": {"capacity": 3, "rate": "1/hour"},
+    "login": {"capacity": 4, "rate": "1/hour"},
+})
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+
+    def login(self, username, address):
+        return self.client.post(
+            "/api/token/", {"username": username, "password": "wrong"}, REMOTE_ADDR=address
+        ).status_code
+
+    def test_one_address_is_limited_across_usernames(self):
+        self.assertEqual([self.login(f"user{i}", "10.0.0.1") for i in range(4)], [401, 401, 401, 429])
+        self.assertEqual(self.login("user0", "10.0.0.2"), 401)
+
+    def test_one_username_is_limited_across_addresses(self):
+        statuses = [self.login("victim", f"10.0.0.{i}") for i in range(5)]
+        self.assertEqual(statuses, [401, 401, 401, 401, 429])
+        self.assertEqual(self.login("someone-else", "10.0.0.9"), 401)
+
+    def test_every_login_route_shares_the_limit(self):
+        for i, url in enumerate(("/api/token/", "/api/login/", "/auth/jwt/create/", "/api/token/")):
+            self.client.post(url, {"username": "victim", "password": "wrong"}, REMOTE_ADDR=f"10.0.1.{i}")
+        self.assertEqual(self.login("victim", "10.0.1.9"), 429)
+
+
+@mock.patch.object(routers, "replica_aliases", return_value=["replica"])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.router = routers.PrimaryReplicaRouter()
+
+    def test_reads_use_replica_only_when_asked(self, aliases):
+        self.assertEqual(self.router.db_for_read(Property), "default")
+        with routers.use_replica():
+            self.assertEqual(self.router.db_for_read(Property), "replica")
+            self.assertEqual(self.router.db_for_write(Property), "default")
+        self.assertEqual(self.router.db_for_read(Property), "default")
+
+    def test_write_pins_client_to_primary(self, aliases):
+        user = User.objects.create_user("tenant", "tenant@example.com", "password")
+        request = RequestFactory().post("/api/bookings/")
+        request.user = user
+        response = HttpResponse()
+        routers.pin_to_primary(request, response)
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+
+        # A bearer-token client sends no cookie but is pinned by user
+        later = RequestFactory().get("/api/me/bookings/")
+        later.user = user
+        self.assertTrue(routers.is_pinned(later))
+        later.user = User.objects.create_user("other", "other@example.com", "password")
+        self.assertFalse(routers.is_pinned(later))
+
+    def test_only_successful_writes_pin(self, aliases):
+        post = RequestFactory().post("/api/bookings/")
+        get = RequestFactory().get("/api/bookings/")
+        self.assertTrue(ReplicaPinningMiddleware.should_pin(post, HttpResponse(status=201)))
+        self.assertFalse(ReplicaPinningMiddleware.should_pin(post, HttpResponse(status=400)))
+        self.assertFalse(ReplicaPinningMiddleware.should_pin(get, HttpResponse()))
+        aliases.return_value = []
+        self.assertFalse(ReplicaPinningMiddleware.should_pin(post, HttpResponse(status=201)))
+
+
+@override_settings(QUERY_PROFILER=True, QUERY_BUDGETS={"properties-list": 0})
+class ProfilerTests(TestCase):
+    def setUp(self):
+        profiler.reset()
+        caches["default"].clear()
+
+    def test_fingerprint_drops_literals(self):
+        self.assertEqual(
+            profiler.fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'x''y' AND n > %s"),
+            profiler.fingerprint("SELECT * FROM t WHERE id IN (4) AND name = 'z'  AND n > 7"),
+        )
+
+    def test_repeated_query_shapes_are_flagged(self):
+        records = [profiler.QueryRecord(f"SELECT * FROM t WHERE id = {i}", 0.001) for i in range(3)]
+        records.append(profiler.QueryRecord("SELECT COUNT(*) FROM t", 0.001))
+        profile = profiler.analyze("some-view", "GET", records)
+        [repeated] = profile.repeated
+        self.assertEqual((repeated.fingerprint, repeated.count), ("SELECT * FROM t WHERE id = ?", 3))
+
+    def test_request_over_budget_is_logged(self):
+        with self.assertLogs("rentals.profiler", level="WARNING") as logs:
+            self.client.get("/api/properties/")
+        self.assertIn("GET properties-list: 1 queries (budget 0)", logs.output[0])
+        self.assertIn("properties-list", profiler.view_fingerprints())
+
+    @override_settings(QUERY_PROFILER_STRICT=True)
+    def test_strict_mode_raises(self):
+        with self.assertRaises(profiler.QueryBudgetExceeded), self.assertLogs("rentals.profiler"):
+            self.client.get("/api/properties/")
+
+
+class MiddlewareTests(TestCase):
+    @override_settings(DEBUG=True)
+    def test_asgi_chain_is_not_adapted(self):
+        # With DEBUG, Django logs every middleware it has to wrap in
+        # sync_to_async/async_to_sync
+        with self.assertNoLogs("django.request", level="DEBUG"):
+            ASGIHandler()
+
+    async def test_async_view_runs_through_middleware(self):
+        response = await self.async_client.get("/api/async/properties/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Server-Timing", response)
@@ -0,0 +1,141 @@
+"""
+Token-bucket rate limits for the expensive unauthenticated endpoints.
+
+Each scope in RATE_LIMITS has a bucket of `capacity` tokens, refilled at
+`rate` (e.g. "5/min"). A request takes one token from the bucket of every
+identity it carries: its client IP and its user when authenticated. It
+is let through only if all of them have a token left. Login attempts
+also take a token from the username's bucket in the "login" scope, so
+guessing one account's password from many addresses is limited too.
+Buckets live in the local "throttle" cache, so limits apply per worker
+process.
+
+DRF views use the throttle classes below; plain Django views (the M-Pesa
+callbacks) use the `rate_limit()` decorator.
+"""
+import functools
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """Tokens added per second for a rate like "10/min"."""
+    count, period = rate.split("/")
+    return int(count) / PERIODS[period[0]]
+
+
+def take(buckets):
+    """
+    Take a token from each `(scope, identity)` bucket. Returns 0 when the
+    request may proceed, otherwise the seconds until it could.
+    """
+    limits = {}
+    for scope, ident in buckets:
+        limit = settings.RATE_LIMITS.get(scope)
+        if limit:
+            limits[f"{scope}:{ident}"] = (limit["capacity"], parse_rate(limit["rate"]))
+    if not limits:
+        return 0
+    # Untouched buckets are full again after this long
+    timeout = max(int(capacity / refill) + 1 for capacity, refill in limits.values())
+
+    cache = caches["throttle"]
+    now = time.time()
+    with _lock:
+        buckets = cache.get_many(list(limits))
+        levels = {}
+        for key, (capacity, refill) in limits.items():
+            tokens, updated = buckets.get(key, (capacity, now))
+            levels[key] = min(capacity, tokens + (now - updated) * refill)
+
+        wait = max((1 - levels[key]) / refill for key, (_, refill) in limits.items())
+        if wait <= 0:
+            levels = {key: tokens - 1 for key, tokens in levels.items()}
+        cache.set_many({key: (tokens, now) for key, tokens in levels.items()}, timeout)
+    return max(wait, 0)
+
+
+def client_ip(request):
+    # Honours NUM_PROXIES like DRF's own throttles
+    return BaseThrottle().get_ident(request)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+
+    def get_idents(self, request):
+        idents = [f"ip:{self.get_ident(request)}"]
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            idents.append(f"user:{user.pk}")
+        return idents
+
+    def get_buckets(self, request):
+        return [(self.scope, ident) for ident in self.get_idents(request)]
+
+    def allow_request(self, request, view):
+        self.wait_seconds = take(self.get_buckets(request))
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class RegistrationThrottle(TokenBucketThrottle):
+    scope = "register"
+
+
+class TokenObtainThrottle(TokenBucketThrottle):
+    scope = "token"
+    account_scope = "login"
+
+    def get_buckets(self, request):
+        # The account bucket is larger than an address's, so its owner is
+        # only locked out by many more failed attempts than one client makes
+        buckets = super().get_buckets(request)
+        username = request.data.get("username") if hasattr(request.data, "get") else None
+        if isinstance(username, str) and username:
+            buckets.append((self.account_scope, f"username:{username.lower()}"))
+        return buckets
+
+
+def _throttled(wait):
+    response = JsonResponse(
+        {"detail": f"Request was throttled. Expected available in {int(wait) + 1} seconds."},
+        status=429,
+    )
+    response["Retry-After"] = str(int(wait) + 1)
+    return response
+
+
+def rate_limit(scope):
+    """Apply the `scope` bucket per client IP to a plain (sync or async) view."""
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                wait = take([(scope, f"ip:{client_ip(request)}")])
+                if wait:
+                    return _throttled(wait)
+                return await view(request, *args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapper(request, *args, **kwargs):
+                wait = take([(scope, f"ip:{client_ip(request)}")])
+                if wait:
+                    return _throttled(wait)
+                return view(request, *args, **kwargs)
+        return wrapper
+
+    return decorator
@@ -9,4 +9,5 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token['email'] = user.email
         token['username'] = user.username
         token['role'] = getattr(user.profile, 'role', 'tenant')
+        token['is_active'] = user.is_active
         return token
\ No newline at end of file
@@ -1,26 +1,65 @@
 from django.urls import path
 from .views import (
-    PropertyList, BookingListCreate, PaymentCreate,
-    TenantListCreate, UserRegistrationView, payment_callback,
-    CustomTokenObtainPairView, LandlordPropertyListCreate, ApprovePropertyView, LandlordBookingList, AdminBookingList
+    PropertyList, PropertyDetail, PropertySearch, BookingListCreate, PaymentCreate,
+    TenantListCreate, UserRegistrationView, payment_callback, prometheus_metrics,
+    CustomTokenObtainPairView, LandlordPropertyListCreate, ApprovePropertyView, LandlordBookingList, AdminBookingList,
+    BookingBulkCreate, PaymentBulkCreate, BookingExport, PaymentExport,
+    AvailablePropertyList, PropertyAvailability, BookingCancel, LandlordAnalytics,
+    PropertyImageList, LandlordPropertyImageListCreate, ReconciliationListCreate, ReconciliationIssueList,
+    ArchivedBookingList, ArchivedBookingDetail, ArchivedPaymentList, MeView, MyBookingList, MyPaymentList,
+    LoginView, AdminPendingPropertyList,
 )
-from rest_framework.authtoken.views import obtain_auth_token
+from . import async_views
 from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
     path('properties/', PropertyList.as_view(), name='properties-list'),
+    path('properties/search/', PropertySearch.as_view(), name='properties-search'),
+    path('properties/available/', AvailablePropertyList.as_view(), name='properties-available'),
+    path('properties/<int:pk>/', PropertyDetail.as_view(), name='properties-detail'),
+    path('properties/<int:pk>/availability/', PropertyAvailability.as_view(), name='property-availability'),
+    path('properties/<int:pk>/images/', PropertyImageList.as_view(), name='property-images'),
     path('landlord/properties/', LandlordPropertyListCreate.as_view(), name='landlord-properties'),
+    path(
+        'landlord/properties/<int:pk>/images/', LandlordPropertyImageListCreate.as_view(),
+        name='landlord-property-images',
+    ),
+    path('admin/properties/pending/', AdminPendingPropertyList.as_view(), name='admin-pending-properties'),
     path('admin/properties/<int:pk>/approve/', ApprovePropertyView.as_view(), name='approve-property'),
 
     path('bookings/', BookingListCreate.as_view(), name='bookings-list-create'),
+    path('bookings/bulk/', BookingBulkCreate.as_view(), name='bookings-bulk-create'),
+    path('bookings/<int:pk>/cancel/', BookingCancel.as_view(), name='booking-cancel'),
     path('payments/', PaymentCreate.as_view(), name='payments-create'),
+    path('payments/bulk/', PaymentBulkCreate.as_view(), name='payments-bulk-create'),
     path('tenants/', TenantListCreate.as_view(), name='tenant-list-create'),
     path('register/', UserRegistrationView.as_view(), name='user-register'),
-    path('login/', obtain_auth_token, name='api_login'),
+    path('login/', LoginView.as_view(), name='api_login'),
 
     path('payments/callback/', payment_callback, name='payment-callback'),
     path('token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('me/', MeView.as_view(), name='me'),
+    path('me/bookings/', MyBookingList.as_view(), name='my-bookings'),
+    path('me/payments/', MyPaymentList.as_view(), name='my-payments'),
     path('landlord/bookings/', LandlordBookingList.as_view(), name='landlord-bookings'),
+    path('landlord/analytics/', LandlordAnalytics.as_view(), name='landlord-analytics'),
     path('admin/bookings/', AdminBookingList.as_view(), name='admin-bookings'),
+    path('admin/exports/bookings/<str:export_format>/', BookingExport.as_view(), name='admin-export-bookings'),
+    path('admin/exports/payments/<str:export_format>/', PaymentExport.as_view(), name='admin-export-payments'),
+    path('admin/reconciliations/', ReconciliationListCreate.as_view(), name='admin-reconciliations'),
+    path(
+        'admin/reconciliations/<int:pk>/issues/', ReconciliationIssueList.as_view(),
+        name='admin-reconciliation-issues',
+    ),
+    path('admin/archive/bookings/', ArchivedBookingList.as_view(), name='admin-archived-bookings'),
+    path('admin/archive/bookings/<int:pk>/', ArchivedBookingDetail.as_view(), name='admin-archived-booking-detail'),
+    path('admin/archive/payments/', ArchivedPaymentList.as_view(), name='admin-archived-payments'),
+    path('metrics/', prometheus_metrics, name='metrics'),
+
+    # Async-native read paths and callback intake for ASGI deployments
+    path('async/properties/', async_views.property_list, name='async-properties-list'),
+    path('async/properties/<int:pk>/', async_views.property_detail, name='async-properties-detail'),
+    path('async/landlord/bookings/', async_views.landlord_bookings, name='async-landlord-bookings'),
+    path('async/payments/callback/', async_views.payment_callback, name='async-payment-callback'),
 ]
\ No newline at end of file
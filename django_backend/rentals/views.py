@@ -1,60 +1,273 @@
-from rest_framework import generics, filters, permissions
+from rest_framework import generics, filters, permissions, status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.utils.urls import replace_query_param
+from django.contrib.auth.models import User
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
+from django.views import static
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
 from django.views.decorators.http import require_http_methods
 import json
-from datetime import datetime
-from rest_framework_simplejwt.authentication import JWTAuthentication
-
-from .models import Property, Booking, Payment, Tenant, UserProfile
+from collections.abc import Iterator
+from django.conf import settings
+from django.db import transaction
+from rest_framework.settings import api_settings
+
+from .models import (
+    Property, PropertyImage, PropertyOccupancy, Booking, Payment, PaymentCallback, Tenant, UserProfile,
+    Reconciliation, ReconciliationIssue, ArchivedBooking, ArchivedPayment,
+)
 from .serializers import (
-    PropertySerializer, BookingSerializer, PaymentSerializer,
-    TenantSerializer, UserRegistrationSerializer, BookingDashboardSerializer
+    PropertySerializer, PropertyImageSerializer, BookingSerializer, PaymentSerializer,
+    TenantSerializer, UserRegistrationSerializer, BookingDashboardSerializer,
+    ReconciliationSerializer, ReconciliationIssueSerializer, ArchivedRowSerializer, MeSerializer,
+    MyPaymentSerializer, MyArchivedBookingSerializer, MyArchivedPaymentSerializer,
 )
+from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .tokens import CustomTokenObtainPairSerializer
-from .permissions import IsLandlord, IsAdmin
+from .permissions import IsLandlord, IsAdmin, get_role
+from .authentication import ClaimsJWTAuthentication
+from .pagination import (
+    PropertyCursorPagination, BookingCursorPagination, ReconciliationCursorPagination,
+    ReconciliationIssueCursorPagination, ArchiveCursorPagination, PaymentCursorPagination,
+)
+from .filters import PropertyFilterBackend, PropertyOrderingFilter
+from .search import search_property_ids
+from .cache import PropertyCacheMixin
+from .routers import ReplicaReadMixin
+from .payments import CallbackError, apply_callback
+from .parsers import NDJSONParser
+from .bulk import BookingImporter, PaymentImporter
+from .throttling import RegistrationThrottle, TokenObtainThrottle, rate_limit
+from . import analytics, bookings, exports, jobs, metrics, notifications
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = [TokenObtainThrottle]
+
+
+# The other endpoints that check a password share its rate limit, so it
+# cannot be bypassed through DRF's /api/login/ or djoser's /auth/jwt/create/
+class LoginView(ObtainAuthToken):
+    throttle_classes = [TokenObtainThrottle]
+
+
+class JWTCreateView(TokenObtainPairView):
+    throttle_classes = [TokenObtainThrottle]
+
+
+# Dashboard views take the user and role from the JWT claims, so checking
+# permissions costs no queries; session/basic auth still work as fallback.
+CLAIMS_AUTHENTICATION = [ClaimsJWTAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES]
 
 
 # Anyone can list properties (only approved ones)
-class PropertyList(generics.ListAPIView):
-    queryset = Property.objects.filter(approved=True)
+class PropertyListView(generics.ListAPIView):
+    approved = True
     serializer_class = PropertySerializer
+    pagination_class = PropertyCursorPagination
+    filter_backends = [PropertyFilterBackend, PropertyOrderingFilter]
+    # ?ordering=price_per_month / -price_per_month / -id (most recent first);
+    # ?near= and ?bbox= searches default to distance (nearest first)
+    ordering_fields = ["price_per_month", "id", "distance"]
+    ordering = ["-id"]
+
+    def get_requested_fields(self):
+        # ?fields=id,name,price_per_month limits the response to those fields
+        fields = self.request.query_params.get("fields")
+        if not fields:
+            return None
+        return [name.strip() for name in fields.split(",") if name.strip()]
+
+    def get_queryset(self):
+        queryset = Property.objects.filter(approved=self.approved)
+        fields = self.get_requested_fields()
+        if fields is None:
+            return queryset.select_related("landlord")
+
+        # Only load the columns being serialized, plus the sort keys the
+        # cursor is built from
+        concrete = {field.name for field in Property._meta.concrete_fields}
+        load = concrete & (set(self.ordering_fields) | set(fields))
+        if "landlord" in load:
+            queryset = queryset.select_related("landlord")
+        return queryset.only(*load)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault("fields", self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+
+class PropertyList(ReplicaReadMixin, PropertyCacheMixin, PropertyListView):
+    pass
+
+
+def parse_date_param(params, key):
+    """Optional YYYY-MM-DD query parameter; None when absent."""
+    value = params.get(key)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({key: "Expected a date as YYYY-MM-DD."})
+    return parsed
+
+
+def parse_date_range(params, max_days=366):
+    """Read the required ?start=&end= dates of a range query."""
+    dates = {}
+    for key in ("start", "end"):
+        dates[key] = parse_date_param(params, key)
+        if dates[key] is None:
+            raise ValidationError({key: "This query parameter is required."})
+    if dates["end"] < dates["start"]:
+        raise ValidationError({"end": "Must not be before start."})
+    if (dates["end"] - dates["start"]).days >= max_days:
+        raise ValidationError({"end": f"Ranges are limited to {max_days} days."})
+    return dates["start"], dates["end"]
+
+
+# Properties free for every date in ?start=&end=, with the usual list
+# filters, ordering and fields. Not cached: bookings change it constantly.
+class AvailablePropertyList(PropertyListView):
+    def get_queryset(self):
+        start, end = parse_date_range(self.request.query_params)
+        booked = PropertyOccupancy.objects.filter(date__range=(start, end)).values("property_id")
+        return super().get_queryset().exclude(id__in=booked)
+
+
+# Booked dates of one property in ?start=&end=
+class PropertyAvailability(APIView):
+    def get(self, request, pk, *args, **kwargs):
+        start, end = parse_date_range(request.query_params)
+        if not Property.objects.filter(pk=pk, approved=True).exists():
+            raise NotFound()
+        booked = (
+            PropertyOccupancy.objects.filter(property_id=pk, date__range=(start, end))
+            .order_by("date")
+            .values_list("date", flat=True)
+        )
+        return Response({"property": pk, "start": start, "end": end, "booked": list(booked)})
+
+
+class PropertyDetail(PropertyCacheMixin, generics.RetrieveAPIView):
+    queryset = Property.objects.filter(approved=True).select_related("landlord")
+    serializer_class = PropertySerializer
+
+
+# Ranked full-text search over approved properties: ?q=two bedroom
+class PropertySearch(PropertyCacheMixin, generics.GenericAPIView):
+    serializer_class = PropertySerializer
+    default_limit = 20
+    max_limit = 50
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get("q", "")
+        # A page of zero would point `next` at the same offset forever
+        limit = self._int_param("limit", self.default_limit, minimum=1, maximum=self.max_limit)
+        offset = self._int_param("offset", 0)
+
+        # Fetch one extra id to know whether there is a next page
+        ids = search_property_ids(query, limit + 1, offset)
+        has_next = len(ids) > limit
+        ids = ids[:limit]
+
+        properties = Property.objects.select_related("landlord").in_bulk(ids)
+        serializer = self.get_serializer([properties[pk] for pk in ids if pk in properties], many=True)
+
+        next_url = None
+        if has_next:
+            next_url = replace_query_param(request.build_absolute_uri(), "offset", offset + limit)
+        return Response({"next": next_url, "results": serializer.data})
+
+    def _int_param(self, key, default, minimum=0, maximum=None):
+        try:
+            value = max(int(self.request.query_params[key]), minimum)
+        except (KeyError, ValueError):
+            return default
+        return min(value, maximum) if maximum is not None else value
 
 
 # Landlord can create/list their properties
 class LandlordPropertyListCreate(generics.ListCreateAPIView):
     serializer_class = PropertySerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated, IsLandlord]
 
     def get_queryset(self):
-        return Property.objects.filter(landlord=self.request.user)
+        return Property.objects.filter(landlord_id=self.request.user.pk).select_related("landlord")
 
     def perform_create(self, serializer):
         try:
-            serializer.save(landlord=self.request.user, approved=False)
+            serializer.save(landlord_id=self.request.user.pk, approved=False)
         except Exception:
             print("Serializer errors:", serializer.errors)
             raise
 
 
+# Processed photos of an approved property, in upload order
+class PropertyImageList(generics.ListAPIView):
+    serializer_class = PropertyImageSerializer
+
+    def get_queryset(self):
+        return PropertyImage.objects.filter(
+            property_id=self.kwargs["pk"], property__approved=True, processed_at__isnull=False, error="",
+        ).order_by("id")
+
+
+# Landlords upload photos of their own properties (multipart, field "file")
+# and see every upload, including pending and failed ones
+class LandlordPropertyImageListCreate(generics.ListCreateAPIView):
+    serializer_class = PropertyImageSerializer
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated, IsLandlord]
+
+    def get_queryset(self):
+        return PropertyImage.objects.filter(
+            property_id=self.kwargs["pk"], property__landlord_id=self.request.user.pk,
+        ).order_by("id")
+
+    def perform_create(self, serializer):
+        prop = get_object_or_404(Property.objects.only("id"), pk=self.kwargs["pk"], landlord_id=self.request.user.pk)
+        serializer.save(property=prop)
+
+
+# Admin: properties waiting for approval, with the public list's filters
+class AdminPendingPropertyList(PropertyListView):
+    approved = False
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+
+
 # Admin can approve properties
 class ApprovePropertyView(generics.UpdateAPIView):
     queryset = Property.objects.all()
     serializer_class = PropertySerializer
+    authentication_classes = CLAIMS_AUTHENTICATION
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
 
     def perform_update(self, serializer):
-        serializer.save(approved=True)
+        newly_approved = not serializer.instance.approved
+        with transaction.atomic():
+            prop = serializer.save(approved=True)
+            if newly_approved:
+                jobs.enqueue(notifications.PROPERTY_APPROVED, {"property_id": prop.pk})
 
-    # Allow POST request to trigger update
+    # Allow POST request to trigger update; the body may be empty
     def post(self, request, *args, **kwargs):
-        return self.update(request, *args, **kwargs)
+        return self.partial_update(request, *args, **kwargs)
 
 
 # Booking views
@@ -62,22 +275,273 @@ class BookingListCreate(generics.ListCreateAPIView):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
 
+    def perform_create(self, serializer):
+        # Claims the date on the availability calendar; 409 if taken
+        bookings.reserve(serializer)
+
+
+# Tenants cancel their own bookings; admins any booking
+class BookingCancel(APIView):
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk, *args, **kwargs):
+        # Admins are checked first: a booking whose tenant has no user has
+        # no owner, but admins may still cancel it
+        if get_role(request.user) != "admin":
+            owner = Booking.objects.filter(pk=pk).values_list("tenant__user_id", flat=True).first()
+            if owner is None or owner != request.user.pk:
+                raise NotFound()
+        try:
+            booking = bookings.cancel(pk)
+        except Booking.DoesNotExist:
+            raise NotFound()
+        return Response(BookingSerializer(booking).data)
 
-class LandlordBookingList(generics.ListAPIView):
+
+class BookingDashboardMixin:
+    """
+    Shared queryset and paging for the booking dashboards. Everything
+    BookingDashboardSerializer reads is joined in, so a page costs one
+    query however many bookings it holds.
+    """
     serializer_class = BookingDashboardSerializer
+    pagination_class = BookingCursorPagination
+    authentication_classes = CLAIMS_AUTHENTICATION
+
+    @staticmethod
+    def get_dashboard_queryset():
+        return Booking.objects.select_related("tenant__user", "property").only(
+            "id", "booking_date", "status", "created_at",
+            "tenant__user__email",
+            "property__name", "property__price_per_month",
+        )
+
+
+class LandlordBookingList(ReplicaReadMixin, BookingDashboardMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated, IsLandlord]
 
     def get_queryset(self):
-        return Booking.objects.filter(property__landlord=self.request.user)
+        return self.get_dashboard_queryset().filter(property__landlord_id=self.request.user.pk)
+
+
+# The signed-in user's account and, for tenants, their own bookings and
+# payments. Each is one query, filtered through the indexed tenant joins;
+# ?archived=1 lists the bookings and payments moved to the archive instead.
+class MeView(generics.RetrieveAPIView):
+    serializer_class = MeSerializer
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_object(self):
+        users = User.objects.select_related("profile", "tenant")
+        return get_object_or_404(users, pk=self.request.user.pk, is_active=True)
+
+
+class MyHistoryMixin:
+    archived_serializer_class = None
+
+    @property
+    def archived(self):
+        return self.request.query_params.get("archived") in ("1", "true")
+
+    def get_serializer_class(self):
+        return self.archived_serializer_class if self.archived else super().get_serializer_class()
+
+    def get_queryset(self):
+        return self.get_archived_queryset() if self.archived else self.get_live_queryset()
+
+    def archived_bookings(self):
+        tenant_ids = Tenant.objects.filter(user_id=self.request.user.pk).values("id")
+        return ArchivedBooking.objects.filter(tenant_id__in=tenant_ids)
+
+
+class MyBookingList(MyHistoryMixin, ReplicaReadMixin, BookingDashboardMixin, generics.ListAPIView):
+    archived_serializer_class = MyArchivedBookingSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_live_queryset(self):
+        return self.get_dashboard_queryset().filter(tenant__user_id=self.request.user.pk)
+
+    def get_archived_queryset(self):
+        return self.archived_bookings()
+
+
+class MyPaymentList(MyHistoryMixin, ReplicaReadMixin, generics.ListAPIView):
+    serializer_class = MyPaymentSerializer
+    archived_serializer_class = MyArchivedPaymentSerializer
+    pagination_class = PaymentCursorPagination
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_live_queryset(self):
+        return Payment.objects.select_related("booking__property").only(
+            "id", "booking", "amount", "payment_status", "mpesa_receipt", "payment_date", "transaction_time",
+            "booking__booking_date", "booking__property__name",
+        ).filter(booking__tenant__user_id=self.request.user.pk)
+
+    def get_archived_queryset(self):
+        return ArchivedPayment.objects.filter(booking_id__in=self.archived_bookings().values("id"))
 
 
 # Admin: all bookings
-class AdminBookingList(generics.ListAPIView):
-    serializer_class = BookingDashboardSerializer
+class AdminBookingList(ReplicaReadMixin, BookingDashboardMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
 
     def get_queryset(self):
-        return Booking.objects.all()
+        return self.get_dashboard_queryset()
+
+
+# Landlord analytics from the daily summary table:
+# ?start=&end= (default: the last 30 days) and ?group=day|month
+class LandlordAnalytics(APIView):
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated, IsLandlord]
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        end = parse_date_param(params, "end") or timezone.localdate()
+        start = parse_date_param(params, "start") or end - timedelta(days=29)
+        if end < start:
+            raise ValidationError({"end": "Must not be before start."})
+        group = params.get("group", "day")
+        if group not in analytics.GROUPS:
+            raise ValidationError({"group": f"Expected one of: {', '.join(analytics.GROUPS)}."})
+        return Response(analytics.landlord_summary(request.user.pk, start, end, group))
+
+
+# Admin: streaming exports, /admin/exports/bookings/csv/?start=2025-01-01&status=Paid
+class ExportView(APIView):
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    export_name = None
+    columns = None
+    statuses = None
+    rows = None  # (start, end, status) -> iterable of rows, see rentals.exports
+    writers = {
+        "csv": (exports.stream_csv, "text/csv"),
+        "ndjson": (exports.stream_ndjson, "application/x-ndjson"),
+    }
+
+    def get(self, request, export_format, *args, **kwargs):
+        if export_format not in self.writers:
+            raise ValidationError({"format": f"Expected one of: {', '.join(self.writers)}."})
+        writer, content_type = self.writers[export_format]
+        status_filter = request.query_params.get("status")
+        if status_filter and status_filter not in self.statuses.values:
+            raise ValidationError({"status": f"Expected one of: {', '.join(self.statuses.values)}."})
+
+        rows = self.rows(
+            parse_date_param(request.query_params, "start"),
+            parse_date_param(request.query_params, "end"),
+            status_filter,
+        )
+        response = StreamingHttpResponse(writer(self.columns, rows), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{self.export_name}.{export_format}"'
+        return response
+
+
+class BookingExport(ExportView):
+    export_name = "bookings"
+    columns = exports.BOOKING_COLUMNS
+    statuses = Booking.Status
+    rows = staticmethod(exports.booking_rows)
+
+
+class PaymentExport(ExportView):
+    export_name = "payments"
+    columns = exports.PAYMENT_COLUMNS
+    statuses = Payment.Status
+    rows = staticmethod(exports.payment_rows)
+
+
+# Admin: M-Pesa statement reconciliation. POST a statement CSV (multipart,
+# field "file"); a job worker matches it and records the issues, listed at
+# /admin/reconciliations/<id>/issues/?kind=Mismatch
+class ReconciliationListCreate(generics.ListCreateAPIView):
+    queryset = Reconciliation.objects.all()
+    serializer_class = ReconciliationSerializer
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    pagination_class = ReconciliationCursorPagination
+
+    def perform_create(self, serializer):
+        serializer.save(created_by_id=self.request.user.pk)
+
+
+class ReconciliationIssueList(generics.ListAPIView):
+    serializer_class = ReconciliationIssueSerializer
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    pagination_class = ReconciliationIssueCursorPagination
+
+    def get_queryset(self):
+        queryset = ReconciliationIssue.objects.filter(reconciliation_id=self.kwargs["pk"])
+        kind = self.request.query_params.get("kind")
+        if kind:
+            if kind not in ReconciliationIssue.Kind.values:
+                raise ValidationError({"kind": f"Expected one of: {', '.join(ReconciliationIssue.Kind.values)}."})
+            queryset = queryset.filter(kind=kind)
+        return queryset
+
+
+def parse_id_param(params, key):
+    """Optional integer query parameter; None when absent."""
+    value = params.get(key)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({key: "Expected an id."})
+
+
+# Admin: bookings and payments moved to the archive (rentals.archive), read
+# back on demand. Bookings filter on ?tenant=&property=&start=&end=,
+# payments on ?receipt= or ?booking=.
+class ArchiveView(generics.GenericAPIView):
+    serializer_class = ArchivedRowSerializer
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    pagination_class = ArchiveCursorPagination
+
+
+class ArchivedBookingList(ArchiveView, generics.ListAPIView):
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = ArchivedBooking.objects.all()
+        tenant, property_id = parse_id_param(params, "tenant"), parse_id_param(params, "property")
+        start, end = parse_date_param(params, "start"), parse_date_param(params, "end")
+        if tenant is not None:
+            queryset = queryset.filter(tenant_id=tenant)
+        if property_id is not None:
+            queryset = queryset.filter(property_id=property_id)
+        if start:
+            queryset = queryset.filter(booking_date__gte=start)
+        if end:
+            queryset = queryset.filter(booking_date__lte=end)
+        return queryset
+
+
+class ArchivedBookingDetail(ArchiveView, generics.RetrieveAPIView):
+    queryset = ArchivedBooking.objects.all()
+
+    def retrieve(self, request, *args, **kwargs):
+        booking = self.get_serializer(self.get_object()).data
+        payments = ArchivedPayment.objects.filter(booking_id=booking["id"]).order_by("id")
+        return Response({**booking, "payments": self.get_serializer(payments, many=True).data})
+
+
+class ArchivedPaymentList(ArchiveView, generics.ListAPIView):
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = ArchivedPayment.objects.all()
+        booking = parse_id_param(params, "booking")
+        if params.get("receipt"):
+            queryset = queryset.filter(mpesa_receipt=params["receipt"])
+        if booking is not None:
+            queryset = queryset.filter(booking_id=booking)
+        return queryset
 
 
 # Payments
@@ -85,6 +549,43 @@ class PaymentCreate(generics.CreateAPIView):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            payment = serializer.save()
+            analytics.record_payments([payment])
+
+
+# Bulk imports: a JSON list or an NDJSON stream of bookings/payments
+class BulkImportView(APIView):
+    importer_class = None
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data
+        if not isinstance(rows, (list, Iterator)):
+            return Response(
+                {"error": "Expected a list of objects or an NDJSON stream."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = self.importer_class(context={"request": request}).run(rows)
+        created = sum(1 for result in results if result["status"] == "created")
+        failed = len(results) - created
+        return Response(
+            {"created": created, "failed": failed, "results": results},
+            status=status.HTTP_201_CREATED if not failed else status.HTTP_207_MULTI_STATUS,
+        )
+
+
+class BookingBulkCreate(BulkImportView):
+    importer_class = BookingImporter
+
+
+class PaymentBulkCreate(BulkImportView):
+    importer_class = PaymentImporter
+
 
 # Tenants
 class TenantListCreate(generics.ListCreateAPIView):
@@ -98,56 +599,53 @@ class TenantListCreate(generics.ListCreateAPIView):
 class UserRegistrationView(generics.CreateAPIView):
     queryset = UserProfile.objects.all()
     serializer_class = UserRegistrationSerializer
+    throttle_classes = [RegistrationThrottle]
 
 
 # M-Pesa payment callback
 @csrf_exempt
 @require_http_methods(["POST"])
+@rate_limit("callback")
 def payment_callback(request):
     try:
         data = json.loads(request.body.decode('utf-8'))
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
 
-        booking_id = data.get("booking_id")
-        email = data.get("email")
-        result_code = data.get("result_code")
-        result_desc = data.get("result_desc")
-        amount = data.get("amount")
-        mpesa_receipt = data.get("mpesa_receipt")
-        phone_number = data.get("phone_number")
-        transaction_date = data.get("transaction_date")
-        raw_callback = data.get("raw_callback")
-
-        dt_parsed = None
-        if transaction_date:
-            try:
-                dt_parsed = datetime.strptime(str(transaction_date), "%Y%m%d%H%M%S")
-            except Exception:
-                dt_parsed = None
+    # Queued mode: store the raw callback and acknowledge straight away;
+    # the process_payment_callbacks worker applies it
+    if settings.PAYMENT_CALLBACK_MODE == "queued":
+        callback = PaymentCallback.objects.create(payload=data)
+        return JsonResponse({"message": "Callback accepted", "id": callback.id}, status=202)
 
-        try:
-            booking = Booking.objects.get(id=booking_id, tenant__user__email=email)
-        except Booking.DoesNotExist:
-            return JsonResponse({"error": "Booking not found"}, status=404)
-
-        status = "Paid" if result_code == 0 else "Failed"
-
-        if status == "Paid":
-            booking.status = "Paid"
-            booking.save()
-
-        Payment.objects.create(
-            booking=booking,
-            amount=amount or 0,
-            payment_status=status,
-            mpesa_receipt=mpesa_receipt,
-            phone_number=phone_number,
-            result_code=result_code,
-            result_desc=result_desc,
-            transaction_time=dt_parsed,
-            raw_callback=raw_callback,
-        )
+    try:
+        payment, created = apply_callback(data)
+    except CallbackError as e:
+        return JsonResponse({"error": str(e)}, status=404)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
 
-        return JsonResponse({"message": f"Payment processed, Booking status: {status}"}, status=201)
+    return JsonResponse(
+        {"message": f"Payment processed, Booking status: {payment.payment_status}"},
+        status=201 if created else 200,
+    )
 
-    except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
\ No newline at end of file
+
+# Uploaded media when SERVE_MEDIA is on. Names are content-addressed
+# (rentals.images), so a response may be cached forever.
+MEDIA_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def serve_media(request, path):
+    response = static.serve(request, path, document_root=settings.MEDIA_ROOT)
+    patch_cache_control(response, public=True, max_age=MEDIA_MAX_AGE, immutable=True)
+    return response
+
+
+# Prometheus scrape endpoint for the request metrics (rentals.metrics)
+@require_http_methods(["GET"])
+def prometheus_metrics(request):
+    allowed = settings.METRICS_ALLOWED_IPS
+    if allowed is not None and request.META.get("REMOTE_ADDR") not in allowed:
+        raise Http404
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
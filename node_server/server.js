@@ -130,12 +130,12 @@ app.post('/initiate-payment', async (req, res) => {
     if (token) {
       try {
         const verifyRes = await axios.get(
-          'http://127.0.0.1:8000/api/tenants/', // adjust to /api/user/profile/ if you have it
+          'http://127.0.0.1:8000/api/me/',
           { headers: { Authorization: `Bearer ${token}` } }
         );
 
-        if (verifyRes.data && verifyRes.data.length > 0) {
-          verifiedEmail = verifyRes.data[0].user.email;
+        if (verifyRes.data && verifyRes.data.email) {
+          verifiedEmail = verifyRes.data.email;
         }
       } catch (err) {
         console.warn('⚠️ Could not verify tenant from Django, falling back to provided email');